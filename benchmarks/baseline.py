@@ -0,0 +1,405 @@
+# Frozen copies of the original (pre-optimisation) codecs. The benchmarks use them both as the
+# "before" timing and as the reference the optimised code has to match byte for byte.
+import struct
+import binascii
+
+# The state classes as they were, plain __dict__ objects
+
+class cartesian:
+    def __init__(self, x,y,z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+class bmsState:
+    def __init__(self, version_h, version_l, bms_status, SOC, current, cycle, BQ_NTC, MCU_NTC, cell_vol):
+        self.version_h = version_h
+        self.version_l = version_l
+        self.bms_status = bms_status
+        self.SOC = SOC                      # SOC 0-100%
+        self.current = current              # mA
+        self.cycle = cycle
+        self.BQ_NTC = BQ_NTC                # x1 degrees centigrade
+        self.MCU_NTC = MCU_NTC              # x1 degrees centigrade
+        self.cell_vol = cell_vol            # cell voltage mV
+
+class motorState:                               # motor feedback
+    def __init__(self, mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, reserve):
+        self.mode = mode                        # motor working mode
+        self.q = q                              # current angle (unit: radian)
+        self.dq = dq                            # current velocity (unit: radian/second)
+        self.ddq = ddq                          # current acc (unit: radian/second*second)
+        self.tauEst = tauEst                    # current estimated output torque (unit: N.m)
+        self.q_raw = q_raw                      # current angle (unit: radian)
+        self.dq_raw = dq_raw                    # current velocity (unit: radian/second)
+        self.ddq_raw = ddq_raw
+        self.temperature = temperature          # current temperature (temperature conduction is slow that leads to lag)
+        self.reserve = reserve
+
+class imu:                                      # when under accelerated motion, the attitude of the robot calculated by IMU will drift.
+    def __init__(self, quaternion, gyroscope, accelerometer, rpy, temperature):
+        self.quaternion = quaternion            # quaternion, normalized, (w,x,y,z)
+        self.gyroscope = gyroscope              # angular velocity （unit: rad/s)    (raw data)
+        self.accelerometer = accelerometer      # m/(s2)                             (raw data)
+        self.rpy = rpy                          # euler angle（unit: rad)
+        self.temperature = temperature
+
+def genCrc(i):
+    crc = 0xFFFFFFFF
+    for j in struct.unpack("<%dI" % (len(i) / 4), i):
+        for b in range(32):
+            x = (crc >> 31) & 1
+            crc <<= 1
+            crc &= 0xFFFFFFFF
+            if x ^ (1&(j >> (31-b))):
+                crc ^= 0x04c11db7
+    crc = struct.pack('<I', crc)
+    return crc
+
+def encryptCrc(crc_val):
+    crc_val = int.from_bytes(crc_val, byteorder='little')
+    xor_val = 0xedcab9de
+    val=crc_val ^ xor_val
+    data = struct.pack('<I', val)
+    temp=bytearray(4)
+    temp[0] = data[1]
+    temp[1] = data[2]
+    temp[2] = data[3]
+    temp[3] = data[0]
+    return temp
+
+def float_to_hex(f):
+    return (struct.unpack('>I', struct.pack('>f', f))[0]).to_bytes(4, 'little')
+
+def buildHighCmd(hcmd, genCrc=genCrc):
+    # highCmd.buildCmd as it was, working on a highCmd instance
+    from enum import Enum
+    cmd = bytearray(129)
+    cmd[0:2] = hcmd.head
+    cmd[2] = hcmd.levelFlag
+    cmd[3] = hcmd.frameReserve
+    cmd[4:12] = hcmd.SN
+    cmd[12:20] = hcmd.version
+    cmd[20:22] = hcmd.bandWidth
+
+    if isinstance(hcmd.mode, Enum):
+        cmd[22] = hcmd.mode.value
+    else:
+        cmd[22] = hcmd.mode
+    if isinstance(hcmd.gaitType, Enum):
+        cmd[23] = hcmd.gaitType.value
+    else:
+        cmd[23] = hcmd.gaitType
+    if isinstance(hcmd.speedLevel, Enum):
+        cmd[24] = hcmd.speedLevel.value
+    else:
+        cmd[24] = hcmd.speedLevel
+    cmd[25:29] = float_to_hex(hcmd.footRaiseHeight)
+    cmd[29:33] = float_to_hex(hcmd.bodyHeight)
+
+    cmd[33:37] = float_to_hex(hcmd.position[0])
+    cmd[37:41] = float_to_hex(hcmd.position[1])
+
+    cmd[41:45] = float_to_hex(hcmd.euler[0])
+    cmd[45:49] = float_to_hex(hcmd.euler[1])
+    cmd[49:53] = float_to_hex(hcmd.euler[2])
+
+    cmd[53:57] = float_to_hex(hcmd.velocity[0])
+    cmd[57:61] = float_to_hex(hcmd.velocity[1])
+
+    cmd[61:65] = float_to_hex(hcmd.yawSpeed)
+    cmd[65:69] = hcmd.bms.getBytes()
+    cmd[69:73] = hcmd.led.getBytes()
+    cmd[73:113] = hcmd.wirelessRemote
+    cmd[113:117] = hcmd.reserve
+    if hcmd.encrypt:
+        cmd[-4:] = encryptCrc(genCrc(cmd[:-5]))
+    else:
+        cmd[-4:] = genCrc(cmd[:-5])
+    return cmd
+
+
+def hex_to_float(hex):
+    i = int.from_bytes(hex, 'little')
+    return struct.unpack('>f', struct.pack('>I', i))[0]
+
+# Kp / Kd / tau fixed-point codecs as they were
+
+def fraction_to_hex(fraction, neg=False):
+    if fraction == 0.0:
+        neg = False
+    hex_value = int(fraction * 256)
+    if neg:
+        hex_value = 255 + hex_value + 1
+    return hex_value.to_bytes(1, 'little')
+
+def tau_to_hex(tau):
+    tau = round(tau,2)
+    integer_part = int(tau)
+    fractional_part = tau - integer_part
+    neg = False
+    if tau < 0:
+        neg = True
+        integer_part = 255 + integer_part
+    try:
+        return fraction_to_hex(fractional_part, neg) + integer_part.to_bytes(1, 'little')
+    except Exception as e:
+        print(e)
+        print(tau)
+        print(integer_part)
+
+
+def hex_to_fraction(hex_byte, neg=False):
+    if neg:
+        return -1+round(hex_byte / 256, 2)
+    else:
+        return round(hex_byte / 256, 2)
+
+def hex_to_tau(hex_bytes):
+    ip = hex_bytes[1:]
+    int_val = int.from_bytes(ip, 'little')
+    neg = False
+    # We just assume 126 the tipover point for the negative values
+    if int_val > 126:
+        neg = True
+        int_val = -255 + int_val
+    return int_val + hex_to_fraction(hex_bytes[0], neg)
+
+
+def kp_to_hex(Kp):
+    base, frac = divmod(Kp, 1)
+    base = int(base)
+    frac = int(round(frac,1) * 10)
+
+    val = 0
+    if frac < 5:
+        val = (base * 32) + frac * 3
+    if frac >= 5:
+        val = (base * 32) + ((frac - 1) * 3) + 4
+
+    val = f'%04x' % val
+    kp = bytearray(bytes.fromhex(val))
+    kp.reverse()
+    return kp
+
+def hex_to_kp(byte_arr):
+    hex_bytes = binascii.hexlify(byte_arr)
+    h = bytearray(4) # Yah doing this ugly, need to make it nice later when we know it really works
+    h[0] = hex_bytes[2]
+    h[1] = hex_bytes[3]
+    h[2] = hex_bytes[0]
+    h[3] = hex_bytes[1]
+    byte_arr = h
+    val = int(byte_arr, 16)
+
+    base = val // 32
+    remainder = val % 32
+
+    if remainder < 15:
+        frac = remainder / 3
+    else:
+        frac = (remainder - 4) / 3 + 1
+
+    return base + round(frac, 1) / 10
+
+def get_hex_frac(frac):
+    mapping = {0.0: '0', 0.1: '1', 0.2: '3', 0.3: '4', 0.4: '6', 0.5: '8', 0.6: '9', 0.7: 'b', 0.8: 'c', 0.9: 'e'}
+    return mapping.get(frac, '0')
+
+def kd_to_hex(decimal):
+    integer_part = int(decimal)
+    fractional_part = round(decimal - integer_part,1)
+    hex_fractional_part = get_hex_frac(fractional_part)
+    hex_integer_part = f'%03x' % integer_part
+    kd = bytearray(bytes.fromhex(hex_integer_part + hex_fractional_part))
+    kd.reverse()
+    return kd
+
+def get_frac_hex(frac):
+    mapping = {'0': 0.0, '1': 0.1, '3': 0.2, '4': 0.3, '6':  0.4,'8':  0.5, '9': 0.6,'b':  0.7, 'c': 0.8, 'e': 0.9}
+    return mapping.get(frac, 0.0)
+
+def hex_to_kd(hex_bytes):
+    hex_bytes = binascii.hexlify(hex_bytes)
+    h = bytearray(4) # Yah doing this ugly, need to make it nice later when we know it really works
+    h[0] = hex_bytes[2]
+    h[1] = hex_bytes[3]
+    h[2] = hex_bytes[0]
+    h[3] = hex_bytes[1]
+    hex_bytes = h
+    int_part = int(hex_bytes[:3],16)
+    frac_part = get_frac_hex(hex_bytes.hex()[3])
+    kd = int_part + frac_part
+    return kd
+
+# highState / lowState as they were. Only the decoding methods are kept, attribute defaults are
+# whatever parseData assigns.
+
+class highState:
+    def dataToBmsState(self,data):
+        version_h = data[0]
+        version_l = data[1]
+        bms_status = data[2]
+        SOC = data[3]
+        current = int.from_bytes(data[4:8], byteorder='little', signed=True)
+        cycle = int.from_bytes(data[8:10], byteorder='little')
+        BQ_NTC = [data[10], data[11]]
+        MCU_NTC = [data[12], data[13]]
+        cell_vol = [int.from_bytes(data[13:15], byteorder='little'), int.from_bytes(data[15:17], byteorder='little'), int.from_bytes(data[17:19], byteorder='little'), int.from_bytes(data[19:21], byteorder='little'), int.from_bytes(data[21:23], byteorder='little'),
+                    int.from_bytes(data[23:25], byteorder='little'), int.from_bytes(data[25:27], byteorder='little'), int.from_bytes(data[27:29], byteorder='little'), int.from_bytes(data[29:31], byteorder='little'), int.from_bytes(data[31:33], byteorder='little')]
+        return bmsState(version_h, version_l, bms_status, SOC, current, cycle, BQ_NTC, MCU_NTC, cell_vol)
+
+
+    def dataToImu(self, data):
+        quaternion = [hex_to_float(data[0:4]), hex_to_float(data[4:8]), hex_to_float(data[8:12]), hex_to_float(data[12:16])]
+        gyroscope = [hex_to_float(data[16:20]), hex_to_float(data[20:24]), hex_to_float(data[24:28])]
+        accelerometer = [hex_to_float(data[28:32]), hex_to_float(data[32:36]), hex_to_float(data[36:40])]
+        rpy = [hex_to_float(data[40:44]), hex_to_float(data[44:48]), hex_to_float(data[48:52])]
+        temperature = data[52]
+        return imu(quaternion, gyroscope, accelerometer, rpy, temperature)
+
+    def dataToMotorState(self, data):
+        mode = data[0]
+        q = hex_to_float(data[1:5])
+        dq = hex_to_float(data[5:9])
+        ddq = hex_to_float(data[9:13])
+        tauEst = hex_to_float(data[13:17])
+        q_raw = hex_to_float(data[17:21])
+        dq_raw = hex_to_float(data[21:25])
+        ddq_raw = hex_to_float(data[25:29])
+        temperature = data[29]
+        reserve = [data[30], data[31]]
+        return motorState(mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, reserve)
+
+    def parseData(self, data):
+        self.head = hex(int.from_bytes(data[0:2], byteorder='little'))
+        self.levelFlag = data[2]
+        self.frameReserve = data[3]
+        self.SN = data[4:12]
+        self.version = data[12:20]
+        self.bandWidth = int.from_bytes(data[20:22], byteorder='little')
+        self.imu = self.dataToImu(data[22:75])
+        self.motorstate=[]
+        for i in range(20):
+            self.motorstate.append(self.dataToMotorState(data[(i*32)+75:(i*32)+32+75]))
+        # FIX FROM HERE!!!
+        self.bms=self.dataToBmsState(data[835:869])
+        self.footForce = [int.from_bytes(data[869:871], byteorder='little'), int.from_bytes(data[871:873], byteorder='little'), int.from_bytes(data[873:875], byteorder='little'), int.from_bytes(data[875:877], byteorder='little')]
+        self.footForceEst = [int.from_bytes(data[877:879], byteorder='little'), int.from_bytes(data[879:881], byteorder='little'), int.from_bytes(data[881:883], byteorder='little'), int.from_bytes(data[883:885], byteorder='little')]
+        self.mode = data[885]
+        self.progress = hex_to_float(data[886:890])
+        self.gaitType = data[890]
+        self.footRaiseHeight = hex_to_float(data[891:895])
+        self.position = [hex_to_float(data[895:899]), hex_to_float(data[899:903]), hex_to_float(data[903:907])]
+        self.bodyHeight = hex_to_float(data[907:911])
+        self.velocity = [hex_to_float(data[911:915]), hex_to_float(data[915:919]), hex_to_float(data[919:923])]
+        self.yawSpeed = hex_to_float(data[923:927])
+        self.rangeObstacle = [hex_to_float(data[927:931]), hex_to_float(data[931:935]), hex_to_float(data[935:939]), hex_to_float(data[939:943])]
+        self.footPosition2Body = []
+        for i in range(4):
+            self.footPosition2Body.append(cartesian(hex_to_float(data[(i*12)+943:(i*12)+947]), hex_to_float(data[(i*12)+947:(i*12)+951]), hex_to_float(data[(i*12)+951:(i*12)+955])))
+        self.footSpeed2Body = []
+        for i in range(4):
+            self.footSpeed2Body.append(cartesian(hex_to_float(data[(i*12)+991:(i*12)+995]), hex_to_float(data[(i*12)+995:(i*12)+999]), hex_to_float(data[(i*12)+999:(i*12)+1003])))
+        self.wirelessRemote = data[1039:1079]
+        self.reserve = data[1079:1083]
+        self.crc = data[1083:1087]
+
+class lowState:
+    def dataToBmsState(self,data):
+        version_h = data[0]
+        version_l = data[1]
+        bms_status = data[2]
+        SOC = data[3]
+        current = int.from_bytes(data[4:8], byteorder='little', signed=True)
+        cycle = int.from_bytes(data[8:10], byteorder='little')
+        BQ_NTC = [data[10], data[11]]
+        MCU_NTC = [data[12], data[13]]
+        cell_vol = [data[14] * 32, data[15] * 32, data[16] * 32, data[17] * 32, data[18] * 32, data[19] * 32, data[20] * 32, data[21] * 32, data[22] * 32, data[23] * 32]
+        return bmsState(version_h, version_l, bms_status, SOC, current, cycle, BQ_NTC, MCU_NTC, cell_vol)
+
+
+    def dataToImu(self, data):
+        quaternion = [hex_to_float(data[0:4]), hex_to_float(data[4:8]), hex_to_float(data[8:12]), hex_to_float(data[12:16])]
+        gyroscope = [hex_to_float(data[16:20]), hex_to_float(data[20:24]), hex_to_float(data[24:28])]
+        accelerometer = [hex_to_float(data[28:32]), hex_to_float(data[32:36]), hex_to_float(data[36:40])]
+        rpy = [hex_to_float(data[40:44]), hex_to_float(data[44:48]), hex_to_float(data[48:52])]
+        temperature = data[52]
+        return imu(quaternion, gyroscope, accelerometer, rpy, temperature)
+
+    def dataToMotorState(self, data):
+        mode = data[0]
+        q = hex_to_float(data[1:5])
+        dq = hex_to_float(data[5:9])
+        ddq = float(int.from_bytes(data[9:11], byteorder='little', signed=True))
+        tauEst = float(int.from_bytes(data[11:13], byteorder='little', signed=True)) * 0.00390625
+        q_raw = hex_to_float(data[13:17])
+        dq_raw = hex_to_float(data[17:21])
+        ddq_raw = float(int.from_bytes(data[21:23], byteorder='little', signed=True))
+        temperature = data[24]
+        reserve = [int.from_bytes(data[24:28], byteorder='little'), int.from_bytes(data[28:32], byteorder='little')]
+        return motorState(mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, reserve)
+
+    def parseData(self, data):
+        self.head = hex(int.from_bytes(data[0:2], byteorder='little'))
+        self.levelFlag = data[2]
+        self.frameReserve = data[3]
+        self.SN = data[4:12]
+        self.version = data[12:20]
+        self.bandWidth = int.from_bytes(data[20:22], byteorder='little')
+        self.imu = self.dataToImu(data[22:75])
+        self.motorState=[]
+        for i in range(20):
+            self.motorState.append(self.dataToMotorState(data[(i*32)+75:(i*32)+32+75]))
+        self.bms=self.dataToBmsState(data[715:739])
+        self.footForce = [int.from_bytes(data[739:741], byteorder='little'), int.from_bytes(data[751:753], byteorder='little'), int.from_bytes(data[753:755], byteorder='little'), int.from_bytes(data[755:757], byteorder='little')]
+        self.footForceEst = [int.from_bytes(data[747:749], byteorder='little'), int.from_bytes(data[759:761], byteorder='little'), int.from_bytes(data[761:763], byteorder='little'), int.from_bytes(data[763:765], byteorder='little')]
+        self.mode = data[755:759]
+        self.wirelessRemote = data[759:799]
+        self.reserve = data[799:803]
+        self.crc = data[803:807]
+        return True
+
+# lowCmd.buildCmd as it was (motorCmd.getBytes / motorCmdArray.getBytes inlined), working on a lowCmd instance
+
+def motorCmdBytes(mcmd):
+    from enum import Enum
+    mode = mcmd.mode.value if isinstance(mcmd.mode, Enum) else mcmd.mode
+    return (mode).to_bytes(1, byteorder='little') + float_to_hex(mcmd.q) + float_to_hex(mcmd.dq) + tau_to_hex(mcmd.tau) + kp_to_hex(mcmd.Kp) + kd_to_hex(mcmd.Kd) + mcmd.reserve[0].to_bytes(4, byteorder='little') + mcmd.reserve[1].to_bytes(4, byteorder='little') + mcmd.reserve[2].to_bytes(4, byteorder='little')
+
+MOTOR_NAMES = ('FR_0', 'FR_1', 'FR_2', 'FL_0', 'FL_1', 'FL_2', 'RR_0', 'RR_1', 'RR_2', 'RL_0', 'RL_1', 'RL_2',
+               'Unknown1', 'Unknown2', 'Unknown3', 'Unknown4', 'Unknown5', 'Unknown6', 'Unknown7', 'Unknown8')
+
+def buildLowCmd(lcmd, genCrc=genCrc):
+    cmd = bytearray(614)
+    cmd[0:2] = lcmd.head
+    cmd[2] = lcmd.levelFlag
+    cmd[3] = lcmd.frameReserve
+
+    cmd[4:12] = lcmd.SN
+    cmd[12:20] = lcmd.version
+    cmd[20:22] = lcmd.bandWidth
+
+    motors = b''
+    for name in MOTOR_NAMES:
+        motors = motors + motorCmdBytes(getattr(lcmd.motorCmd, name))
+    cmd[22:562] = motors
+    cmd[562:566] = lcmd.bms.getBytes()
+    cmd[566:606] = lcmd.wirelessRemote
+
+    if lcmd.encrypt:
+        cmd[-4:] = encryptCrc(genCrc(cmd[:-6]))
+    else:
+        cmd[-4:] = genCrc(cmd[:-6])
+    return cmd
+
+class motorCmdArray:
+    # Just enough of the original motorCmdArray (20 motorCmd attributes) for buildLowCmd
+    def __init__(self):
+        from ucl.complex import motorCmd
+        from ucl.enums import MotorModeLow
+        for name in MOTOR_NAMES:
+            setattr(self, name, motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0]))
+
+    def setMotorCmd(self, motorIndex, motorCmd):
+        setattr(self, motorIndex if isinstance(motorIndex, str) else MOTOR_NAMES[motorIndex], motorCmd)
@@ -0,0 +1,20 @@
+# Foot contact estimator: its cost per packet on a noisy gait-like force stream (checked in tests/test_contact.py)
+# Run from the repository root: python3 -m benchmarks.bench_contact
+import struct
+
+from ucl.contact import contactEstimator
+from ucl.layout import HIGH_STATE_LAYOUT
+from benchmarks.harness import perPacket, report
+from tests.helpers import gait
+
+def main():
+    packets = []
+    for sample in gait(1000):
+        data = bytearray(HIGH_STATE_LAYOUT.size)
+        struct.pack_into('<4h', data, HIGH_STATE_LAYOUT.offset('footForce'), *sample)
+        packets.append(bytes(data))
+    contacts = contactEstimator()
+    report('contactEstimator.feed', perPacket(contacts.feed, packets, number=5))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# CRC microbenchmark: bit-serial baseline vs. the table driven engine in ucl.common (checked in tests/test_crc.py)
+# Run from the repository root: python3 -m benchmarks.bench_crc
+import os
+
+from ucl.common import genCrc, encryptCrc, frameCrc
+from benchmarks import baseline
+from benchmarks.harness import best
+from tests.helpers import FRAMES
+
+def bench(func, body, number):
+    return best(lambda: encryptCrc(func(body)), number, repeat=5) * 1e6
+
+def main():
+    for name, (size, tail, prefix, static) in FRAMES.items():
+        frame = bytearray(os.urandom(size))
+        body = frame[:-tail]
+        cache = frameCrc(size - tail, prefix, static)
+        before = bench(baseline.genCrc, body, 200)
+        after = bench(genCrc, body, 5000)
+        # Like a control loop driving a few motors: the first motor slots change every frame, the rest hit the cache
+        def changed(_):
+            frame[prefix:prefix + 48] = os.urandom(48)
+            return cache.compute(frame)
+        incremental = bench(changed, body, 5000)
+        print(f'{name}:\tbefore {before:8.1f} us/frame\ttables {after:6.1f} us/frame ({before / after:5.1f}x)'
+              f'\tcached blocks {incremental:6.1f} us/frame ({before / incremental:5.1f}x)')
+
+if __name__ == "__main__":
+    main()
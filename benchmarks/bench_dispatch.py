@@ -0,0 +1,25 @@
+# Receive path dispatch: the cost per packet of classifying datagrams by length, head and levelFlag and of the link monitor
+# (checked in tests/test_dispatch.py)
+# Run from the repository root: python3 -m benchmarks.bench_dispatch
+from ucl.highState import HIGH_STATE_LENGTH
+from ucl.unitreeConnection import unitreeConnection, linkMonitor, classifyPacket, HIGH_STATE, LOW_STATE
+from benchmarks.harness import best, report
+from tests.helpers import packet, lowPacket
+
+def main():
+    conn = unitreeConnection()
+    data = [packet(HIGH_STATE_LENGTH, 0x00) for _ in range(500)]
+    low = [lowPacket(i * 2) for i in range(500)]
+    monitor = linkMonitor()
+    for name, func, data in (('classifyPacket', classifyPacket, data), ('dispatch', conn.dispatch, data),
+                             ('monitor, high', lambda paket: monitor.update(HIGH_STATE, paket, 0.0), data),
+                             ('monitor, low', lambda paket: monitor.update(LOW_STATE, paket, 0.0), low)):
+        def run():
+            for paket in data:
+                func(paket)
+            conn.getData()
+        report(name, best(run, number=10) / len(data))
+    conn.sock.close()
+
+if __name__ == "__main__":
+    main()
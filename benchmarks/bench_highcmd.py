@@ -0,0 +1,23 @@
+# highCmd encoder benchmark: original slice/float_to_hex builder vs. the precompiled struct encoder, the frames
+# are checked byte for byte in tests/test_highcmd.py. Run from the repository root: python3 -m benchmarks.bench_highcmd
+from ucl.common import genCrc
+from ucl.highCmd import highCmd
+from benchmarks import baseline
+from benchmarks.harness import best
+from tests.helpers import randomize
+
+def main():
+    hcmd = highCmd()
+    randomize(hcmd, 1)
+    cases = {'original builder': lambda: baseline.buildHighCmd(hcmd, baseline.genCrc),
+             'original builder, table crc': lambda: baseline.buildHighCmd(hcmd, genCrc),
+             'struct encoder': lambda: hcmd.buildCmd()}
+    results = {}
+    for name, func in cases.items():
+        number = 200 if 'table' not in name and 'struct' not in name else 5000
+        results[name] = best(func, number, repeat=5) * 1e6
+    for name, cost in results.items():
+        print(f'{name:30s} {cost:8.1f} us/frame\t({results["original builder"] / cost:5.1f}x)')
+
+if __name__ == "__main__":
+    main()
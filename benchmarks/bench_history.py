@@ -0,0 +1,38 @@
+# State history benchmark: cost of stateHistory.append per packet, and rolling statistics over a window
+# of the columnar history vs. a list of parsed highStates. The windows are checked in tests/test_history.py.
+# Run from the repository root: python3 -m benchmarks.bench_history
+from collections import deque
+
+import numpy as np
+
+from ucl.highState import highState, HIGH_STATE_LENGTH
+from ucl.layout import HIGH_STATE_LAYOUT
+from ucl.history import stateHistory
+from benchmarks.harness import best, report
+from tests.helpers import FIELDS, packets
+
+def main():
+    data = packets(HIGH_STATE_LENGTH, 500)
+    history = stateHistory(HIGH_STATE_LAYOUT, FIELDS, capacity=2500)
+    report(f'append ({len(FIELDS)} fields)', best(lambda: history.extend(data), number=5) / len(data))
+
+    # Mean rpy and footForce of the last 250 samples
+    states = deque(maxlen=2500)
+    for paket in data * 5:
+        state = highState()
+        state.parseData(paket)
+        states.append(state)
+    def lists():
+        recent = list(states)[-250:]
+        rpy = [sum(s.imu.rpy[k] for s in recent) / 250 for k in range(3)]
+        force = [sum(s.footForce[k] for s in recent) / 250 for k in range(4)]
+        return rpy, force
+    def columns():
+        return history.window('imu.rpy', 250).mean(axis=0), history.window('footForce', 250).mean(axis=0)
+    before = best(lists, number=50)
+    with np.errstate(invalid='ignore', over='ignore'):        # random packets hold nan / inf floats
+        after = best(columns, number=50)
+    print(f'mean rpy + footForce over 250 samples:\tlist of highStates {before * 1e6:8.1f} us\tstateHistory {after * 1e6:6.1f} us\t({before / after:.1f}x)')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# lowCmd encoder benchmark: original getBytes concatenation vs. the persistent frame buffer.
+# Simulates the low level examples: every tick three motors get a fresh motorCmd, the rest stay put.
+# The frames are checked byte for byte in tests/test_lowcmd.py. Run from the repository root: python3 -m benchmarks.bench_lowcmd
+import tracemalloc
+
+from ucl.common import genCrc
+from ucl.layout import LOW_CMD_LAYOUT
+from ucl.lowCmd import lowCmd
+from benchmarks import baseline
+from benchmarks.harness import best
+from tests.helpers import tick
+
+def packMotors(lcmd, t):
+    # tick, then everything buildCmd does before the crc
+    tick(lcmd, t)
+    lcmd.motorCmd.packInto(lcmd.buffer, LOW_CMD_LAYOUT.offset('motorCmd'))
+
+def allocations(build, lcmd, ticks=200, prepare=tick):
+    # Peak of temporary memory while building one frame
+    peaks = []
+    tracemalloc.start()
+    for t in range(ticks):
+        prepare(lcmd, t)
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        build(lcmd)
+        peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+def main():
+    cases = (('original builder', lambda lcmd: baseline.buildLowCmd(lcmd, baseline.genCrc), 20, True),
+             ('original builder, table crc', lambda lcmd: baseline.buildLowCmd(lcmd, genCrc), 500, True),
+             ('persistent buffer', lambda lcmd: lcmd.buildCmd(), 500, False))
+    results = {}
+    for name, build, number, legacy in cases:
+        lcmd = lowCmd()
+        if legacy:
+            lcmd.motorCmd = baseline.motorCmdArray()
+        counter = iter(range(10**9))
+
+        def run():
+            t = next(counter)
+            tick(lcmd, t)
+            build(lcmd)
+        cost = best(run, number, repeat=5) * 1e6
+        lcmd = lowCmd()
+        if legacy:
+            lcmd.motorCmd = baseline.motorCmdArray()
+        results[name] = (cost, allocations(build, lcmd))
+    for name, (cost, peak) in results.items():
+        print(f'{name:30s} {cost:8.1f} us/tick\t({results["original builder"][0] / cost:5.1f}x)\t{peak:8.0f} bytes peak temporary memory/tick')
+    # What the crc still allocates are python ints: the running crc and the crcs of the blocks that changed
+    crc = LOW_CMD_LAYOUT.offset('crc')
+    peak = allocations(lambda lcmd: lcmd.crcCache.packInto(lcmd.buffer, crc, lcmd.encrypt), lowCmd(), prepare=packMotors)
+    print(f'{"of which the frame crc":30s} {"":8s}        \t        \t{peak:8.0f} bytes (python ints, no buffers)')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Latest-state mailbox: only the newest packet behind a sequence counter, get_latest cost independent of how
+# long nobody read, and the wakeup latency of wait_newer. The mailbox itself is checked in tests/test_mailbox.py.
+# Run from the repository root: python3 -m benchmarks.bench_mailbox
+import threading
+import time
+
+from ucl.common import latestPacket
+from ucl.highState import HIGH_STATE_LENGTH
+from ucl.mailbox import stateMailbox
+from ucl.unitreeConnection import unitreeConnection, HIGH_STATE
+from benchmarks.harness import best, report
+from tests.helpers import state
+
+def main():
+    packets = [state(n) for n in range(500)]
+    # Reading the newest state after the caller was away for a while: ring backlog vs mailbox
+    for backlog in (1, 10, 100, 255):
+        ring = unitreeConnection()
+        mail = unitreeConnection(mailbox=True)
+        def fill(conn):
+            for data in packets[:backlog]:
+                conn.dispatch(data)
+        def viaRing():
+            fill(ring)
+            return latestPacket(ring.getData(HIGH_STATE), HIGH_STATE_LENGTH)
+        fillTime = best(lambda: fill(mail), number=100)
+        ringTime = best(viaRing, number=100) - fillTime
+        # the mailbox read does not depend on the backlog, only the last packet is there
+        mailTime = best(mail.get_latest, number=100000)
+        print(f'newest state after {backlog:3d} unread:\tgetData + latestPacket {max(ringTime, 0) * 1e6:7.2f} us\tget_latest {max(mailTime, 0) * 1e6:5.2f} us')
+        ring.sock.close()
+        mail.sock.close()
+
+    conn = unitreeConnection(mailbox=True)
+    report('dispatch into the mailbox', best(lambda: conn.dispatch(packets[0]), number=20000))
+    conn.sock.close()
+
+    # Wakeup latency of an event driven loop: put in one thread, wait_newer in another
+    mailbox, delays = stateMailbox(decode=lambda data: time.perf_counter()), []     # state is the time of put
+    def consumer():
+        seq = 0
+        while seq < 200:
+            latest = mailbox.wait_newer(seq, timeout=1.0)
+            delays.append(time.perf_counter() - latest[3])
+            seq = latest[0]
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    for n in range(200):
+        while not mailbox.waiting:
+            time.sleep(0)
+        mailbox.put(packets[0], HIGH_STATE)
+        time.sleep(0.002)
+    thread.join()
+    delays.sort()
+    print(f'wait_newer wakeup\tmedian {delays[len(delays) // 2] * 1e6:.0f} us\tp99 {delays[int(len(delays) * 0.99)] * 1e6:.0f} us')
+
+if __name__ == "__main__":
+    main()
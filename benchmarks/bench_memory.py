@@ -0,0 +1,60 @@
+# Memory benchmark for the state parsers: original __dict__ classes vs. __slots__ classes, and parsing in place.
+# Reports the size of a parsed state, the objects / lists replaced per packet and the memory one parse allocates.
+# Run from the repository root: python3 -m benchmarks.bench_memory
+import sys
+import tracemalloc
+
+from ucl.common import obj_fields
+from ucl.highState import highState, HIGH_STATE_LENGTH
+from ucl.lowState import lowState, LOW_STATE_LENGTH
+from benchmarks import baseline
+from tests.helpers import HIGH_ATTRS, LOW_ATTRS, packets
+
+def walk(obj, seen):
+    ''' ids and sizes of obj and everything it references (instances, their __dict__, lists, values) '''
+    if id(obj) in seen:
+        return
+    seen[id(obj)] = (obj, sys.getsizeof(obj), isinstance(obj, list) or hasattr(obj, '__dict__') or hasattr(type(obj), '__slots__'))
+    if hasattr(obj, '__dict__'):
+        seen[id(obj.__dict__)] = (obj.__dict__, sys.getsizeof(obj.__dict__), False)
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            walk(item, seen)
+    elif hasattr(obj, '__dict__') or hasattr(type(obj), '__slots__'):
+        for value in obj_fields(obj).values():
+            walk(value, seen)
+
+def containers(state, attrs):
+    seen = {}
+    for attr in attrs:
+        walk(getattr(state, attr, None), seen)        # the original lowState has no tick
+    return seen
+
+def measure(state, size, attrs, count=200):
+    data = packets(size, count)
+    state.parseData(data[0])
+    replaced, allocated = [], []
+    tracemalloc.start()
+    for paket in data[1:]:
+        # The previous objects stay referenced during the parse, so their memory and ids are not reused
+        before = containers(state, attrs)
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        state.parseData(paket)
+        allocated.append(tracemalloc.get_traced_memory()[1] - start)
+        after = containers(state, attrs)
+        replaced.append(sum(1 for k, (_, _, container) in after.items() if container and k not in before))
+        del before, after
+    tracemalloc.stop()
+    retained = sum(size for _, size, _ in containers(state, attrs).values())
+    return retained, sum(replaced) / len(replaced), sum(allocated) / len(allocated)
+
+def main():
+    for name, size, attrs, cases in (('highState', HIGH_STATE_LENGTH, HIGH_ATTRS, (('original', baseline.highState()), ('__slots__', highState()), ('__slots__, in place', highState(inPlace=True)))),
+                                     ('lowState', LOW_STATE_LENGTH, LOW_ATTRS, (('original', baseline.lowState()), ('__slots__', lowState()), ('__slots__, in place', lowState(inPlace=True))))):
+        for case, state in cases:
+            retained, replaced, allocated = measure(state, size, attrs)
+            print(f'{name}, {case:20s}\tstate {retained:6d} bytes\t{replaced:5.1f} objects/lists replaced per packet\t{allocated:7.0f} bytes allocated per parse')
+
+if __name__ == "__main__":
+    main()
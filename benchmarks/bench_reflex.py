@@ -0,0 +1,23 @@
+# Obstacle reflex: trips on rangeObstacle from the receive path and preempts the routine's commands.
+# Commands go to a local udp socket, so no robot is needed. The reflex is checked in tests/test_reflex.py.
+# Run from the repository root: python3 -m benchmarks.bench_reflex
+from ucl.reflex import obstacleReflex
+from benchmarks.harness import best, perPacket, report
+from tests.helpers import commandLoopback, withRanges
+
+def main():
+    conn, robot = commandLoopback()
+    reflex = obstacleReflex(conn, threshold=0.3)
+    clear = [withRanges((1.0, 1.0, 1.0, 1.0)) for _ in range(500)]
+    report('feed, no obstacle', perPacket(reflex.feed, clear))
+    close = withRanges((1.0, 0.1, 1.0, 1.0))
+    def trip():
+        reflex.feed(close)
+        reflex.reset()
+    per = best(trip, number=1000)
+    print(f'packet to safe command on the wire {per * 1e6:6.1f} us')
+    conn.sock.close()
+    robot.close()
+
+if __name__ == "__main__":
+    main()
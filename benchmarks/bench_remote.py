@@ -0,0 +1,17 @@
+# Wireless remote decoder and button events: the cost per packet, the check against the sdk layout is tests/test_remote.py
+# Run from the repository root: python3 -m benchmarks.bench_remote
+from ucl.layout import HIGH_STATE_LAYOUT
+from ucl.remote import remoteEvents, remoteOf
+from benchmarks.harness import perPacket, report
+from tests.helpers import withRemote
+
+def main():
+    events = remoteEvents()
+    events.onPress('B', lambda: None)
+    idle = [withRemote(HIGH_STATE_LAYOUT, 0) for _ in range(500)]
+    toggling = [withRemote(HIGH_STATE_LAYOUT, (i & 1) << 9) for i in range(500)]
+    for name, func, data in (('remoteOf', remoteOf, idle), ('feed, no change', events.feed, idle), ('feed, B toggling', events.feed, toggling)):
+        report(name, perPacket(func, data))
+
+if __name__ == "__main__":
+    main()
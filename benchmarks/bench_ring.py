@@ -0,0 +1,30 @@
+# Receive ring benchmark: memory held by packets nobody picked up, the unbounded list before vs. the fixed ring.
+# The ring itself is checked in tests/test_ring.py.
+# Run from the repository root: python3 -m benchmarks.bench_ring
+import tracemalloc
+
+from ucl.packetRing import packetRing
+from ucl.unitreeConnection import HIGH_STATE
+from tests.helpers import state
+
+def main():
+    # Memory held by packets nobody picked up: unbounded list before, fixed ring now
+    packets = [state(n) for n in range(5000)]
+    backlog = []
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    for data in packets:
+        backlog.append(bytes(memoryview(data)))     # recv(2048) returns a new bytes object
+    listBytes = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    ring = packetRing()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    for data in packets:
+        ring.put(data, HIGH_STATE)
+    ringBytes = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    print(f'5000 unread packets:\tlist {listBytes / 1e6:6.2f} MB growing\tring {len(ring.buffer) / 1e6:6.2f} MB fixed, {ringBytes / 5000:.1f} bytes allocated per packet')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# State decoder benchmark: original highState/lowState.parseData vs. the current decoders, the decoded states are
+# checked against the original parsers in tests/test_state.py. Run from the repository root: python3 -m benchmarks.bench_state
+from ucl.highState import highState, lazyHighState, decodeHighState, decodeHighStates, latestHighState, highStateFields, HIGH_STATE_LENGTH
+from ucl.lowState import lowState, decodeLowState, LOW_STATE_LENGTH
+from benchmarks import baseline
+from benchmarks.harness import perPacket, rate, report
+from tests.helpers import PROJECTIONS, packets
+
+def main():
+    high, low = packets(HIGH_STATE_LENGTH, 500), packets(LOW_STATE_LENGTH, 500, seed=1)
+    for name, data, old, new in (('highState', high, baseline.highState(), highState()),
+                                 ('lowState', low, baseline.lowState(), lowState()),
+                                 ('highState, in place', high, baseline.highState(), highState(inPlace=True)),
+                                 ('lowState, in place', low, baseline.lowState(), lowState(inPlace=True))):
+        before = rate(old.parseData, data)
+        after = rate(new.parseData, data)
+        print(f'{name} parseData:\tbefore {before:8.0f} packets/s\tafter {after:8.0f} packets/s\t({after / before:4.1f}x)')
+
+    before = rate(baseline.highState().parseData, high)
+    lazy = lazyHighState()
+    def joints(paket):
+        lazy.parseData(paket)
+        return [m.q for m in lazy.motorstate[:12]]
+    after = rate(joints, high)
+    print(f'lazyHighState, joints:\tbefore {before:8.0f} packets/s\tafter {after:8.0f} packets/s\t({after / before:4.1f}x)')
+    after = rate(decodeHighState, high)
+    print(f'decodeHighState:\tbefore {before:8.0f} packets/s\tafter {after:8.0f} packets/s\t({after / before:4.1f}x)')
+    after = rate(lambda paket: decodeHighState(paket).motorstate.q[:12].tolist(), high)
+    print(f'  + 12 joint angles:\tbefore {before:8.0f} packets/s\tafter {after:8.0f} packets/s\t({after / before:4.1f}x)')
+    backlog(high)
+    for names in PROJECTIONS:
+        after = rate(highStateFields(*names), high)
+        print(f'highStateFields{names}:\tbefore {before:8.0f} packets/s\tafter {after:8.0f} packets/s\t({after / before:4.1f}x)')
+    lowStream(low)
+
+def backlog(data, size=50, number=20):
+    ''' Time to get through getData() backlogs of size packets, in packets/s '''
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    old = baseline.highState()
+    def loop(chunk):
+        for paket in chunk:
+            old.parseData(paket)
+    for name, func in (('batch', decodeHighStates), ('latest only', latestHighState)):
+        before = rate(loop, chunks, number) * size
+        after = rate(func, chunks, number) * size
+        print(f'{size} packet backlog, {name}:\tbefore {before:8.0f} packets/s\tafter {after:8.0f} packets/s\t({after / before:4.1f}x)')
+
+def lowStream(data):
+    ''' Per-packet cost of getting q/dq/ddq/tauEst/temperature of all 20 motors, against the 1 ms of a 1 kHz stream '''
+    old = baseline.lowState()
+    def before(paket):
+        old.parseData(paket)
+        motors = old.motorState
+        return [m.q for m in motors], [m.dq for m in motors], [m.ddq for m in motors], [m.tauEst for m in motors], [m.temperature for m in motors]
+    def after(paket):
+        motors = decodeLowState(paket).motorState
+        return motors.q, motors.dq, motors.ddq, motors.tauEst, motors.temperature
+    for name, func in (('original lowState', before), ('decodeLowState', after)):
+        report(f'1 kHz lowState stream, {name}', perPacket(func, data), width=40, hz=1000)
+
+if __name__ == "__main__":
+    main()
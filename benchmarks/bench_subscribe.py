@@ -0,0 +1,42 @@
+# State-change subscriptions: what an unchanged packet costs compared to parsing it and diffing the fields, the
+# callbacks are checked in tests/test_subscribe.py. Run from the repository root: python3 -m benchmarks.bench_subscribe
+from ucl.highState import highState, highStateFields
+from ucl.layout import HIGH_STATE_LAYOUT
+from ucl.subscribe import stateSubscriptions
+from benchmarks.harness import perPacket, report
+from tests.helpers import randomBytes, withFields
+
+def main():
+    base = withFields(HIGH_STATE_LAYOUT)
+    # A stream where the watched fields stay the same and everything else (imu, motors, ...) changes
+    watched = [HIGH_STATE_LAYOUT.slice(name) for name in ('mode', 'gaitType', 'bms', 'footForce')]
+    data = []
+    for _ in range(500):
+        paket = bytearray(randomBytes(HIGH_STATE_LAYOUT.size))
+        for span in watched:
+            paket[span] = base[span]
+        data.append(bytes(paket))
+    subs = stateSubscriptions(HIGH_STATE_LAYOUT)
+    for name in ('mode', 'gaitType', 'bms.SOC', 'footForce'):
+        subs.subscribe(name, lambda value, old: None)
+    state = highState(inPlace=True)
+    previous = {}
+    def poll(paket):
+        state.parseData(paket)
+        current = {'mode': state.mode, 'gaitType': state.gaitType, 'SOC': state.bms.SOC, 'footForce': list(state.footForce)}
+        changed = current != previous
+        previous.update(current)
+        return changed
+    decode = highStateFields('mode', 'gaitType', 'bms.SOC', 'footForce')
+    last = [None]
+    def project(paket):
+        values = decode(paket)
+        changed = values != last[0]
+        last[0] = values
+        return changed
+    # per unchanged packet
+    for name, func in (('parse + diff', poll), ('highStateFields + diff', project), ('subscriptions', subs.feed)):
+        report(name, perPacket(func, data))
+
+if __name__ == "__main__":
+    main()
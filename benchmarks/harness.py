@@ -0,0 +1,24 @@
+# Timing and reporting shared by the benchmarks. The packets they time come from tests/helpers.py, their correctness
+# checks are in tests/ (python3 -m pytest tests).
+import timeit
+
+RATE = 500              # Hz, what the robot sends states at and a control loop runs at
+
+def best(func, number, repeat=3):
+    ''' Seconds per call of func, the best of repeat runs of number calls '''
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+def perPacket(func, packets, number=10, repeat=3):
+    ''' Seconds per packet of func(packet) over the whole list, the best of repeat runs '''
+    def run():
+        for paket in packets:
+            func(paket)
+    return best(run, number, repeat) / len(packets)
+
+def rate(func, packets, number=5, repeat=3):
+    ''' Packets per second func(packet) keeps up with '''
+    return 1 / perPacket(func, packets, number, repeat)
+
+def report(name, per, width=24, hz=RATE):
+    ''' One line for a per packet cost: the time and the share of one core it takes at hz packets per second '''
+    print(f'{name:{width}s}{per * 1e6:8.2f} us/packet\t{per * hz * 100:7.3f} % of one core at {hz} Hz')
@@ -1,13 +1,17 @@
-from ucl.common import byte_print, decode_version, decode_sn, getVoltage, pretty_print_obj, lib_version
+from ucl.common import byte_print, decode_version, decode_sn, getVoltage, pretty_print_obj, lib_version, latestPacket
 from ucl.highCmd import highCmd
-from ucl.highState import highState
+from ucl.highState import highState, lazyHighState, HIGH_STATE_LENGTH
 from ucl.lowCmd import lowCmd
-from ucl.unitreeConnection import unitreeConnection, HIGH_WIFI_DEFAULTS, HIGH_WIRED_DEFAULTS
+from ucl.unitreeConnection import unitreeConnection, HIGH_WIFI_DEFAULTS, HIGH_WIRED_DEFAULTS, HIGH_STATE
 from ucl.enums import MotorModeHigh, GaitType, SpeedLevel
 from ucl.complex import motorCmd, led
+from ucl.remote import remoteEvents
+from ucl.reflex import obstacleReflex
+from ucl.contact import contactEstimator
 
 import time
 import datetime
+from threading import Event
 
 import math
 import random
@@ -29,9 +33,11 @@ class MotorControl:
     Creates a MotorControl object. The arguments that need to be passed are:
         
         printer = ['all', 'minimal', None] -> depicts what will be printed when control is activated
+        remote = [True, False] -> start routines with A on the handheld remote (instead of 'enter'), B aborts them
+        obstacle_stop = [None, distance] -> FORCE_STAND and abort the routine when an obstacle is closer than this
     '''
 
-    def __init__(self, time_signature=4, printer=None):
+    def __init__(self, time_signature=4, printer=None, remote=False, obstacle_stop=None):
         '''
         You can use one of the 3 Presets WIFI_DEFAULTS, LOW_CMD_DEFAULTS or HIGH_CMD_DEFAULTS.
         IF NONE OF THEM ARE WORKING YOU CAN DEFINE A CUSTOM ONE LIKE THIS:
@@ -54,6 +60,7 @@ class MotorControl:
         self.phase_array = None
         self.printer = printer
         self.publish_hz = None
+        self.remote = remote
         self.sin_func_array = None
         self.sleep_override = None
         self.time_signature = time_signature
@@ -71,10 +78,25 @@ class MotorControl:
             self.printer = None
 
 
-        self.conn = unitreeConnection(HIGH_WIFI_DEFAULTS)   # Creates a new connection object with HIGH_WIFI_DEFAULTS named 'conn'
+        self.conn = unitreeConnection(HIGH_WIFI_DEFAULTS, mailbox=True)   # Creates a new connection object with HIGH_WIFI_DEFAULTS named 'conn', keeping only the newest state
         self.conn.startRecv()                               # Starts up connection
         self.hcmd = highCmd()                               # Creates the highCmd object named hcmd
-        self.hstate = highState()                           # Creates the highState object named hstate
+        self.hstate = lazyHighState()                       # Creates the highState object named hstate (fields are decoded when read)
+
+        self.remote_go = Event()                            # Set when A is pressed on the remote
+        self.abort = Event()                                # Set when B is pressed on the remote or the obstacle reflex trips
+        self.remote_events = remoteEvents()                 # Button press / release callbacks, run from the receive thread
+        self.remote_events.onPress('A', self.remote_go.set)
+        self.remote_events.onPress('B', self.abort.set)
+        self.conn.watch(HIGH_STATE, self.remote_events.feed)
+
+        self.contacts = contactEstimator()                  # Foot contact (self.contacts.contact) and touchdown / liftoff times
+        self.conn.watch(HIGH_STATE, self.contacts.feed)
+
+        self.reflex = None                                  # Stands the robot from the receive thread, see clear_obstacle_stop
+        if obstacle_stop is not None:
+            self.reflex = obstacleReflex(self.conn, threshold=obstacle_stop, onTrip=self.abort.set)
+            self.conn.watch(HIGH_STATE, self.reflex.feed, first=True)   # ahead of the other listeners
 
 
         cmd_bytes = self.hcmd.buildCmd(debug=False)         # Builds an empty command
@@ -94,28 +116,27 @@ class MotorControl:
         if self.printer:
             print(">> Parsing Data\n")        
 
-        data = self.conn.getData()              # Get the data from the connection object
-
-        paket_count = 0                         # Parse the data
-        for paket in data:                      
-            self.hstate.parseData(paket)        
-
-            if self.printer == 'all' and paket_count == 0:
-                print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
-                print(f'SN [{byte_print(self.hstate.SN)}]:\t{decode_sn(self.hstate.SN)}')
-                print(f'Ver [{byte_print(self.hstate.version)}]:\t{decode_version(self.hstate.version)}')
-                print(f'SOC:\t\t\t{self.hstate.bms.SOC} %')
-                print(f'Overall Voltage:\t{getVoltage(self.hstate.bms.cell_vol)} mv') #something is still wrong here ?!
-                print(f'Current:\t\t{self.hstate.bms.current} mA')
-                print(f'Cycles:\t\t\t{self.hstate.bms.cycle}')
-                print(f'Temps BQ:\t\t{self.hstate.bms.BQ_NTC[0]} °C, {self.hstate.bms.BQ_NTC[1]}°C')
-                print(f'Temps MCU:\t\t{self.hstate.bms.MCU_NTC[0]} °C, {self.hstate.bms.MCU_NTC[1]}°C')
-                print(f'FootForce:\t\t{self.hstate.footForce}')
-                print(f'FootForceEst:\t\t{self.hstate.footForceEst}')
-                print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
-                print()
-                print()
-            paket_count += 1
+        data = self.conn.getData(HIGH_STATE)    # Get the newest highState packet (if new) from the connection object
+
+        if self.printer == 'all' and data:      # Print out the first packet
+            self.hstate.parseData(data[0])
+            print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
+            print(f'SN [{byte_print(self.hstate.SN)}]:\t{decode_sn(self.hstate.SN)}')
+            print(f'Ver [{byte_print(self.hstate.version)}]:\t{decode_version(self.hstate.version)}')
+            print(f'SOC:\t\t\t{self.hstate.bms.SOC} %')
+            print(f'Overall Voltage:\t{getVoltage(self.hstate.bms.cell_vol)} mv') #something is still wrong here ?!
+            print(f'Current:\t\t{self.hstate.bms.current} mA')
+            print(f'Cycles:\t\t\t{self.hstate.bms.cycle}')
+            print(f'Temps BQ:\t\t{self.hstate.bms.BQ_NTC[0]} °C, {self.hstate.bms.BQ_NTC[1]}°C')
+            print(f'Temps MCU:\t\t{self.hstate.bms.MCU_NTC[0]} °C, {self.hstate.bms.MCU_NTC[1]}°C')
+            print(f'FootForce:\t\t{self.hstate.footForce}')
+            print(f'FootForceEst:\t\t{self.hstate.footForceEst}')
+            print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
+            print()
+            print()
+        paket = latestPacket(data, HIGH_STATE_LENGTH)   # Every packet overwrites the previous one, only the newest is parsed
+        if paket is not None:
+            self.hstate.parseData(paket)
 
         return
 
@@ -124,8 +145,9 @@ class MotorControl:
     def get_joint_angles(self):
         ''' Get joint angles from the robot'''
 
-        data = self.conn.getData()              # Get the data from the connection object
-        self.hstate.parseData(data[0])          # Parse the data
+        _, _, paket, _ = self.conn.get_latest() # Get the newest highState packet from the connection object
+        if paket is not None:
+            self.hstate.parseData(paket)        # Parse the data
 
         joint_angles = np.array([self.hstate.motorstate[i].q for i in range(0, 12)])  # Get joint angles
 
@@ -133,6 +155,36 @@ class MotorControl:
     
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def confirm_start(self):
+        ''' Wait for the go to execute a routine: 'enter', or A on the remote. Returns False if B aborted it'''
+
+        if not self.remote:
+            print("Check set values and hit 'enter' to execute. 'ctrl + c' to abort.")
+            input()
+            return True
+
+        print("Check set values and press A on the remote to execute. B or 'ctrl + c' to abort.")
+        self.remote_go.clear()
+        self.abort.clear()
+        while not self.remote_go.wait(0.05):
+            if self.abort.is_set():
+                print(">> Aborted from the remote\n")
+                return False
+        return True
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def clear_obstacle_stop(self):
+        ''' Send the routine's commands again after the obstacle reflex stood the robot'''
+
+        if self.reflex is not None and self.reflex.tripped:
+            print(f">> Clearing obstacle stop (ranges were {self.reflex.ranges})\n")
+            self.reflex.reset()
+
+        return
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
     def recover_control(self):
         ''' Recover control and put robot into standing pose. Used at startup'''
 
@@ -500,9 +552,10 @@ class MotorControl:
         if self.dev_check or self.printer == 'all':
             self.status_printer()
 
-        if self.dev_check:
-            print("Check set values and hit 'enter' to execute. 'ctrl + c' to abort.")
-            input()
+        if self.dev_check and not self.confirm_start():
+            return
+
+        self.abort.clear()
 
         if self.printer:
             a = datetime.datetime.now()
@@ -510,6 +563,9 @@ class MotorControl:
         start = time.time()
 
         for self.timestep in range(0, self.publish_hz*self.loop_repeats):
+            if self.abort.is_set():      # B on the remote or the obstacle reflex
+                print(">> Aborted\n")
+                break
             
             # Set highCmd values 
             self.hcmd.mode = MotorModeHigh.FORCE_STAND   
@@ -709,9 +765,10 @@ class MotorControl:
         if self.dev_check or self.printer == 'all':
             self.status_printer()
 
-        if self.dev_check:
-            print("Check set values and hit 'enter' to execute. 'ctrl + c' to abort.")
-            input()
+        if self.dev_check and not self.confirm_start():
+            return
+
+        self.abort.clear()
 
         if self.printer:
             a = datetime.datetime.now()
@@ -719,6 +776,9 @@ class MotorControl:
         start = time.time()
 
         for self.timestep in range(0, self.publish_hz*self.loop_repeats):
+            if self.abort.is_set():      # B on the remote or the obstacle reflex
+                print(">> Aborted\n")
+                break
             
             # Set highCmd values 
             if self.timestep % self.publish_hz == 0:
@@ -963,9 +1023,10 @@ class MotorControl:
         if self.dev_check or self.printer == 'all':
             self.status_printer()
 
-        if self.dev_check:
-            print("Check set values and hit 'enter' to execute. 'ctrl + c' to abort.")
-            input()
+        if self.dev_check and not self.confirm_start():
+            return
+
+        self.abort.clear()
 
 
         # If there is a time delay, sleep first
@@ -973,6 +1034,10 @@ class MotorControl:
 
 
         for i in range(0, self.loop_repeats):
+            if self.abort.is_set():      # B on the remote or the obstacle reflex
+                print(">> Aborted\n")
+                break
+
             if self.printer:
                 a = datetime.datetime.now()
 
@@ -998,6 +1063,8 @@ class MotorControl:
                 body_height_steps_a_array[int(math.ceil(self.publish_hz/5)):] = [x + y for x, y in zip(body_height_steps_a_array[int(math.ceil(self.publish_hz/5)):], array_noise[int(math.ceil(self.publish_hz/5)):])]
 
             for self.timestep in range (0, move_step_qty):
+                if self.abort.is_set():  # B on the remote or the obstacle reflex, the outer loop stops too
+                    break
 
                 # Set highCmd values 
                 self.hcmd.mode = MotorModeHigh.FORCE_STAND   
@@ -1043,6 +1110,8 @@ class MotorControl:
             steps_b_range = int(move_step_qty + self.publish_hz*self.pose_duration) 
 
             for self.timestep in range (move_step_qty, steps_b_range):
+                if self.abort.is_set():  # B on the remote or the obstacle reflex, the outer loop stops too
+                    break
             
                 # Set highCmd values 
                 self.hcmd.mode = MotorModeHigh.FORCE_STAND   
@@ -1096,6 +1165,8 @@ class MotorControl:
             body_height_steps_c_array = udf.reverse_array(body_height_steps_a_array)
 
             for self.timestep in range (steps_b_range, steps_c_range):
+                if self.abort.is_set():  # B on the remote or the obstacle reflex, the outer loop stops too
+                    break
 
                 # Set highCmd values 
                 self.hcmd.mode = MotorModeHigh.FORCE_STAND   
@@ -1,8 +1,8 @@
-from ucl.common import byte_print, decode_version, decode_sn, getVoltage, pretty_print_obj, lib_version
+from ucl.common import byte_print, decode_version, decode_sn, getVoltage, pretty_print_obj, lib_version, latestPacket
 from ucl.highCmd import highCmd
-from ucl.highState import highState
+from ucl.highState import highState, lazyHighState, HIGH_STATE_LENGTH
 from ucl.lowCmd import lowCmd
-from ucl.unitreeConnection import unitreeConnection, HIGH_WIFI_DEFAULTS, HIGH_WIRED_DEFAULTS
+from ucl.unitreeConnection import unitreeConnection, HIGH_WIFI_DEFAULTS, HIGH_WIRED_DEFAULTS, HIGH_STATE
 from ucl.enums import MotorModeHigh, GaitType, SpeedLevel
 from ucl.complex import motorCmd, led
 
@@ -74,7 +74,7 @@ class MotorControl:
         self.conn = unitreeConnection(HIGH_WIFI_DEFAULTS)   # Creates a new connection object with HIGH_WIFI_DEFAULTS named 'conn'
         self.conn.startRecv()                               # Starts up connection
         self.hcmd = highCmd()                               # Creates the highCmd object named hcmd
-        self.hstate = highState()                           # Creates the highState object named hstate
+        self.hstate = lazyHighState()                       # Creates the highState object named hstate (fields are decoded when read)
 
 
         cmd_bytes = self.hcmd.buildCmd(debug=False)         # Builds an empty command
@@ -96,28 +96,27 @@ class MotorControl:
         if self.printer:
             print(">> Parsing Data\n")        
 
-        data = self.conn.getData()              # Get the data from the connection object
-
-        paket_count = 0                         # Parse the data
-        for paket in data:                      
-            self.hstate.parseData(paket)        
-
-            if self.printer == 'all' and paket_count == 0:
-                print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
-                print(f'SN [{byte_print(self.hstate.SN)}]:\t{decode_sn(self.hstate.SN)}')
-                print(f'Ver [{byte_print(self.hstate.version)}]:\t{decode_version(self.hstate.version)}')
-                print(f'SOC:\t\t\t{self.hstate.bms.SOC} %')
-                print(f'Overall Voltage:\t{getVoltage(self.hstate.bms.cell_vol)} mv') #something is still wrong here ?!
-                print(f'Current:\t\t{self.hstate.bms.current} mA')
-                print(f'Cycles:\t\t\t{self.hstate.bms.cycle}')
-                print(f'Temps BQ:\t\t{self.hstate.bms.BQ_NTC[0]} °C, {self.hstate.bms.BQ_NTC[1]}°C')
-                print(f'Temps MCU:\t\t{self.hstate.bms.MCU_NTC[0]} °C, {self.hstate.bms.MCU_NTC[1]}°C')
-                print(f'FootForce:\t\t{self.hstate.footForce}')
-                print(f'FootForceEst:\t\t{self.hstate.footForceEst}')
-                print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
-                print()
-                print()
-            paket_count += 1
+        data = self.conn.getData(HIGH_STATE)    # Get the highState packets from the connection object
+
+        if self.printer == 'all' and data:      # Print out the first packet
+            self.hstate.parseData(data[0])
+            print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
+            print(f'SN [{byte_print(self.hstate.SN)}]:\t{decode_sn(self.hstate.SN)}')
+            print(f'Ver [{byte_print(self.hstate.version)}]:\t{decode_version(self.hstate.version)}')
+            print(f'SOC:\t\t\t{self.hstate.bms.SOC} %')
+            print(f'Overall Voltage:\t{getVoltage(self.hstate.bms.cell_vol)} mv') #something is still wrong here ?!
+            print(f'Current:\t\t{self.hstate.bms.current} mA')
+            print(f'Cycles:\t\t\t{self.hstate.bms.cycle}')
+            print(f'Temps BQ:\t\t{self.hstate.bms.BQ_NTC[0]} °C, {self.hstate.bms.BQ_NTC[1]}°C')
+            print(f'Temps MCU:\t\t{self.hstate.bms.MCU_NTC[0]} °C, {self.hstate.bms.MCU_NTC[1]}°C')
+            print(f'FootForce:\t\t{self.hstate.footForce}')
+            print(f'FootForceEst:\t\t{self.hstate.footForceEst}')
+            print('+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=+=')
+            print()
+            print()
+        paket = latestPacket(data, HIGH_STATE_LENGTH)   # Every packet overwrites the previous one, only the newest is parsed
+        if paket is not None:
+            self.hstate.parseData(paket)
 
         return
 
@@ -127,7 +126,7 @@ class MotorControl:
     def get_joint_angles(self):
         ''' Get joint angles from the robot'''
 
-        data = self.conn.getData()              # Get the data from the connection object
+        data = self.conn.getData(HIGH_STATE)    # Get the highState packets from the connection object
         self.hstate.parseData(data[0])          # Parse the data
 
         joint_angles = np.array([self.hstate.motorstate[i].q for i in range(0, 12)])  # Get joint angles
@@ -0,0 +1,8 @@
+import pytest
+
+from tests import helpers
+
+@pytest.fixture(autouse=True)
+def seeded():
+    # the same random packets for a test whether it runs alone or after others
+    helpers.reseed()
@@ -0,0 +1,145 @@
+# Packets, commands and sockets the tests are built on, the benchmarks time the same ones.
+# Everything random comes from RNG, reseeded before every test (tests/conftest.py), so a failure replays.
+import math
+import random
+import socket
+import struct
+
+import numpy as np
+
+from ucl.common import genCrc, crcLength
+from ucl.complex import motorCmd
+from ucl.enums import MotorModeHigh, MotorModeLow, GaitType, SpeedLevel
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from ucl.unitreeConnection import unitreeConnection
+
+SEED = 0x5EED
+RNG = random.Random(SEED)
+
+def reseed(seed=SEED):
+    RNG.seed(seed)
+
+def randomBytes(size):
+    return RNG.randbytes(size)
+
+# What the original parsers set, the attributes a parsed state is compared and measured over
+ATTRS = ['head', 'levelFlag', 'frameReserve', 'SN', 'version', 'bandWidth', 'imu', 'bms', 'wirelessRemote', 'reserve', 'crc']
+HIGH_ATTRS = ATTRS + ['mode', 'motorstate', 'progress', 'gaitType', 'footRaiseHeight', 'position', 'bodyHeight', 'velocity',
+                      'yawSpeed', 'rangeObstacle', 'footPosition2Body', 'footSpeed2Body']
+LOW_ATTRS = ATTRS + ['motorState', 'footForce', 'footForceEst', 'tick']
+
+# The command frames: (frame size, bytes after the crc region, frameCrc prefix, frameCrc tail)
+FRAMES = {'highCmd (129 bytes)': (129, 5, 20, 68), 'lowCmd (614 bytes)': (614, 6, 20, 564)}
+
+# Field lists of typical consumers: the dance loops, and a contact check
+PROJECTIONS = (('imu.rpy', 'bodyHeight', 'mode'), ('footForce', 'motorstate.q'))
+
+# What a control loop keeps a history of
+FIELDS = ('imu.rpy', 'footForce', 'motorstate.q', 'bodyHeight', 'footPosition2Body')
+
+def packets(size, count, seed=SEED):
+    ''' count random packets of size bytes, the same for the same seed '''
+    rng = random.Random(seed)
+    return [rng.randbytes(size) for _ in range(count)]
+
+def lookup(state, path):
+    ''' The value of a field path like motorstate[7].dq on a decoded state '''
+    for token in path.split('.'):
+        attr, _, index = token.partition('[')
+        state = getattr(state, attr)
+        if index:
+            state = state[int(index.rstrip(']'))]
+    return state
+
+def packet(size, levelFlag):
+    data = bytearray(randomBytes(size))
+    data[0:3] = bytes((0xFE, 0xEF, levelFlag))
+    return bytes(data)
+
+def lowPacket(tick):
+    data = bytearray(packet(LOW_STATE_LAYOUT.size, 0xff))
+    LOW_STATE_LAYOUT.struct('tick').pack_into(data, LOW_STATE_LAYOUT.offset('tick'), tick)
+    return bytes(data)
+
+def state(n, valid=True):
+    ''' highState packet number n (in the SN field), with a valid crc unless valid=False '''
+    data = bytearray(packet(HIGH_STATE_LAYOUT.size, 0x00))
+    struct.pack_into('<I', data, 4, n)
+    if valid:
+        data[-4:] = genCrc(bytes(data[:crcLength(HIGH_STATE_LAYOUT.size)]))
+    return bytes(data)
+
+def withFields(layout, **fields):
+    ''' Random state packet with the given fields set, bms__SOC=80 sets bms.SOC '''
+    data = bytearray(packet(layout.size, 0x00 if layout is HIGH_STATE_LAYOUT else 0xff))
+    record = np.ndarray((), dtype=layout.dtype, buffer=data)
+    for name, value in fields.items():
+        *parents, last = name.split('__')
+        target = record
+        for parent in parents:
+            target = target[parent]
+        target[last] = value
+    return bytes(data)
+
+def withRanges(ranges):
+    data = bytearray(packet(HIGH_STATE_LAYOUT.size, 0x00))
+    struct.pack_into('<4f', data, HIGH_STATE_LAYOUT.offset('rangeObstacle'), *ranges)
+    return bytes(data)
+
+def withRemote(layout, buttons, sticks=(0.0, 0.0, 0.0, 0.0, 0.0)):
+    data = bytearray(packet(layout.size, 0x00 if layout is HIGH_STATE_LAYOUT else 0xff))
+    struct.pack_into('<H5f', data, layout.offset('wirelessRemote') + 2, buttons, *sticks)
+    return bytes(data)
+
+def gait(samples, seed=1):
+    ''' 4 feet, 1 Hz steps with phase offsets, contact chatter and sensor noise '''
+    rng = random.Random(seed)
+    forces = []
+    for i in range(samples):
+        t = i / 500
+        sample = []
+        for foot, phase in enumerate((0.0, 0.5, 0.5, 0.0)):
+            stance = ((t + phase) % 1.0) < 0.6
+            force = (60 if stance else 2) + rng.gauss(0, 6)
+            if rng.random() < 0.05:
+                force = rng.uniform(0, 80)              # chatter
+            sample.append(min(max(int(force), 0), 32767))
+        forces.append(sample)
+    return forces
+
+def randomize(hcmd, i):
+    ''' Every highCmd field, with the value types routines pass in (enums and ints, numpy scalars and arrays) '''
+    hcmd.mode = RNG.choice(list(MotorModeHigh)) if i % 2 else RNG.randrange(14)
+    hcmd.gaitType = RNG.choice(list(GaitType))
+    hcmd.speedLevel = RNG.choice(list(SpeedLevel))
+    hcmd.footRaiseHeight = RNG.uniform(-1, 1)
+    hcmd.bodyHeight = np.float64(RNG.uniform(-1, 1))                   # numpy scalar
+    hcmd.position = [RNG.uniform(-1, 1), RNG.uniform(-1, 1)]
+    hcmd.euler = np.array([RNG.uniform(-0.5, 0.5) for _ in range(3)]) if i % 3 else [0, 0, RNG.uniform(-1, 1)]
+    hcmd.velocity = [np.float32(RNG.uniform(-1, 1)), 0.0]
+    hcmd.yawSpeed = RNG.uniform(-math.pi, math.pi)
+    hcmd.led.r, hcmd.led.g, hcmd.led.b = RNG.randrange(256), RNG.randrange(256), RNG.randrange(256)
+    hcmd.wirelessRemote = bytearray(randomBytes(40))
+    hcmd.encrypt = bool(i % 2)
+
+def tick(lcmd, t):
+    ''' One tick of the low level examples: three motors get a fresh motorCmd, the rest stay put '''
+    q = [0.0, 1.2 + 0.6 * math.sin(t * 0.01), -2.0 - 0.9 * math.sin(t * 0.01)]
+    for i, name in enumerate(('FR_0', 'FR_1', 'FR_2')):
+        lcmd.motorCmd.setMotorCmd(name, motorCmd(mode=MotorModeLow.Servo, q=q[i], dq=0, Kp=5, Kd=1, tau=-0.65 if i == 0 else 0.0))
+
+def loopback(capacity=256):
+    ''' A connection receiving on a local port and the socket that plays the robot sending to it '''
+    conn = unitreeConnection(capacity=capacity)
+    conn.sock.bind(('127.0.0.1', 0))
+    conn.recvTimeout = 0.05
+    robot = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    return conn, robot
+
+def commandLoopback():
+    ''' A connection sending its commands to a local socket that plays the robot '''
+    robot = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    robot.bind(('127.0.0.1', 0))
+    robot.settimeout(1)
+    conn = unitreeConnection((0, '127.0.0.1', robot.getsockname()[1], '127.0.0.1'))
+    return conn, robot
@@ -0,0 +1,60 @@
+# Foot contact estimator against a per-foot python reference, and the footForce fields it reads from packets
+import struct
+
+from ucl.contact import contactEstimator
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from tests.helpers import gait, randomBytes
+
+def reference(forces, touchdown, liftoff, debounce):
+    ''' One foot at a time: the events (sample index of the first disagreeing sample, contact after it) '''
+    events = []
+    for foot in range(4):
+        contact, count, first = False, 0, None
+        for i, sample in enumerate(forces):
+            force = sample[foot]
+            candidate = force >= liftoff if contact else force >= touchdown
+            if candidate != contact:
+                if count == 0:
+                    first = i
+                count += 1
+                if count >= debounce:
+                    contact, count = candidate, 0
+                    events.append((first, foot, contact))
+            else:
+                count = 0
+    return sorted(events)
+
+def test_matches_reference():
+    forces = gait(5000)
+    counts = {}
+    for touchdown, liftoff, debounce in ((20, 10, 3), (30, 30, 1), (40, 15, 5)):
+        events = []
+        contacts = contactEstimator(touchdown, liftoff, debounce,
+                                    onTouchdown=lambda foot, stamp: events.append((int(stamp), foot, True)),
+                                    onLiftoff=lambda foot, stamp: events.append((int(stamp), foot, False)))
+        for i, sample in enumerate(forces):
+            contacts.update(sample, stamp=i)
+        expected = reference(forces, touchdown, liftoff, debounce)
+        assert sorted(events) == expected, (touchdown, liftoff, debounce)
+        counts[debounce] = len(events)
+        for foot in range(4):
+            last = [e for e in expected if e[1] == foot]
+            assert contacts.contact[foot] == last[-1][2]
+            assert contacts.touchdownTime[foot] == max(e[0] for e in last if e[2])
+            assert contacts.liftoffTime[foot] == max(e[0] for e in last if not e[2])
+    # 10 s of 1 Hz steps are 80 touchdowns + liftoffs, the chatter only gets through without debouncing
+    assert 80 <= counts[3] < 90 and 80 <= counts[5] < 90 and counts[1] > 500, counts
+
+def test_feed_packets():
+    # footForce and footForceEst of highState and lowState
+    for layout in (HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT):
+        for field in ('footForce', 'footForceEst'):
+            contacts = contactEstimator(debounce=1, field=field)
+            data = bytearray(randomBytes(layout.size))
+            struct.pack_into('<4h', data, layout.offset(field), 0, 50, 5, 25)
+            assert contacts.feed(bytes(data)).tolist() == [False, True, False, True]
+            assert contacts.contact.tolist() == [False, True, False, True] and contacts.inContact('FL') and not contacts.inContact(2)
+            # int16 in the sdk: a slightly negative estimate is no force, not 65535
+            struct.pack_into('<4h', data, layout.offset(field), -3, 50, -1, 25)
+            assert not contacts.feed(bytes(data)).any() and contacts.force.tolist() == [-3, 50, -1, 25]
+    assert contacts.feed(b'\x00' * 10) is None
@@ -0,0 +1,32 @@
+# The table driven crc engine and frameCrc against the bit-serial crc of the original lib
+from ucl.common import genCrc, encryptCrc, frameCrc, checkCrc, crcLength
+from benchmarks import baseline
+from tests.helpers import FRAMES, randomBytes
+
+def test_genCrc_matches_bit_serial():
+    for size in (8, 124, 608, 1080):
+        for _ in range(50):
+            body = randomBytes(size)
+            assert genCrc(body) == baseline.genCrc(body), size
+            assert encryptCrc(genCrc(body)) == baseline.encryptCrc(baseline.genCrc(body)), size
+
+def test_frameCrc():
+    for name, (size, tail, prefix, static) in FRAMES.items():
+        cache = frameCrc(size - tail, prefix, static)
+        for _ in range(200):
+            frame = bytearray(randomBytes(size))
+            assert cache.compute(frame) == genCrc(frame[:-tail]), name
+            frame[prefix + 7] ^= 0xFF                   # one changed block on a reused buffer
+            assert cache.compute(frame) == genCrc(frame[:-tail]), name
+            frame[static] ^= 0xFF                       # and the tail
+            cache.packInto(frame, size - 4, encrypt=True)
+            assert frame[-4:] == encryptCrc(genCrc(frame[:-tail])), name
+
+def test_checkCrc():
+    data = bytearray(randomBytes(1087))
+    data[-4:] = genCrc(data[:crcLength(len(data))])
+    assert checkCrc(data) == 'plain'
+    data[-4:] = encryptCrc(genCrc(data[:crcLength(len(data))]))
+    assert checkCrc(data) == 'encrypted'
+    data[100] ^= 1
+    assert checkCrc(data) is None and checkCrc(data[:5]) is None
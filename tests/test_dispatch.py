@@ -0,0 +1,149 @@
+# Receive path dispatch: classification of datagrams by length, head and levelFlag, routing, the link monitor,
+# and the guard that keeps the receive thread alive when a callback raises
+import contextlib
+import io
+import socket
+import time
+
+from ucl.highState import HIGH_STATE_LENGTH
+from ucl.lowState import LOW_STATE_LENGTH
+from ucl.remote import remoteEvents, REMOTE_BITS
+from ucl.unitreeConnection import unitreeConnection, linkMonitor, classifyPacket, HIGH_STATE, LOW_STATE, TRUNCATED, UNKNOWN
+from tests.helpers import packet, lowPacket, randomBytes
+
+def cases():
+    high, low = packet(HIGH_STATE_LENGTH, 0x00), packet(LOW_STATE_LENGTH, 0xff)
+    return ((high, HIGH_STATE), (packet(HIGH_STATE_LENGTH, 0xee), HIGH_STATE), (low, LOW_STATE),
+            (high[:600], TRUNCATED), (low[:100], TRUNCATED), (low[:3], UNKNOWN), (b'', UNKNOWN),
+            (packet(LOW_STATE_LENGTH, 0x00), TRUNCATED), (packet(HIGH_STATE_LENGTH, 0xff), UNKNOWN),
+            (b'\xef\xfe' + high[2:], UNKNOWN), (high + b'\x00', UNKNOWN), (randomBytes(HIGH_STATE_LENGTH - 1), UNKNOWN))
+
+def test_classify():
+    for data, kind in cases():
+        assert classifyPacket(data) == kind, (len(data), kind)
+
+def test_dispatch():
+    conn = unitreeConnection()
+    for data, kind in cases():
+        assert conn.dispatch(data) == kind
+    assert conn.counters == {HIGH_STATE: 2, LOW_STATE: 1, TRUNCATED: 3, UNKNOWN: 6}
+    assert len(conn.getData(LOW_STATE)) == 1 and conn.getData(LOW_STATE) == []
+    assert len(conn.getData()) == 2 and conn.getData() == []
+    high, low = packet(HIGH_STATE_LENGTH, 0x00), packet(LOW_STATE_LENGTH, 0xff)
+    parsed = []
+    conn.onPacket(HIGH_STATE, parsed.append)
+    conn.dispatch(high)
+    conn.dispatch(low)
+    assert parsed == [high] and conn.getData() == [low]
+    conn.onPacket(HIGH_STATE, None)
+    conn.dispatch(high)
+    assert conn.getData(HIGH_STATE) == [high]
+    conn.sock.close()
+
+def test_monitor_low():
+    # lowState: ticks step 2 (1 kHz robot clock at 500 Hz), 5 and 6 lost, 9 duplicated, 8 late, wrapping at 2**32
+    monitor = linkMonitor()
+    ticks = [0xFFFFFFFC, 0xFFFFFFFE, 0, 2, 4, 10, 12, 14, 18, 18, 16, 20]
+    for i, tick in enumerate(ticks):
+        monitor.update(LOW_STATE, lowPacket(tick & 0xFFFFFFFF), i * 0.002)
+    assert monitor.tickStep == 2 and (monitor.lost, monitor.duplicates, monitor.reordered) == (2, 1, 1), monitor.summary()
+    assert monitor.received == len(ticks) and sum(monitor.histogram) == len(ticks) - 3
+    monitor = linkMonitor(window=3)
+    for i, tick in enumerate((0, 1, 3, 4, 5, 6)):
+        monitor.update(LOW_STATE, lowPacket(tick), i * 0.002)
+    assert monitor.lost == 1 and monitor.lossRate == 0.0
+    # a late packet is taken back from the loss rate too, a restarted tick is neither loss nor reordering
+    monitor = linkMonitor()
+    for i, tick in enumerate((100000, 100002, 100006, 100004, 100008, 2, 4)):
+        monitor.update(LOW_STATE, lowPacket(tick), i * 0.002)
+    assert (monitor.lost, monitor.reordered, monitor.lossRate, monitor.recentLost) == (0, 1, 0.0, 0), monitor.summary()
+
+def test_monitor_high():
+    # highState: one gap of 3 periods, one repeated packet
+    monitor = linkMonitor()
+    for stamp in (0.0, 0.002, 0.004, 0.010, 0.0121, 0.0139):
+        monitor.update(HIGH_STATE, packet(HIGH_STATE_LENGTH, 0x00), stamp)
+    paket = packet(HIGH_STATE_LENGTH, 0x00)
+    monitor.update(HIGH_STATE, paket, 0.016)
+    monitor.update(HIGH_STATE, paket, 0.0161)
+    assert (monitor.lost, monitor.duplicates) == (2, 1) and abs(monitor.lossRate - 2 / 9) < 1e-12
+    assert sum(monitor.histogram) == 6 and monitor.histogram[monitor.JITTER_EDGES.index(0.005)] == 1, monitor.histogram
+    # a duplicate moves the arrival stamp, the next gap is not counted as loss
+    monitor = linkMonitor()
+    paket = packet(HIGH_STATE_LENGTH, 0x00)
+    for stamp, data in ((0.0, paket), (0.002, paket), (0.004, packet(HIGH_STATE_LENGTH, 0x00))):
+        monitor.update(HIGH_STATE, data, stamp)
+    assert (monitor.lost, monitor.duplicates) == (0, 1)
+    conn = unitreeConnection(period=0.001)
+    assert conn.monitor.period == 0.001
+    conn.sock.close()
+
+def test_monitor_commands():
+    # with the commands counted, a pause in sending or a slower rate is no loss, a missing reply still is
+    monitor = linkMonitor()
+    for stamp, commands in ((0.0, 1), (0.002, 1), (5.0, 1), (5.01, 1), (5.014, 2), (5.016, 1)):
+        for _ in range(commands):
+            monitor.sent()
+        monitor.update(HIGH_STATE, packet(HIGH_STATE_LENGTH, 0x00), stamp)
+    assert monitor.lost == 1, monitor.summary()
+    monitor = linkMonitor()
+    for i, (tick, commands) in enumerate(((0, 1), (2, 1), (5000, 1), (5004, 2), (5006, 1))):
+        for _ in range(commands):
+            monitor.sent()
+        monitor.update(LOW_STATE, lowPacket(tick), i * 0.002)
+    assert monitor.lost == 1 and monitor.tickStep == 2, monitor.summary()
+
+class refusingSocket:
+    ''' A socket whose reads fail like after an icmp port unreachable '''
+    def __init__(self, sock):
+        self.sock = sock
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_into(self, buffer):
+        raise ConnectionRefusedError
+
+def test_connection_error_stops():
+    # recvThread goes back to the poll loop after a ConnectionError, so it still sees the stop flag
+    conn = unitreeConnection()
+    conn.sock.bind(('127.0.0.1', 0))
+    conn.recvTimeout = 0.05
+    robot = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    robot.sendto(b'\x00', conn.sock.getsockname())         # keeps the socket readable
+    sock, conn.sock = conn.sock, refusingSocket(conn.sock)
+    conn.startRecv()
+    time.sleep(0.05)
+    conn.runRecv.set()
+    conn.recvThreadID.join(1.0)
+    assert not conn.recvThreadID.is_alive() and conn.recvErrors > 0
+    sock.close()
+    robot.close()
+
+def test_guard():
+    # a listener that raises is counted and reported once, the receive thread and the other callbacks go on
+    conn = unitreeConnection()
+    conn.sock.bind(('127.0.0.1', 0))
+    conn.recvTimeout = 0.05
+    robot = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    def broken(*args):
+        raise RuntimeError('broken callback')
+    seen, pressed = [], []
+    conn.watch(HIGH_STATE, broken)
+    conn.watch(HIGH_STATE, seen.append)
+    events = remoteEvents()
+    events.onPress('A', broken)
+    events.onPress('A', lambda: pressed.append(1))
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report), contextlib.redirect_stderr(report):
+        events.update(REMOTE_BITS['A'])
+        assert pressed == [1] and events.guard.errors == 1
+        conn.startRecv()
+        for _ in range(5):
+            robot.sendto(packet(HIGH_STATE_LENGTH, 0x00), conn.sock.getsockname())
+        time.sleep(0.1)
+    assert conn.recvThreadID.is_alive() and len(seen) == 5 and len(conn.getData()) == 5
+    assert conn.guard.errors == 5 and report.getvalue().count('RuntimeError: broken callback') == 2
+    conn.stopRecv()
+    conn.sock.close()
+    robot.close()
@@ -0,0 +1,62 @@
+# Kp / Kd / tau fixed-point codecs: exhaustive check against the original string based codecs
+import contextlib
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from ucl import common
+from benchmarks import baseline
+from tests.helpers import SEED
+
+def scalar_or_error(func, value):
+    try:
+        return bytes(func(value))
+    except Exception:
+        return None
+
+def vector_or_error(func, values):
+    # Encode one by one so a single out of range value only marks itself
+    out = []
+    for v in values:
+        try:
+            out.append(func([v]).tobytes())
+        except ValueError:
+            out.append(None)
+    return out
+
+def inputs(low, high):
+    # Every hundredth in the valid range (what the codecs round to), plus values right next to the
+    # rounding ties and plain random floats, the same ones every run
+    grid = np.arange(int(low * 100), int(high * 100) + 1) / 100.0
+    ties = np.concatenate([grid + 0.005, grid + 0.05, grid - 0.005])
+    ties = np.concatenate([ties, np.nextafter(ties, np.inf), np.nextafter(ties, -np.inf)])
+    rand = np.random.default_rng(SEED).uniform(low, high, 20000)
+    return np.concatenate([grid, ties, rand])
+
+@pytest.mark.parametrize('old, new, vector, low, high', [
+    (baseline.tau_to_hex, common.tau_to_hex, common.tau_to_hex_array, -257, 257),
+    (baseline.kp_to_hex, common.kp_to_hex, common.kp_to_hex_array, -2, 2050),
+    (baseline.kd_to_hex, common.kd_to_hex, common.kd_to_hex_array, -2, 4098)], ids=['tau', 'Kp', 'Kd'])
+def test_encoder(old, new, vector, low, high):
+    values = inputs(low, high).tolist()
+    with contextlib.redirect_stdout(io.StringIO()):     # the original tau_to_hex prints on errors
+        expected = [scalar_or_error(old, v) for v in values]
+        scalar = [scalar_or_error(new, v) for v in values]
+    assert scalar == expected
+    valid = [v for v, e in zip(values, expected) if e is not None]
+    invalid = [v for v, e in zip(values, expected) if e is None]
+    assert invalid and vector(valid).tobytes() == b''.join(e for e in expected if e is not None)
+    assert all(x is None for x in vector_or_error(vector, invalid[:2000]))
+
+@pytest.mark.parametrize('old, new, vector', [
+    (baseline.hex_to_tau, common.hex_to_tau, common.hex_to_tau_array),
+    (baseline.hex_to_kp, common.hex_to_kp, common.hex_to_kp_array),
+    (baseline.hex_to_kd, common.hex_to_kd, common.hex_to_kd_array)], ids=['tau', 'Kp', 'Kd'])
+def test_decoder(old, new, vector):
+    codes = np.arange(65536, dtype='<u2')
+    expected = [old(struct.pack('<H', c)) for c in range(65536)]
+    assert [new(struct.pack('<H', c)) for c in range(65536)] == expected
+    assert vector(codes).tolist() == expected
+    assert vector(codes.tobytes()).tolist() == expected
@@ -0,0 +1,11 @@
+# highCmd struct encoder against the original slice/float_to_hex builder
+from ucl.common import genCrc
+from ucl.highCmd import highCmd
+from benchmarks import baseline
+from tests.helpers import randomize
+
+def test_matches_original_builder():
+    hcmd = highCmd()
+    for i in range(500):
+        randomize(hcmd, i)
+        assert hcmd.buildCmd() == baseline.buildHighCmd(hcmd, genCrc), i
@@ -0,0 +1,50 @@
+# stateHistory windows against the decoded packets, for highState and lowState fields
+import numpy as np
+
+from ucl.highState import decodeHighState, HIGH_STATE_LENGTH
+from ucl.lowState import decodeLowState, LOW_STATE_LENGTH
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from ucl.history import stateHistory
+from ucl.unitreeConnection import unitreeConnection, HIGH_STATE
+from tests.helpers import FIELDS, packets, packet, lookup
+
+def same(a, b):
+    return np.array_equal(a, b, equal_nan=True)
+
+def test_high():
+    high = packets(HIGH_STATE_LENGTH, 250)
+    history = stateHistory(HIGH_STATE_LAYOUT, FIELDS, capacity=100)
+    assert len(history) == 0 and history.window('imu.rpy').shape == (0, 3)
+    for i, paket in enumerate(high):
+        assert history.append(paket, stamp=i)
+    assert not history.append(high[0][:-1]) and history.count == len(high) and len(history) == 100
+    for field in FIELDS:
+        expected = np.array([lookup(decodeHighState(paket), field) for paket in high[-100:]])
+        for n in (1, 37, 100, 500):
+            assert same(history.window(field, n), expected[-n:]), (field, n)
+        assert np.shares_memory(history.window(field, 60), history.columns[field])
+    assert history.window('stamp').tolist() == list(range(150, 250)) and history.latest('stamp') == 249
+    assert same(history.latest('motorstate.q'), decodeHighState(high[-1]).motorstate.q)
+
+def test_low():
+    low = packets(LOW_STATE_LENGTH, 30)
+    history = stateHistory(LOW_STATE_LAYOUT, ('motorState.tauEst', 'bms.cell_vol', 'tick', 'motorState[2].q'), capacity=16)
+    history.extend(low)
+    states = [decodeLowState(paket) for paket in low[-10:]]
+    assert same(history.window('motorState.tauEst', 10), [s.motorState.tauEst for s in states])
+    assert same(history.window('bms.cell_vol', 10), [s.bms.cell_vol for s in states])
+    assert history.window('tick', 10).tolist() == [s.tick for s in states]
+    assert same(history.window('motorState[2].q', 10), [s.motorState[2].q for s in states])
+    history.clear()
+    assert len(history) == 0
+
+def test_listener():
+    # as a listener the history keeps the arrival stamps, and getData still gets every packet
+    conn = unitreeConnection()
+    history = stateHistory(HIGH_STATE_LAYOUT, FIELDS, capacity=10)
+    conn.watch(HIGH_STATE, lambda data: history.append(data, conn.stamp))
+    high = [packet(HIGH_STATE_LENGTH, 0x00) for _ in range(3)]
+    for i, paket in enumerate(high):
+        conn.dispatch(paket, stamp=0.5 + i)
+    assert history.window('stamp').tolist() == [0.5, 1.5, 2.5] and conn.getData(HIGH_STATE) == high
+    conn.sock.close()
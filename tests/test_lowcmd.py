@@ -0,0 +1,24 @@
+# lowCmd persistent frame buffer against the original getBytes builder
+from ucl.common import genCrc
+from ucl.complex import LEG_JOINTS, FRONT_LEGS
+from ucl.lowCmd import lowCmd
+from benchmarks import baseline
+from tests.helpers import RNG, randomBytes, tick
+
+def test_matches_original_builder():
+    lcmd = lowCmd()
+    for t in range(300):
+        tick(lcmd, t)
+        m = getattr(lcmd.motorCmd, RNG.choice(baseline.MOTOR_NAMES))
+        m.q = RNG.uniform(-3, 3)                        # in place edits have to be picked up too
+        m.Kp = round(RNG.uniform(0, 50), 1)
+        if t % 50 == 0:
+            lcmd.wirelessRemote = bytearray(randomBytes(40))
+            lcmd.bms.off = RNG.randrange(2)
+        if t % 70 == 0:
+            lcmd.wirelessRemote[3] = RNG.randrange(256)
+        if t % 10 == 0:                                 # vector setters, more motors than VECTOR_ENCODE
+            lcmd.motorCmd.q[LEG_JOINTS] = [RNG.uniform(-2, 2) for _ in range(12)]
+            lcmd.motorCmd.Kp[FRONT_LEGS] *= 0.5
+        lcmd.encrypt = bool(t % 3)
+        assert lcmd.buildCmd() == baseline.buildLowCmd(lcmd, genCrc), t
@@ -0,0 +1,70 @@
+# Latest-state mailbox: only the newest packet behind a sequence counter, wait_newer wakes up on the next one
+import socket
+import threading
+import time
+
+import pytest
+
+from ucl.highState import decodeHighState
+from ucl.mailbox import stateMailbox
+from ucl.unitreeConnection import unitreeConnection, HIGH_STATE, LOW_STATE
+from tests.helpers import state
+
+def test_mailbox():
+    mailbox = stateMailbox(decode=lambda data: decodeHighState(data, validate=True))
+    assert mailbox.get_latest() == (0, None, None, None) and mailbox.wait_newer(0, timeout=0.01) is None
+    mailbox.put(state(1), HIGH_STATE)
+    mailbox.put(state(2, valid=False), HIGH_STATE)      # rejected by decode, the valid one stays
+    seq, kind, data, decoded = mailbox.get_latest()
+    assert (seq, kind, data[4], mailbox.dropped) == (1, HIGH_STATE, 1, 1)
+    assert decoded.SN.tobytes() == data[4:12]
+    assert mailbox.wait_newer(0) == mailbox.get_latest()
+
+    woken = []
+    def waiter():
+        woken.append(mailbox.wait_newer(1, timeout=1.0))
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while not mailbox.waiting:
+        time.sleep(0.001)
+    mailbox.put(state(3), HIGH_STATE)
+    thread.join()
+    assert woken[0][0] == 2 and woken[0][2][4] == 3 and mailbox.waiting == 0
+
+def test_connection():
+    conn = unitreeConnection(mailbox=True)
+    sent = [state(n) for n in range(1000)]
+    for data in sent:
+        conn.dispatch(data)
+    # only the newest packet is kept, getData hands it out once
+    seq, kind, data, _ = conn.get_latest()
+    assert (seq, kind, data) == (1000, HIGH_STATE, sent[-1])
+    assert conn.getData(LOW_STATE) == [] and conn.getData(HIGH_STATE) == [data] and conn.getData() == []
+    assert len(conn.ring) == 0 and conn.counters[HIGH_STATE] == 1000
+    conn.sock.close()
+
+def test_without_mailbox():
+    # mailbox calls without mailbox mode fail clearly
+    conn = unitreeConnection()
+    for call in (conn.get_latest, lambda: conn.wait_newer(0, timeout=0.01)):
+        with pytest.raises(RuntimeError, match='mailbox=True'):
+            call()
+    conn.sock.close()
+
+def test_receive_thread():
+    conn = unitreeConnection(mailbox=True)
+    conn.sock.bind(('127.0.0.1', 0))
+    conn.recvTimeout = 0.05
+    robot = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    conn.startRecv()
+    sent = [state(n) for n in range(50)]
+    seq = 0
+    for data in sent:
+        robot.sendto(data, conn.sock.getsockname())
+        latest = conn.wait_newer(seq, timeout=1.0)
+        assert latest is not None
+        seq = latest[0]
+    assert conn.get_latest()[2] == sent[-1] and seq == 50
+    conn.stopRecv()
+    conn.sock.close()
+    robot.close()
@@ -0,0 +1,25 @@
+# Burst-draining receive thread: every queued datagram read per wakeup, in order, and the thread ends with its socket
+import time
+
+from ucl.unitreeConnection import HIGH_STATE
+from tests.helpers import loopback, state
+
+def test_burst_drain():
+    conn, robot = loopback()
+    assert conn.sock.gettimeout() == 1      # send still blocks at most 1 s, like before
+    sent = [state(n) for n in range(50)]
+    for data in sent:
+        robot.sendto(data, conn.sock.getsockname())
+    conn.startRecv()                    # all 50 are queued before the thread starts: one wakeup reads them
+    time.sleep(0.1)
+    stats = conn.recvStats()
+    assert conn.getData(HIGH_STATE) == sent, 'lost or reordered'
+    assert stats['packets'] == 50 and stats['largestBurst'] == 50 and stats['wakeups'] == 1, stats
+    robot.sendto(sent[0], conn.sock.getsockname())
+    time.sleep(0.05)
+    assert conn.getData() == [sent[0]] and conn.recvStats()['wakeups'] == 2
+    # closing the socket ends the thread instead of spinning on the error
+    conn.sock.close()
+    conn.recvThreadID.join(1.0)
+    assert not conn.recvThreadID.is_alive()
+    robot.close()
@@ -0,0 +1,69 @@
+# Obstacle reflex: trips on rangeObstacle from the receive path, preempts the routine's commands and releases,
+# ahead of and apart from the other callbacks. Commands go to a local udp socket, so no robot is needed.
+import contextlib
+import io
+
+from ucl.highCmd import highCmd
+from ucl.enums import MotorModeHigh
+from ucl.reflex import obstacleReflex, standCmd
+from ucl.unitreeConnection import HIGH_STATE
+from tests.helpers import commandLoopback, withRanges
+
+def test_reflex():
+    conn, robot = commandLoopback()
+    walk = highCmd()
+    walk.mode = MotorModeHigh.VEL_WALK
+    walk.velocity = [0.4, 0.0]
+    walkCmd = bytes(walk.buildCmd())
+    trips, releases = [], []
+    reflex = obstacleReflex(conn, threshold=(0.3, 0.3, None, 0.3), latch=False, onTrip=lambda: trips.append(1), onRelease=lambda: releases.append(1))
+    conn.watch(HIGH_STATE, reflex.feed, first=True)
+
+    conn.dispatch(withRanges((1.0, 1.0, 0.1, 1.0)))             # sensor 2 is ignored
+    conn.dispatch(withRanges((0.0, float('nan'), 1.0, -1.0)))   # no echo
+    conn.send(walkCmd)
+    assert robot.recv(2048) == walkCmd and not reflex.tripped
+
+    conn.dispatch(withRanges((1.0, 0.25, 1.0, 1.0)))
+    # the safe command goes out as the packet arrives, and replaces the routine's commands
+    assert robot.recv(2048) == standCmd() and reflex.tripped and trips == [1] and reflex.ranges[1] == 0.25
+    conn.send(walkCmd)
+    assert robot.recv(2048) == standCmd()
+    conn.dispatch(withRanges((1.0, 0.35, 1.0, 1.0)))            # inside the hysteresis
+    assert reflex.tripped
+    conn.dispatch(withRanges((1.0, 0.5, 1.0, 1.0)))
+    assert not reflex.tripped and releases == [1] and conn.override is None
+    conn.send(walkCmd)
+    assert robot.recv(2048) == walkCmd
+
+    reflex.latch = True
+    conn.dispatch(withRanges((0.1, 1.0, 1.0, 1.0)))
+    conn.dispatch(withRanges((1.0, 1.0, 1.0, 1.0)))
+    assert robot.recv(2048) == standCmd() and reflex.tripped and reflex.trips == 2
+    reflex.reset()
+    conn.send(walkCmd)
+    assert robot.recv(2048) == walkCmd
+    conn.sock.close()
+    robot.close()
+
+def test_isolated():
+    # the reflex runs ahead of the other callbacks and apart from them
+    conn, robot = commandLoopback()
+    order = []
+    def broken(data):
+        order.append('user')
+        raise RuntimeError('broken listener')
+    conn.watch(HIGH_STATE, broken)
+    reflex = obstacleReflex(conn, threshold=0.3, onTrip=lambda: order.append('reflex'))
+    conn.watch(HIGH_STATE, reflex.feed, first=True)
+    port, conn.sendPort = conn.sendPort, 0       # sendto port 0 fails with EINVAL
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        conn.dispatch(withRanges((0.1, 1.0, 1.0, 1.0)))
+        # the reflex ran first and survived its failed send, the broken listener did not stop anything
+        assert order == ['reflex', 'user'] and reflex.tripped and reflex.unsent and reflex.sendErrors == 1
+        conn.sendPort = port
+        conn.dispatch(withRanges((0.1, 1.0, 1.0, 1.0)))
+    # the safe command went out with the next packet
+    assert robot.recv(2048) == standCmd() and not reflex.unsent and conn.guard.errors == 2
+    conn.sock.close()
+    robot.close()
@@ -0,0 +1,38 @@
+# Wireless remote decoder and button events against the sdk layout
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from ucl.remote import remoteEvents, decodeRemote, remoteOf, REMOTE_BUTTONS, REMOTE_BITS
+from ucl.unitreeConnection import unitreeConnection, HIGH_STATE
+from tests.helpers import withRemote
+
+def test_decoder():
+    for layout in (HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT):
+        data = withRemote(layout, 0b1000000100, (0.5, -0.25, 1.0, 0.75, -1.0))
+        remote = remoteOf(data)
+        assert (remote.lx, remote.rx, remote.ry, remote.L2, remote.ly) == (0.5, -0.25, 1.0, 0.75, -1.0)
+        assert remote.pressedButtons() == ['start', 'B'] and remote.pressed('B') and not remote.pressed('A')
+        assert decodeRemote(data[layout.slice('wirelessRemote')]).buttons == remote.buttons
+    assert REMOTE_BUTTONS[8:10] == ('A', 'B')
+
+def test_events():
+    events, log = remoteEvents(), []
+    for name in ('A', 'B', 'L1'):
+        events.onPress(name, lambda name=name: log.append(('press', name)))
+        events.onRelease(name, lambda name=name: log.append(('release', name)))
+    bits = {name: 1 << i for i, name in enumerate(REMOTE_BUTTONS)}
+    for buttons in (0, bits['A'], bits['A'], bits['A'] | bits['L1'] | bits['X'], bits['L1'], 0, 0):
+        events.feed(withRemote(HIGH_STATE_LAYOUT, buttons))
+    assert log == [('press', 'A'), ('press', 'L1'), ('release', 'A'), ('release', 'L1')], log
+    events.feed(withRemote(LOW_STATE_LAYOUT, bits['B']))
+    events.feed(b'\x00' * 100)
+    assert log[-1] == ('press', 'B') and events.pressed('B')
+
+def test_connection():
+    conn, pressed = unitreeConnection(), []
+    events = remoteEvents()
+    events.onPress('A', lambda: pressed.append(conn.ring.head))
+    conn.watch(HIGH_STATE, events.feed)
+    conn.dispatch(withRemote(HIGH_STATE_LAYOUT, 0))
+    conn.dispatch(withRemote(HIGH_STATE_LAYOUT, REMOTE_BITS['A']))
+    # the callback runs on the packet that carries the press, before it is queued
+    assert pressed == [1] and len(conn.getData(HIGH_STATE)) == 2
+    conn.sock.close()
@@ -0,0 +1,63 @@
+# Receive ring: every packet handed out exactly once and intact while a producer thread keeps writing, bounded
+# memory when nobody reads, and the receive thread over a loopback socket
+import struct
+import threading
+import time
+
+from ucl.highState import HIGH_STATE_LENGTH
+from ucl.packetRing import packetRing
+from ucl.unitreeConnection import HIGH_STATE, LOW_STATE
+from tests.helpers import loopback, state
+
+def numbered(n, size=HIGH_STATE_LENGTH):
+    return struct.pack('<I', n) * (size // 4)
+
+def test_kinds():
+    ring = packetRing(8)
+    for n in range(5):
+        ring.put(numbered(n, 8), HIGH_STATE if n % 2 == 0 else LOW_STATE)
+    assert ring.drain(HIGH_STATE) == [numbered(n, 8) for n in (0, 2, 4)]
+    ring.put(numbered(5, 8), LOW_STATE)
+    assert ring.drain(LOW_STATE) == [numbered(n, 8) for n in (1, 3, 5)] and ring.drain() == []
+    for n in range(20):
+        ring.put(numbered(n, 8), HIGH_STATE)
+    # nobody read: only the newest capacity - 1 are left
+    assert ring.drain() == [numbered(n, 8) for n in range(13, 20)] and ring.overflow == 13 and len(ring) == 0
+
+def test_socket():
+    conn, robot = loopback()
+    conn.startRecv()
+    sent = [state(n) for n in range(100)]
+    for data in sent:
+        robot.sendto(data, conn.sock.getsockname())
+        time.sleep(0.0005)
+    robot.sendto(b'\xfe\xef\x00' + bytes(500), conn.sock.getsockname())   # truncated
+    time.sleep(0.2)
+    assert conn.getData(HIGH_STATE) == sent and conn.counters['truncated'] == 1
+    conn.stopRecv()
+    conn.sock.close()
+    robot.close()
+
+def test_concurrent(total=200000, capacity=64):
+    # a producer thread keeps writing while the reader drains, nothing is torn, duplicated or reordered
+    ring = packetRing(capacity)
+    size = HIGH_STATE_LENGTH - HIGH_STATE_LENGTH % 4       # what numbered fills
+    done = threading.Event()
+    def produce():
+        for n in range(total):
+            ring.slot()[:size] = numbered(n)
+            ring.publish(size, HIGH_STATE)
+            if n % 64 == 0:
+                time.sleep(0)
+        done.set()
+    received = []
+    producer = threading.Thread(target=produce)
+    producer.start()
+    while not done.is_set() or ring.tail < ring.head:
+        for data in ring.drain():
+            n = struct.unpack_from('<I', data)[0]
+            assert data == numbered(n), 'torn packet'
+            received.append(n)
+    producer.join()
+    assert received == sorted(set(received)), 'duplicated or reordered'
+    assert len(received) + ring.overflow == total, (len(received), ring.overflow)
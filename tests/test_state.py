@@ -0,0 +1,206 @@
+# State decoders against the original highState/lowState parsers: the slots classes (copying and in place),
+# the lazy states, the structured array decoders, the field projections and the length / crc check
+import contextlib
+import io
+import math
+import re
+import struct
+
+import pytest
+
+from ucl.highState import highState, lazyHighState, decodeHighState, decodeHighStates, latestHighState, highStateFields, HIGH_STATE_LENGTH
+from ucl.lowState import lowState, lazyLowState, decodeLowState, decodeLowStates, latestLowState, lowStateFields, LOW_STATE_LENGTH
+from ucl.common import pretty_print_obj, genCrc, crcLength
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from benchmarks import baseline
+from tests.helpers import ATTRS, HIGH_ATTRS, PROJECTIONS, packets, randomBytes, lookup
+
+@pytest.fixture(scope='module')
+def high():
+    return packets(HIGH_STATE_LENGTH, 500)
+
+@pytest.fixture(scope='module')
+def low():
+    return packets(LOW_STATE_LENGTH, 500, seed=1)
+
+def fields(obj):
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+    return {k: getattr(obj, k) for k in getattr(type(obj), '__slots__', ())}
+
+def same(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (math.isnan(a) and math.isnan(b))
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if hasattr(a, '__dict__') or hasattr(type(a), '__slots__'):
+        fa, fb = fields(a), fields(b)
+        return fa.keys() == fb.keys() and all(same(fa[k], fb[k]) for k in fa)
+    return a == b
+
+def nested(value):
+    return tuple(map(nested, value)) if isinstance(value, (list, tuple)) else value
+
+def plain(value):
+    return value.tolist() if hasattr(value, 'tolist') else value
+
+def checkBms(bms, old, paket, layout):
+    ''' bms against the original parser. That parser read BQ_NTC / MCU_NTC unsigned and the highState cell_vol
+    from offset 13, those are checked against the sdk layout in the raw packet instead '''
+    for attr in ('version_h', 'version_l', 'bms_status', 'SOC', 'current', 'cycle'):
+        assert same(plain(getattr(bms, attr)), getattr(old, attr)), attr
+    offset = layout.offset('bms')
+    assert plain(bms.BQ_NTC) + plain(bms.MCU_NTC) == list(struct.unpack_from('<4b', paket, offset + 10))
+    if layout is HIGH_STATE_LAYOUT:
+        assert plain(bms.cell_vol) == list(struct.unpack_from('<10H', paket, offset + 14))
+    else:
+        assert plain(bms.cell_vol) == old.cell_vol
+
+def checkLow(new, old, paket):
+    ''' lowState fields against the original parser. That parser read the motor temperature, footForce / footForceEst
+    and tick from shifted offsets, those are checked against the sdk offsets in the raw packet instead '''
+    for attr in ATTRS:
+        if attr != 'bms':
+            assert same(getattr(new, attr), getattr(old, attr)), attr
+    checkBms(new.bms, old.bms, paket, LOW_STATE_LAYOUT)
+    for i, (m, o) in enumerate(zip(new.motorState, old.motorState)):
+        fm, fo = fields(m), fields(o)
+        assert fm.keys() == fo.keys() and all(same(fm[k], fo[k]) for k in fm if k != 'temperature'), i
+        assert m.temperature == paket[75 + i * 32 + 23]
+    assert list(new.footForce) + list(new.footForceEst) == list(struct.unpack_from('<8h', paket, 739))
+    assert new.tick == struct.unpack_from('<I', paket, 755)[0]
+
+@pytest.mark.parametrize('cls, kwargs', [(highState, {}), (highState, {'inPlace': True}), (lazyHighState, {})])
+def test_high(high, cls, kwargs):
+    # footForce / footForceEst are int16 in the sdk, the original parser reads them unsigned: checked against the raw packet
+    new, old = cls(**kwargs), baseline.highState()
+    for paket in high:
+        new.parseData(paket)
+        old.parseData(paket)
+        for attr in HIGH_ATTRS:
+            if attr != 'bms':
+                assert same(getattr(new, attr), getattr(old, attr)), attr
+        checkBms(new.bms, old.bms, paket, HIGH_STATE_LAYOUT)
+        assert list(new.footForce) + list(new.footForceEst) == list(struct.unpack_from('<8h', paket, 869))
+
+@pytest.mark.parametrize('cls, kwargs', [(lowState, {}), (lowState, {'inPlace': True}), (lazyLowState, {})])
+def test_low(low, cls, kwargs):
+    new, old = cls(**kwargs), baseline.lowState()
+    for paket in low:
+        new.parseData(paket)
+        old.parseData(paket)
+        checkLow(new, old, paket)
+
+def test_in_place_keeps_objects():
+    state = highState(inPlace=True)
+    motors, imu = state.motorstate, state.imu
+    state.parseData(randomBytes(HIGH_STATE_LENGTH))
+    assert state.motorstate is motors and state.imu is imu and len({id(m) for m in motors}) == 20
+
+def test_high_array(high):
+    # Every field of decodeHighState against the original parser (converted back to its types)
+    old = baseline.highState()
+    for paket in high:
+        old.parseData(paket)
+        state = decodeHighState(paket)
+        motors = state.motorstate
+        assert hex(state.head) == old.head
+        assert bytes(state.SN) == old.SN and bytes(state.version) == old.version
+        assert bytes(state.wirelessRemote) == old.wirelessRemote and bytes(state.reserve) == old.reserve
+        assert state.crc == int.from_bytes(old.crc, byteorder='little')
+        for attr in ('levelFlag', 'frameReserve', 'bandWidth', 'mode', 'progress', 'gaitType', 'footRaiseHeight', 'bodyHeight', 'yawSpeed'):
+            assert same(getattr(state, attr).item(), getattr(old, attr)), attr
+        for attr in ('position', 'velocity', 'rangeObstacle'):
+            assert same(getattr(state, attr).tolist(), getattr(old, attr)), attr
+        assert state.footForce.tolist() + state.footForceEst.tolist() == list(struct.unpack_from('<8h', paket, 869))
+        for attr, value in vars(old.imu).items():
+            assert same(getattr(state.imu, attr).tolist(), value), attr
+        checkBms(state.bms, old.bms, paket, HIGH_STATE_LAYOUT)
+        for attr in vars(old.motorstate[0]):
+            assert same(getattr(motors, attr).tolist(), [getattr(m, attr) for m in old.motorstate]), attr
+        assert same(motors[5].q.item(), old.motorstate[5].q) and same(state.imu.rpy.tolist(), old.imu.rpy)
+        for attr in ('footPosition2Body', 'footSpeed2Body'):
+            assert same(getattr(state, attr).tolist(), [[c.x, c.y, c.z] for c in getattr(old, attr)]), attr
+
+def test_high_batch(high):
+    # decodeHighStates rows against decodeHighState of each packet, other packet sizes are skipped
+    backlog = high[:50] + [bytes(807), bytes(10)]
+    states = decodeHighStates(backlog)
+    assert len(states) == 50 and states.motorstate.q.shape == (50, 20) and states.imu.quaternion.shape == (50, 4)
+    for i, paket in enumerate(high[:50]):
+        assert states.array[i].tobytes() == decodeHighState(paket).array.tobytes()
+    assert same(states.footForce.tolist(), [decodeHighState(paket).footForce.tolist() for paket in high[:50]])
+    assert latestHighState(backlog).array.tobytes() == high[49]
+    assert latestHighState([bytes(807)]) is None and len(decodeHighStates([])) == 0
+
+def test_low_array(low):
+    # decodeLowState against the original parser, and against the sdk offsets where that parser reads shifted bytes
+    old = baseline.lowState()
+    for paket in low:
+        old.parseData(paket)
+        state = decodeLowState(paket)
+        motors = state.motorState
+        assert hex(state.head) == old.head and bytes(state.SN) == old.SN and bytes(state.version) == old.version
+        assert bytes(state.reserve) == old.reserve and state.crc == int.from_bytes(old.crc, byteorder='little')
+        for attr in ('levelFlag', 'frameReserve', 'bandWidth'):
+            assert getattr(state, attr) == getattr(old, attr), attr
+        for attr, value in vars(old.imu).items():
+            assert same(getattr(state.imu, attr).tolist(), value), attr
+        checkBms(state.bms, old.bms, paket, LOW_STATE_LAYOUT)
+        for attr in vars(old.motorState[0]):
+            if attr != 'temperature':
+                assert same(getattr(motors, attr).tolist(), [getattr(m, attr) for m in old.motorState]), attr
+        assert same(motors[7].tauEst.item(), old.motorState[7].tauEst)
+        assert motors.temperature.tolist() == [paket[75 + i * 32 + 23] for i in range(20)]
+        assert state.footForce.tolist() + state.footForceEst.tolist() == list(struct.unpack_from('<8h', paket, 739))
+        assert state.tick == struct.unpack_from('<I', paket, 755)[0] and bytes(state.wirelessRemote) == paket[759:799]
+    states = decodeLowStates(low[:50] + [bytes(HIGH_STATE_LENGTH)])
+    assert states.motorState.tauEst.shape == (50, 20) and same(states.motorState.tauEst[-1].tolist(), decodeLowState(low[49]).motorState.tauEst.tolist())
+    assert latestLowState(low[:50] + [bytes(HIGH_STATE_LENGTH)]).array.tobytes() == low[49]
+
+def test_projection(high, low):
+    # highStateFields / lowStateFields against the dtype decoders
+    names = [('imu.quaternion', 'motorstate.q', 'motorstate.tauEst', 'motorstate[7].dq', 'footPosition2Body', 'bms.MCU_NTC',
+              'bms.cell_vol', 'motorstate.reserve', 'crc', 'progress')] + list(PROJECTIONS)
+    for paket in high[:100]:
+        state = decodeHighState(paket)
+        for projection in names:
+            for name, value in zip(projection, highStateFields(*projection)(paket)):
+                assert same(nested(value), nested(lookup(state, name).tolist())), name
+    projection = ('footForce', 'motorState.q', 'motorState.tauEst', 'bms.cell_vol', 'tick')
+    for paket in low[:100]:
+        state = decodeLowState(paket)
+        for name, value in zip(projection, lowStateFields(*projection)(paket)):
+            assert same(nested(value), nested(lookup(state, name).tolist())), name
+    assert highStateFields(*PROJECTIONS[0]) is highStateFields(*PROJECTIONS[0])
+
+def printed(state):
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        pretty_print_obj(state)
+    # without the class name and the addresses in the reprs of lists of objects
+    return sorted(re.sub(' at 0x[0-9a-f]+', '', line) for line in report.getvalue().splitlines()[2:])
+
+def test_lazy(high, low):
+    # The lazy states have every attribute of the eager ones and print the same, without their packet cache
+    for eager, lazy, paket in ((highState(), lazyHighState(), high[0]), (lowState(), lazyLowState(), low[0])):
+        assert lazy.inPlace is False and 'data' not in ''.join(printed(lazy))
+        eager.parseData(paket)
+        lazy.parseData(paket)
+        assert printed(eager) == printed(lazy)
+    assert lazyHighState().speedLevel == highState().speedLevel
+
+@pytest.mark.parametrize('cls', [highState, lowState, lazyHighState, lazyLowState])
+def test_validate(high, low, cls):
+    # The length and crc check shared through packetState, per state class and its own packet length
+    paket = high[0] if cls.LENGTH == HIGH_STATE_LENGTH else low[0]
+    paket = paket[:-4] + genCrc(paket[:crcLength(len(paket))])
+    state = cls(validate=True)
+    assert state.parseData(paket) and state.crcType == 'plain' and state.head == hex(struct.unpack_from('<H', paket)[0])
+    assert not state.parseData(paket[:-1]) and not state.parseData(paket[:-1] + bytes([paket[-1] ^ 1]))
+    assert (state.rejectedLength, state.rejectedCrc) == (1, 1)
+
+def test_layout_structs():
+    # no field overlaps another, so one struct covers a whole packet
+    assert HIGH_STATE_LAYOUT.struct().size == HIGH_STATE_LENGTH and LOW_STATE_LAYOUT.struct().size == LOW_STATE_LENGTH
+    assert HIGH_STATE_LAYOUT.struct('bms').format == LOW_STATE_LAYOUT.struct('bms').format.replace('10B', '10H')
@@ -0,0 +1,68 @@
+# State-change subscriptions: callbacks fire exactly on changes of the watched fields
+import struct
+
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from ucl.subscribe import stateSubscriptions
+from ucl.unitreeConnection import unitreeConnection, LOW_STATE
+from tests.helpers import withFields
+
+def sequence(base, changes):
+    ''' Packets that are copies of base with some bytes changed '''
+    packets = []
+    for change in changes:
+        data = bytearray(base)
+        for offset, value in change:
+            data[offset:offset + len(value)] = value
+        packets.append(bytes(data))
+    return packets
+
+def test_subscriptions():
+    mode, soc, force = HIGH_STATE_LAYOUT.offset('mode'), HIGH_STATE_LAYOUT.offset('bms') + 3, HIGH_STATE_LAYOUT.offset('footForce')
+    q3 = HIGH_STATE_LAYOUT.offset('motorstate') + 3 * 32 + 1
+    dq3 = q3 + 4
+    base = withFields(HIGH_STATE_LAYOUT, mode=1, bms__SOC=80, footForce=(10, 10, 10, 10), motorstate__q=(0.0,) * 20)
+    packets = sequence(base, [(),
+                              ((HIGH_STATE_LAYOUT.offset('progress'), b'\x01\x02\x03\x04'),),    # nothing watched changes
+                              ((mode, b'\x02'),),
+                              ((mode, b'\x02'), (soc, b'\x4f')),
+                              ((mode, b'\x02'), (soc, b'\x4f'), (force, struct.pack('<H', 60))),
+                              ((mode, b'\x02'), (soc, b'\x4f'), (force, struct.pack('<H', 70))),
+                              ((mode, b'\x02'), (soc, b'\x4f'), (force, struct.pack('<H', 10))),
+                              ((mode, b'\x02'), (soc, b'\x4f'), (force, struct.pack('<H', 90)), (dq3, b'\x11\x22\x33\x44')),
+                              ((mode, b'\x02'), (soc, b'\x4f'), (force, struct.pack('<H', 90)), (q3, struct.pack('<f', 0.5)))])
+    log = []
+    subs = stateSubscriptions(HIGH_STATE_LAYOUT)
+    subs.subscribe('mode', lambda value, old: log.append(('mode', value, old)))
+    low = subs.subscribe('bms.SOC', lambda value, old: log.append(('low battery', value)), when=lambda soc: soc < 80)
+    subs.subscribe('footForce', lambda value, old: log.append(('contact', value[0])), when=lambda force: max(force) > 50)
+    subs.subscribe('motorstate.q', lambda value, old: log.append(('q3', value[3])))
+    for i, data in enumerate(packets):
+        subs.feed(data)
+        log.append(i)
+    assert log == [('mode', 1, None), ('q3', 0.0), 0, 1, ('mode', 2, 1), 2, ('low battery', 79), 3, ('contact', 60), 4, 5, 6,
+                   ('contact', 90), 7, ('q3', 0.5), 8], log
+    subs.unsubscribe(low)
+    subs.unsubscribe(low)
+    assert list(subs.fields) == ['mode', 'footForce', 'motorstate.q']
+
+def test_connection():
+    conn, changes = unitreeConnection(), []
+    sub = conn.subscribe('tick', lambda value, old: changes.append(value), kind=LOW_STATE)
+    for tick in (5, 5, 6):
+        conn.dispatch(withFields(LOW_STATE_LAYOUT, tick=tick))
+    conn.unsubscribe(sub, kind=LOW_STATE)
+    conn.dispatch(withFields(LOW_STATE_LAYOUT, tick=7))
+    assert changes == [5, 6] and len(conn.getData(LOW_STATE)) == 4
+    conn.sock.close()
+
+def test_resubscribe_while_feeding():
+    # a feed still on the fields and key from before a subscribe reads them consistently
+    subs, log = stateSubscriptions(HIGH_STATE_LAYOUT), []
+    subs.subscribe('footForce', lambda value, old: log.append(value))
+    base = withFields(HIGH_STATE_LAYOUT, mode=1, footForce=(10, 10, 10, 10))
+    subs.feed(base)
+    compiled = subs.compiled
+    subs.subscribe('bms.SOC', lambda value, old: None)      # a segment ahead of footForce
+    subs.compiled = compiled
+    subs.feed(sequence(base, [((HIGH_STATE_LAYOUT.offset('footForce'), struct.pack('<H', 60)),)])[0])
+    assert log == [(10, 10, 10, 10), (60, 10, 10, 10)]
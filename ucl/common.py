@@ -1,6 +1,9 @@
 from enum import Enum
 import struct
-import binascii
+import sys
+import traceback
+from functools import lru_cache
+import numpy as np
 
 def lib_version():
     return "0.2"
@@ -42,18 +45,40 @@ def decode_version(data):
 def getVoltage(cellVoltages):
     return sum(cellVoltages)
 
+_F32 = struct.Struct('<f')
+
+@lru_cache(maxsize=None)
+def _floatStruct(count):
+    return struct.Struct('<%df' % count)
+
 def float_to_hex(f):
-    return (struct.unpack('>I', struct.pack('>f', f))[0]).to_bytes(4, 'little')
+    return _F32.pack(f)
 
 def hex_to_float(hex):
-    # Convert hex to bytes
-    # b = bytes.fromhex(hex_value)
+    return _F32.unpack(hex)[0]
+
+# Bulk versions of the two helpers above, one call per run of consecutive little-endian float32 fields
+
+def floats_to_hex(values):
+    if isinstance(values, np.ndarray):
+        return values.astype('<f4').tobytes()
+    return _floatStruct(len(values)).pack(*values)
 
-    # Convert bytes to integer with little-endian order
-    i = int.from_bytes(hex, 'little')
+def floats_into(buffer, offset, values):
+    '''Write the floats in place into buffer starting at offset'''
+    _floatStruct(len(values)).pack_into(buffer, offset, *values)
 
-    # Pack integer to bytes with big-endian order and unpack as float
-    return struct.unpack('>f', struct.pack('>I', i))[0]
+def hex_to_floats(data, offset=0, count=None):
+    '''Decode count floats starting at offset into a tuple of python floats'''
+    if count is None:
+        count = (len(data) - offset) >> 2
+    return _floatStruct(count).unpack_from(data, offset)
+
+def hex_to_float_array(data, offset=0, count=None):
+    '''Zero-copy numpy float32 view of count floats starting at offset'''
+    if count is None:
+        count = (len(data) - offset) >> 2
+    return np.frombuffer(data, dtype='<f4', count=count, offset=offset)
 
 
 #Not sure how the original lib handles negative values. we just assume that they use the lower half from 0x00 to 0xff for positive values and teh upper part for negative.
@@ -68,19 +93,11 @@ def fraction_to_hex(fraction, neg=False):
     return hex_value.to_bytes(1, 'little')
 
 def tau_to_hex(tau):
-    tau = round(tau,2)
-    integer_part = int(tau)
-    fractional_part = tau - integer_part
-    neg = False
-    if tau < 0:
-        neg = True
-        integer_part = 255 + integer_part
     try:
-        return fraction_to_hex(fractional_part, neg) + integer_part.to_bytes(1, 'little')
+        return _U16.pack(tau_to_code(tau))
     except Exception as e:
         print(e)
         print(tau)
-        print(integer_part)
 
 
 def hex_to_fraction(hex_byte, neg=False):
@@ -100,33 +117,51 @@ def hex_to_tau(hex_bytes):
     return int_val + hex_to_fraction(hex_bytes[0], neg)
 
 
-def kp_to_hex(Kp):
-    base, frac = divmod(Kp, 1)
-    base = int(base)
-    frac = int(round(frac,1) * 10)
+# Kp is stored as base * 32 + a code for its first decimal, Kd as int * 16 + a nibble for its first decimal.
+# The codes are not linear (the original lib seems to scale the fraction by 32/10 and 16/10 and truncate),
+# index 10 is what a fraction rounding up to 1.0 ends up as.
+_KP_FRAC_CODE = (0, 3, 6, 9, 12, 16, 19, 22, 25, 28, 31)
+_KD_FRAC_CODE = (0x0, 0x1, 0x3, 0x4, 0x6, 0x8, 0x9, 0xb, 0xc, 0xe, 0x0)
+_KD_FRAC_VALUE = {0x0: 0.0, 0x1: 0.1, 0x3: 0.2, 0x4: 0.3, 0x6: 0.4, 0x8: 0.5, 0x9: 0.6, 0xb: 0.7, 0xc: 0.8, 0xe: 0.9}
+# The original hex_to_kd looked the fraction up from the ascii code of the hex digit for bits 8-11
+# ('0'-'9' -> 0-9, 'a'-'f' -> 1-6) instead of the nibble that kd_to_hex writes. Kept as is for now.
+_KD_FRAC_DECODED = [_KD_FRAC_VALUE.get(n if n < 10 else n - 9, 0.0) for n in range(16)]
+_U16 = struct.Struct('<H')
+
+# The *_to_code functions return the 16 bit value that goes on the wire (little-endian)
 
-    val = 0
-    if frac < 5:
-        val = (base * 32) + frac * 3
-    if frac >= 5:
-        val = (base * 32) + ((frac - 1) * 3) + 4
+def tau_to_code(tau):
+    tau = round(tau,2)
+    integer_part = int(tau)
+    fractional_part = tau - integer_part
+    frac = int(fractional_part * 256)
+    if tau < 0:
+        integer_part = 255 + integer_part
+        if fractional_part != 0.0:
+            frac = 256 + frac
+    if not (0 <= integer_part <= 255 and 0 <= frac <= 255):
+        raise ValueError(f'tau {tau} out of range')
+    return (integer_part << 8) | frac
 
-    val = f'%04x' % val
-    kp = bytearray(bytes.fromhex(val))
-    kp.reverse()
-    return kp
+def kp_to_code(Kp):
+    base, frac = divmod(Kp, 1)
+    val = int(base) * 32 + _KP_FRAC_CODE[int(round(frac,1) * 10)]
+    if not 0 <= val <= 0xFFFF:
+        raise ValueError(f'Kp {Kp} out of range')
+    return val
+
+def kd_to_code(Kd):
+    integer_part = int(Kd)
+    if not 0 <= integer_part <= 0xFFF:
+        raise ValueError(f'Kd {Kd} out of range')
+    fractional_part = round(Kd - integer_part,1)
+    nibble = _KD_FRAC_CODE[int(fractional_part * 10)] if fractional_part >= 0 else 0
+    return (integer_part << 4) | nibble
 
-def hex_to_kp(byte_arr):
-    hex_bytes = binascii.hexlify(byte_arr)
-    h = bytearray(4) # Yah doing this ugly, need to make it nice later when we know it really works
-    h[0] = hex_bytes[2]
-    h[1] = hex_bytes[3]
-    h[2] = hex_bytes[0]
-    h[3] = hex_bytes[1]
-    byte_arr = h
-    # print(byte_arr)
-    val = int(byte_arr, 16)
+def kp_to_hex(Kp):
+    return bytearray(_U16.pack(kp_to_code(Kp)))
 
+def _kp_from_code(val):
     base = val // 32
     remainder = val % 32
 
@@ -137,61 +172,563 @@ def hex_to_kp(byte_arr):
 
     return base + round(frac, 1) / 10
 
+def hex_to_kp(byte_arr):
+    return _kp_from_code(byte_arr[0] | (byte_arr[1] << 8))
+
 def get_hex_frac(frac):
     mapping = {0.0: '0', 0.1: '1', 0.2: '3', 0.3: '4', 0.4: '6', 0.5: '8', 0.6: '9', 0.7: 'b', 0.8: 'c', 0.9: 'e'}
     return mapping.get(frac, '0')
 
 def kd_to_hex(decimal):
-    integer_part = int(decimal)
-    fractional_part = round(decimal - integer_part,1)
-    hex_fractional_part = get_hex_frac(fractional_part)
-    hex_integer_part = f'%03x' % integer_part
-    kd = bytearray(bytes.fromhex(hex_integer_part + hex_fractional_part))
-    kd.reverse()
-    return kd
+    return bytearray(_U16.pack(kd_to_code(decimal)))
 
 def get_frac_hex(frac):
     mapping = {'0': 0.0, '1': 0.1, '3': 0.2, '4': 0.3, '6':  0.4,'8':  0.5, '9': 0.6,'b':  0.7, 'c': 0.8, 'e': 0.9}
     return mapping.get(frac, 0.0)
 
 def hex_to_kd(hex_bytes):
-    hex_bytes = binascii.hexlify(hex_bytes)
-    h = bytearray(4) # Yah doing this ugly, need to make it nice later when we know it really works
-    h[0] = hex_bytes[2]
-    h[1] = hex_bytes[3]
-    h[2] = hex_bytes[0]
-    h[3] = hex_bytes[1]
-    hex_bytes = h
-    int_part = int(hex_bytes[:3],16)
-    frac_part = get_frac_hex(hex_bytes.hex()[3])
-    kd = int_part + frac_part
-    return kd
+    val = hex_bytes[0] | (hex_bytes[1] << 8)
+    return (val >> 4) + _KD_FRAC_DECODED[(val >> 8) & 0xF]
+
+# Vectorized versions of the fixed-point codecs above, e.g. for all 20 motors of a lowCmd at once.
+# Encoders return little-endian uint16 arrays ('.tobytes()' gives the wire format), decoders take such
+# arrays (or raw bytes) and give float64 arrays. Results are identical to the scalar functions.
+
+_KP_CODES = np.array(_KP_FRAC_CODE, dtype=np.float64)
+_KD_CODES = np.array(_KD_FRAC_CODE + (0,) * 9, dtype=np.float64)   # negative digits wrap to the zero padding
+
+def _round_digits(values, ndigits):
+    # Integer n with round(v, ndigits) == n / 10**ndigits. python rounds the exact decimal value of v
+    # (half to even), np.rint(v * 10**ndigits) only agrees away from ties, so near-ties use python.
+    scaled = values * 10.0 ** ndigits
+    n = np.rint(scaled)
+    ties = np.abs(scaled - n) > 0.5 - 1e-6
+    if ties.any():
+        n[ties] = [round(round(v, ndigits) * 10 ** ndigits) for v in values[ties].tolist()]
+    return n
+
+def _check_range(ok, name, values):
+    if not ok.all():
+        raise ValueError(f'{name} out of range: {values[~ok]}')
+
+def _tau_codes():
+    # tau only matters in hundredths, so every encodable value fits in one table (-1 marks out of range)
+    tau = np.arange(-_TAU_LIMIT, _TAU_LIMIT + 1) / 100.0
+    integer_part = np.trunc(tau)
+    fractional_part = tau - integer_part
+    frac = np.trunc(fractional_part * 256)
+    integer_part += 255 * (tau < 0)
+    frac += 256 * (fractional_part < 0)         # only negative tau has a negative fraction
+    ok = (integer_part >= 0) & (integer_part <= 255) & (frac >= 0) & (frac <= 255)
+    return np.where(ok, integer_part * 256 + frac, -1).astype(np.int32)
+
+_TAU_LIMIT = 25600
+_TAU_CODES = _tau_codes()
+
+def tau_to_hex_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    n = _round_digits(values, 2)
+    inside = np.abs(n) <= _TAU_LIMIT
+    codes = _TAU_CODES[np.where(inside, n, 0).astype(np.intp) + _TAU_LIMIT]
+    _check_range(inside & (codes >= 0), 'tau', values)
+    return codes.astype('<u2')
+
+def kp_to_hex_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    base, frac = np.divmod(values, 1.0)
+    val = base * 32 + _KP_CODES[_round_digits(frac, 1).astype(np.intp)]
+    _check_range((val >= 0) & (val <= 0xFFFF), 'Kp', values)
+    return val.astype('<u2')
+
+def kd_to_hex_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    integer_part = np.trunc(values)
+    _check_range((integer_part >= 0) & (integer_part <= 0xFFF), 'Kd', values)
+    return (integer_part * 16 + _KD_CODES[_round_digits(values - integer_part, 1).astype(np.intp)]).astype('<u2')
+
+def _as_codes(codes):
+    if isinstance(codes, np.ndarray):
+        return codes.astype(np.intp)
+    return np.frombuffer(codes, dtype='<u2').astype(np.intp)
+
+# Decoding only depends on a handful of distinct fractions, tabulated once with the scalar code
+_TAU_FRAC = np.array([[hex_to_fraction(b, neg) for b in range(256)] for neg in (False, True)])
+_TAU_INT = np.array([b - 255 if b > 126 else b for b in range(256)], dtype=np.float64)
+_KP_FRAC = np.array([_kp_from_code(r) for r in range(32)])
+_KD_FRAC = np.array(_KD_FRAC_DECODED)
+
+def hex_to_tau_array(codes):
+    codes = _as_codes(codes)
+    high = codes >> 8
+    return _TAU_INT[high] + _TAU_FRAC[(high > 126).astype(np.intp), codes & 0xFF]
+
+def hex_to_kp_array(codes):
+    codes = _as_codes(codes)
+    return (codes // 32) + _KP_FRAC[codes % 32]
+
+def hex_to_kd_array(codes):
+    codes = _as_codes(codes)
+    return (codes >> 4) + _KD_FRAC[(codes >> 8) & 0xF]
+
+# The CRC is the MSB-first CRC-32 (poly 0x04c11db7, init 0xFFFFFFFF, no final xor) fed with
+# the frame as little-endian 32 bit words. Because the register is not reflected, feeding a whole
+# word is the same as xoring it into the register and shifting 32 zero bits through, which we can
+# do with four 256-entry tables (slicing-by-4) instead of 32 iterations per word.
+CRC_POLY = 0x04c11db7
+CRC_INIT = 0xFFFFFFFF
+
+def _crcTables():
+    table = []
+    for b in range(256):
+        crc = b << 24
+        for _ in range(8):
+            if crc & 0x80000000:
+                crc = ((crc << 1) ^ CRC_POLY) & 0xFFFFFFFF
+            else:
+                crc = (crc << 1) & 0xFFFFFFFF
+        table.append(crc)
+
+    def shift32(crc):
+        for _ in range(4):
+            crc = ((crc << 8) & 0xFFFFFFFF) ^ table[crc >> 24]
+        return crc
+
+    return [[shift32(b << (8 * k)) for b in range(256)] for k in range(4)]
+
+_CRC_T0, _CRC_T1, _CRC_T2, _CRC_T3 = _crcTables()
+_CRC_STRUCT = struct.Struct('<I')
+_CRC_PACK = _CRC_STRUCT.pack
+# memoryview.cast('I') reads the little-endian crc words in place, one int at a time
+_NATIVE_WORDS = sys.byteorder == 'little'
+
+@lru_cache(maxsize=None)
+def _crcWords(count):
+    return struct.Struct('<%dI' % count)
+
+def _crcFeed(crc, words):
+    t0, t1, t2, t3 = _CRC_T0, _CRC_T1, _CRC_T2, _CRC_T3
+    for word in words:
+        x = crc ^ word
+        crc = t3[x >> 24] ^ t2[(x >> 16) & 0xFF] ^ t1[(x >> 8) & 0xFF] ^ t0[x & 0xFF]
+    return crc
+
+def crcUpdate(crc, data):
+    '''Feed data (length must be a multiple of 4) into the running crc and return the new state.'''
+    # one tuple of all words is the fastest way through a packet, frameCrc iterates in place instead
+    return _crcFeed(crc, _crcWords(len(data) >> 2).unpack(data))
 
 def genCrc(i):
-    crc = 0xFFFFFFFF
-    for j in struct.unpack("<%dI" % (len(i) / 4), i):
-        for b in range(32):
-            x = (crc >> 31) & 1
-            crc <<= 1
-            crc &= 0xFFFFFFFF
-            if x ^ (1&(j >> (31-b))):
-                crc ^= 0x04c11db7
-    crc = struct.pack('<I', crc)
-    return crc
+    return _CRC_PACK(crcUpdate(CRC_INIT, i))
+
+@lru_cache(maxsize=None)
+def _crcShiftTables(count):
+    # Pushing `count` zero words through the register is linear in the register value, so it can
+    # be tabulated per byte lane just like a single word step.
+    basis = []
+    for bit in range(32):
+        basis.append(crcUpdate(1 << bit, bytes(4 * count)))
+    tables = []
+    for k in range(4):
+        table = [0] * 256
+        for b in range(1, 256):
+            low = b & -b
+            table[b] = table[b ^ low] ^ basis[8 * k + low.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+def crcCombine(crc, tail_crc, count):
+    '''crc state after feeding `count` words whose crc (started from 0) is tail_crc.'''
+    t0, t1, t2, t3 = _crcShiftTables(count)
+    return t3[crc >> 24] ^ t2[(crc >> 16) & 0xFF] ^ t1[(crc >> 8) & 0xFF] ^ t0[crc & 0xFF] ^ tail_crc
+
+class frameCrc:
+    '''
+    genCrc over frame[:length] that only pays for the words that change between frames. frame[:length] is cut
+    into blocks: the static prefix frame[:prefix], BLOCK byte blocks up to tail, and the mostly static tail
+    frame[tail:length]. The crc of every block is cached with a copy of its bytes and recomputed only when
+    they differ, then the blocks are chained with crcCombine. prefix and tail have to be multiples of 4.
+    The views on the frame are kept while the same buffer comes back (lowCmd.buffer), so a bytearray frame
+    can't be resized, and packInto allocates nothing.
+    '''
+    BLOCK = 64
+
+    def __init__(self, length, prefix, tail):
+        self.length = length
+        self.prefix = prefix
+        self.tail = tail
+        edges = sorted({0, *range(prefix, tail, self.BLOCK), tail, length})
+        self.blocks = list(zip(edges, edges[1:]))
+        self.shifts = [_crcShiftTables((end - start) >> 2) for start, end in self.blocks]
+        self.copy = bytearray(length)               # the bytes the cached crcs were computed from
+        copy = memoryview(self.copy)
+        self.copies = [copy[start:end] for start, end in self.blocks]
+        self.crcs = [0] * len(self.blocks)          # crc from 0 of each block, 0 for the zeroed copy
+        self.frame = None
+        self.views = None
+        self.words = None
+
+    def bind(self, frame):
+        view = memoryview(frame)
+        self.frame = frame
+        self.views = [view[start:end] for start, end in self.blocks]
+        self.words = [v.cast('I') for v in self.views] if _NATIVE_WORDS else None
+
+    def value(self, frame):
+        ''' The crc of frame[:length] as an int '''
+        if frame is not self.frame:
+            self.bind(frame)
+        crcs = self.crcs
+        for i, (view, copy) in enumerate(zip(self.views, self.copies)):
+            if view != copy:
+                copy[:] = view
+                crcs[i] = _crcFeed(0, self.words[i]) if _NATIVE_WORDS else crcUpdate(0, view)
+        crc = CRC_INIT
+        for (t0, t1, t2, t3), blockCrc in zip(self.shifts, crcs):
+            crc = t3[crc >> 24] ^ t2[(crc >> 16) & 0xFF] ^ t1[(crc >> 8) & 0xFF] ^ t0[crc & 0xFF] ^ blockCrc
+        return crc
+
+    def compute(self, frame):
+        return _CRC_PACK(self.value(frame))
+
+    def packInto(self, frame, offset, encrypt=False):
+        ''' Write the crc (its encrypted variant if encrypt) into frame at offset '''
+        crc = self.value(frame)
+        _CRC_STRUCT.pack_into(frame, offset, _encryptCrcInt(crc) if encrypt else crc)
+
+def _encryptCrcInt(crc):
+    # The original lib rotates the little-endian bytes by one: [b1, b2, b3, b0]
+    val = crc ^ 0xedcab9de
+    return (val >> 8) | ((val & 0xFF) << 24)
 
 def encryptCrc(crc_val):
-    crc_val = int.from_bytes(crc_val, byteorder='little')
     # Not my idea to call this an encryption, the manufacturer calls it an encryption in the original lib ;)
-    xor_val = 0xedcab9de
-    val=crc_val ^ xor_val
-    data = struct.pack('<I', val)
-    # happy byte swapping, sorry for making it ugly ;)
-    temp=bytearray(4)# Yah doing this ugly, need to make it nice later when we know it really works
-    temp[0] = data[1]
-    temp[1] = data[2]
-    temp[2] = data[3]
-    temp[3] = data[0]
-    return temp
+    return bytearray(_CRC_PACK(_encryptCrcInt(int.from_bytes(crc_val, byteorder='little'))))
+
+def crcLength(size):
+    # Like the original lib, the crc covers all whole words of the packet except the last one
+    return ((size >> 2) - 1) * 4
+
+def checkCrc(data):
+    '''
+    Verify the trailing crc of a received packet. Returns 'plain' or 'encrypted' depending on
+    which variant matched, or None if the packet is corrupt.
+    '''
+    size = len(data)
+    if size < 8:
+        return None
+    view = memoryview(data)
+    crc = crcUpdate(CRC_INIT, view[:crcLength(size)])
+    received = int.from_bytes(view[size - 4:], byteorder='little')
+    if received == crc:
+        return 'plain'
+    if received == _encryptCrcInt(crc):
+        return 'encrypted'
+    return None
+
+def scaled(value, factor):
+    ''' value * factor in a type wide enough for both, numpy 1.x keeps uint8 * 32 a uint8 and wraps around '''
+    return np.multiply(value, factor, dtype=np.result_type(value.dtype, factor.dtype))
+
+class recordView:
+    '''
+    Attribute access to the fields of a structured numpy array, so decoded packets keep the attribute names
+    of the state classes (state.imu.rpy, state.motorstate[3].q, state.motorstate.q for all 20).
+    Nested structures are wrapped again, plain fields come back as numpy views (scalars for single values).
+    Fields named in scale are fixed-point and come back multiplied by their factor (a copy, not a view).
+    Much cheaper than np.recarray, whose attribute lookup costs more than decoding the field.
+    '''
+    __slots__ = ('array', 'scale')
+
+    def __init__(self, array, scale=None):
+        self.array = array
+        self.scale = scale
+
+    def wrap(self, value):
+        if value.dtype.names is not None:
+            return recordView(value, self.scale)
+        if value.ndim == 0:
+            return value[()]
+        return value
+
+    def __getattr__(self, name):
+        try:
+            value = self.array[name]
+        except (KeyError, ValueError, IndexError):
+            raise AttributeError(name) from None
+        if self.scale is not None and name in self.scale:
+            return scaled(self.wrap(value), self.scale[name])
+        return self.wrap(value)
+
+    def __getitem__(self, index):
+        return self.wrap(self.array[index])
+
+    def __len__(self):
+        return len(self.array)
+
+    def __dir__(self):
+        return list(self.array.dtype.names)
+
+def latestPacket(packets, size, validate=False):
+    ''' The newest packet of the given size (and with a valid crc when validate is set), or None '''
+    for paket in reversed(packets):
+        if len(paket) == size and (not validate or checkCrc(paket) is not None):
+            return paket
+    return None
+
+def decodeMany(packets, dtype, validate=False, scale=None):
+    '''
+    Decode a list of packets in one pass into columnar arrays: the packets of dtype's size (and valid crc
+    when validate is set) are joined and viewed as an N-element structured array, so every field gets a
+    leading axis of length N (state.motorstate.q is N x 20).
+    '''
+    size = dtype.itemsize
+    valid = [paket for paket in packets if len(paket) == size and (not validate or checkCrc(paket) is not None)]
+    return recordView(np.frombuffer(b''.join(valid), dtype=dtype), scale)
+
+def fieldOffsets(dtype, path):
+    '''
+    Byte offsets and struct code of the elements a field path selects, plus its shape.
+    'imu.rpy' gives 3 offsets, 'motorstate.q' one per motor, 'motorstate[3].q' one, 'footPosition2Body' 4x3.
+    '''
+    offsets, shape = [0], ()
+    for token in path.split('.'):
+        name, _, index = token.partition('[')
+        if dtype.names is None or name not in dtype.names:
+            raise ValueError(f'unknown field {token!r} in {path!r}')
+        field, offset = dtype.fields[name][:2]
+        offsets = [o + offset for o in offsets]
+        dtype = field
+        if field.subdtype is not None:
+            dtype, sub = field.subdtype
+            if index:
+                i = int(index.rstrip(']'))
+                if not 0 <= i < sub[0]:
+                    raise ValueError(f'index {i} out of range in {path!r}')
+                offsets = [o + i * (field.itemsize // sub[0]) for o in offsets]
+                sub = sub[1:]
+            strides = []
+            stride = dtype.itemsize
+            for size in reversed(sub):
+                strides.insert(0, stride)
+                stride *= size
+            for size, stride in zip(sub, strides):
+                offsets = [o + k * stride for o in offsets for k in range(size)]
+            shape += sub
+        elif index:
+            raise ValueError(f'{name!r} in {path!r} is not an array')
+    if dtype.names is not None:
+        raise ValueError(f'{path!r} is a structure, select one of its fields: {", ".join(dtype.names)}')
+    return offsets, dtype.char, shape
+
+def _sequence(positions):
+    # v[a:b:step] when the positions are evenly spaced, a tuple of single items otherwise
+    if len(positions) > 1:
+        step = positions[1] - positions[0]
+        if step > 0 and all(b - a == step for a, b in zip(positions, positions[1:])):
+            return f'v[{positions[0]}:{positions[-1] + 1}' + (f':{step}]' if step > 1 else ']')
+    return '(' + ''.join(f'v[{p}], ' for p in positions) + ')'
+
+def _nested(positions, shape):
+    if len(shape) == 1:
+        return _sequence(positions)
+    chunk = len(positions) // shape[0]
+    return '(' + ''.join(_nested(positions[i * chunk:(i + 1) * chunk], shape[1:]) + ', ' for i in range(shape[0])) + ')'
+
+def fieldDecoder(dtype, fields, scale=None):
+    '''
+    Generate a decoder for just the given fields of a packet described by dtype (see highStateFields).
+    The elements of all fields are read with one precompiled struct over their offsets (gaps are skipped
+    with pad bytes, overlapping fields start another struct), and the generated function slices them back
+    into one value per field: a python number, or a (nested) tuple for array fields.
+    Fields named in scale are multiplied by their factor, as in recordView.
+    '''
+    if not fields:
+        raise ValueError('no fields to decode')
+    resolved = [fieldOffsets(dtype, path) for path in fields]
+    segments = []                   # [offset, struct format]
+    positions = {}                  # (offset, code) -> index in the unpacked values
+    end = None
+    for offset, code in sorted({(o, code) for offsets, code, _ in resolved for o in offsets}):
+        if end is None or offset < end:
+            segments.append([offset, '<'])
+            end = offset
+        if offset > end:
+            segments[-1][1] += f'{offset - end}x'
+        segments[-1][1] += code
+        positions[offset, code] = len(positions)
+        end = offset + struct.calcsize('<' + code)
+
+    namespace = {}
+    for i, (offset, fmt) in enumerate(segments):
+        namespace[f'_u{i}'] = struct.Struct(fmt).unpack_from
+    values = []
+    for i, (path, (offsets, code, shape)) in enumerate(zip(fields, resolved)):
+        index = [positions[o, code] for o in offsets]
+        expr = f'v[{index[0]}]' if shape == () else _nested(index, shape)
+        factor = (scale or {}).get(path.split('.')[-1].partition('[')[0])
+        if factor is not None:
+            if len(shape) > 1:
+                raise ValueError(f'scaling {path!r} needs a one dimensional field')
+            namespace[f'_k{i}'] = factor.item() if hasattr(factor, 'item') else factor
+            expr = f'{expr} * _k{i}' if shape == () else f'tuple([x * _k{i} for x in {expr}])'
+        values.append(expr)
+    source = ('def decode(data):\n'
+              f'    v = {" + ".join(f"_u{i}(data, {offset})" for i, (offset, _) in enumerate(segments))}\n'
+              f'    return ({"".join(value + ", " for value in values)})\n')
+    exec(source, namespace)
+    decode = namespace['decode']
+    decode.fields = tuple(fields)
+    decode.source = source
+    return decode
+
+class _lazyGroup:
+    def __init__(self, decode, names):
+        self.decode = decode
+        self.names = names
+
+    def load(self, state):
+        if state.data is None:
+            raise AttributeError(f'{type(state).__name__} has no packet to decode {", ".join(self.names)} from')
+        values = self.decode(state, state.data)
+        if len(self.names) == 1:
+            values = (values,)
+        fields = state.__dict__
+        for name, value in zip(self.names, values):
+            fields[name] = value
+        state.decoded.extend(self.names)
+
+class lazyField:
+    '''
+    One attribute of a group decoded together on the first access to any of them. The values are stored in
+    the instance __dict__, which shadows this (non-data) descriptor, so later reads are plain attribute reads
+    until the state gets its next packet and forgets them (see lazyFields).
+    '''
+    def __init__(self, group, name):
+        self.group = group
+        self.name = name
+
+    def __get__(self, state, owner=None):
+        if state is None:
+            return self
+        self.group.load(state)
+        return state.__dict__[self.name]
+
+def lazyFields(decode, *names):
+    '''
+    Descriptors for the attributes names, decoded by decode(state, data) which returns their values in order
+    (a single value for a single name). The owner keeps the packet in state.data and the names decoded
+    so far in state.decoded, and has to pop those from its __dict__ when data is replaced.
+    '''
+    group = _lazyGroup(decode, names)
+    return [lazyField(group, name) for name in names]
+
+class packetState:
+    '''
+    Base of highState and lowState for the decoding they share, parameterised by the LAYOUT of the subclass:
+    the length and crc check, the header and the in-place imu update. The structs are generated from the
+    layout once per subclass that sets LAYOUT.
+    '''
+    LAYOUT = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        layout = cls.__dict__.get('LAYOUT')
+        if layout is not None:
+            cls.LENGTH = layout.size
+            cls.HEADER_STRUCT = layout.struct('head', 'levelFlag', 'frameReserve', 'SN', 'version', 'bandWidth')
+            cls.IMU_STRUCT = layout.struct('imu')
+            cls.IMU_OFFSET = layout.offset('imu')
+
+    def checkData(self, data):
+        ''' Cheap length and crc check, so corrupt packets are dropped before any field is decoded '''
+        if len(data) != self.LENGTH:
+            self.rejectedLength += 1
+            return False
+        crcType = checkCrc(data)
+        if crcType is None:
+            self.rejectedCrc += 1
+            return False
+        self.crcType = crcType
+        return True
+
+    def dataToHeader(self, data):
+        head, levelFlag, frameReserve, SN, version, bandWidth = self.HEADER_STRUCT.unpack_from(data)
+        return hex(head), levelFlag, frameReserve, SN, version, bandWidth
+
+    def updateImu(self, data):
+        f = self.IMU_STRUCT.unpack_from(data, self.IMU_OFFSET)
+        imu = self.imu
+        imu.quaternion[:] = f[0:4]
+        imu.gyroscope[:] = f[4:7]
+        imu.accelerometer[:] = f[7:10]
+        imu.rpy[:] = f[10:13]
+        imu.temperature = f[13]
+
+class lazyState:
+    '''
+    Base of lazyHighState and lazyLowState, put it first in the bases so its __init__ and parseData win over
+    the eager state's. parseData only keeps a memoryview of the packet and forgets the fields decoded from
+    the previous one, the lazyFields of the subclass decode the rest on access.
+    '''
+    CACHE = ('data', 'decoded')         # bookkeeping of the lazy fields, not part of the state
+
+    def __init__(self, data=None, validate=False):
+        self.validate = validate
+        self.crcType = None
+        self.rejectedLength = 0
+        self.rejectedCrc = 0
+        self.inPlace = False                # every packet is decoded into new objects anyway
+        self.data = None
+        self.decoded = []
+        if data is not None:
+            self.parseData(data)
+
+    def parseData(self, data, validate=None):
+        if validate is None:
+            validate = self.validate
+        if validate and not self.checkData(data):
+            return False
+        fields = self.__dict__
+        for name in self.decoded:
+            fields.pop(name, None)
+        self.decoded.clear()
+        self.data = memoryview(data)
+        return True
+
+    def fields(self):
+        ''' The state by attribute name for printing: every lazy field (decoded now if needed), then the rest without CACHE '''
+        fields = {}
+        if self.data is not None:
+            for klass in reversed(type(self).__mro__):
+                for name, value in vars(klass).items():
+                    if isinstance(value, lazyField):
+                        fields[name] = getattr(self, name)
+        for name, value in vars(self).items():
+            if name not in self.CACHE and name not in fields:
+                fields[name] = value
+        return fields
+
+class callbackGuard:
+    '''
+    Keeps the receive thread alive when a callback raises: the caller catches the exception and hands the
+    callback to failed, which counts it (errors in total, failures per callback) and prints the traceback the
+    first time that callback fails, later failures of it are only counted.
+    '''
+    def __init__(self):
+        self.errors = 0
+        self.failures = {}                  # callback -> exceptions it raised
+
+    def failed(self, callback):
+        self.errors += 1
+        try:
+            count = self.failures.get(callback, 0)
+        except TypeError:
+            callback = id(callback)         # unhashable callable
+            count = self.failures.get(callback, 0)
+        self.failures[callback] = count + 1
+        if not count:
+            print(f'[!] Callback {callback!r} raised in the receive thread, which keeps running:')
+            traceback.print_exc()
 
 # Just little helpers to take a look when needed
 
@@ -203,13 +740,21 @@ def dump_obj(obj):
   for attr in dir(obj):
     print("obj.%s = %r" % (attr, getattr(obj, attr)))
 
+def obj_fields(obj):
+    # attributes of plain and __slots__ classes, the lazy states decode theirs
+    if isinstance(obj, lazyState):
+        return obj.fields()
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+    return {k: getattr(obj, k) for k in getattr(type(obj), '__slots__', ()) if hasattr(obj, k)}
+
 def pretty_print_obj(clas, indent=0, border=True):
     if border:
         print('===============================================================================================')
     print(' ' * indent + type(clas).__name__ + ':')
     indent += 4
-    for k, v in clas.__dict__.items():
-        if '__dict__' in dir(v):
+    for k, v in obj_fields(clas).items():
+        if '__dict__' in dir(v) or '__slots__' in dir(v):
             pretty_print_obj(v, indent, False)
         elif isinstance(v, Enum):
             print(' ' * indent + k + ': ' + str(v.value))
@@ -1,14 +1,38 @@
 from enum import Enum
 from ucl.enums import MotorModeLow
-from ucl.common import float_to_hex, hex_to_float, hex_to_tau, tau_to_hex, hex_to_kp, kp_to_hex, hex_to_kd, kd_to_hex
+from ucl.common import floats_to_hex, hex_to_floats, hex_to_tau, tau_to_hex, hex_to_kp, kp_to_hex, hex_to_kd, kd_to_hex
+from ucl.common import tau_to_hex_array, kp_to_hex_array, kd_to_hex_array, hex_to_tau_array, hex_to_kp_array, hex_to_kd_array
+from ucl.common import tau_to_code, kp_to_code, kd_to_code
+from ucl.layout import IMU_LAYOUT, MOTOR_CMD_LAYOUT
+import numpy as np
+
+MOTOR_NAMES = ('FR_0', 'FR_1', 'FR_2', 'FL_0', 'FL_1', 'FL_2', 'RR_0', 'RR_1', 'RR_2', 'RL_0', 'RL_1', 'RL_2',
+               'Unknown1', 'Unknown2', 'Unknown3', 'Unknown4', 'Unknown5', 'Unknown6', 'Unknown7', 'Unknown8')
+MOTOR_INDEX = {name: i for i, name in enumerate(MOTOR_NAMES)}
+LEG_JOINTS = np.arange(12)
+FRONT_LEGS = np.arange(6)
+REAR_LEGS = np.arange(6, 12)
+
+# One 27 byte motor command slot of a lowCmd frame
+MOTOR_CMD_STRUCT = MOTOR_CMD_LAYOUT.struct()
+MOTOR_CMD_DTYPE = MOTOR_CMD_LAYOUT.dtype
+# Columns of motorCmdArray.values
+MOTOR_CMD_COLUMNS = {'mode': 0, 'q': 1, 'dq': 2, 'tau': 3, 'Kp': 4, 'Kd': 5, 'reserve': slice(6, 9)}
+# Wire layout of an imu (53 bytes, same in highState and lowState)
+IMU_DTYPE = IMU_LAYOUT.dtype
+IMU_STRUCT = IMU_LAYOUT.struct()
 
 class cartesian:
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x,y,z):
         self.x = x
         self.y = y
         self.z = z
 
 class bmsState:
+    __slots__ = ('version_h', 'version_l', 'bms_status', 'SOC', 'current', 'cycle', 'BQ_NTC', 'MCU_NTC', 'cell_vol')
+
     def __init__(self, version_h, version_l, bms_status, SOC, current, cycle, BQ_NTC, MCU_NTC, cell_vol):
         self.version_h = version_h
         self.version_l = version_l
@@ -34,6 +58,8 @@ class bmsCmd:
         return self
 
 class led:                                  # foot led brightness: 0~255
+    __slots__ = ('r', 'g', 'b')
+
     def __init__(self, r, g, b):
         self.r = r
         self.g = g
@@ -43,6 +69,8 @@ class led:                                  # foot led brightness: 0~255
         return (self.r).to_bytes(1, byteorder='little') + (self.g).to_bytes(1, byteorder='little') + (self.b).to_bytes(1, byteorder='little') + bytes(1)
 
 class motorState:                               # motor feedback
+    __slots__ = ('mode', 'q', 'dq', 'ddq', 'tauEst', 'q_raw', 'dq_raw', 'ddq_raw', 'temperature', 'reserve')
+
     def __init__(self, mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, reserve):
         self.mode = mode                        # motor working mode
         self.q = q                              # current angle (unit: radian)
@@ -56,6 +84,8 @@ class motorState:                               # motor feedback
         self.reserve = reserve
 
 class imu:                                      # when under accelerated motion, the attitude of the robot calculated by IMU will drift.
+    __slots__ = ('quaternion', 'gyroscope', 'accelerometer', 'rpy', 'temperature')
+
     def __init__(self, quaternion, gyroscope, accelerometer, rpy, temperature):
         self.quaternion = quaternion            # quaternion, normalized, (w,x,y,z)
         self.gyroscope = gyroscope              # angular velocity （unit: rad/s)    (raw data)
@@ -64,6 +94,8 @@ class imu:                                      # when under accelerated motion,
         self.temperature = temperature
 
 class motorCmd:
+    __slots__ = ('mode', 'q', 'dq', 'tau', 'Kp', 'Kd', 'reserve')
+
     def __init__(self, mode=0, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0]):
         self.mode = mode             # desired working mode
         self.q = q                   # desired angle (unit: radian)
@@ -77,12 +109,11 @@ class motorCmd:
         if isinstance(self.mode, Enum):
             self.mode = self.mode.value
 
-        return (self.mode).to_bytes(1, byteorder='little') + float_to_hex(self.q) + float_to_hex(self.dq) + tau_to_hex(self.tau) + kp_to_hex(self.Kp) + kd_to_hex(self.Kd) + self.reserve[0].to_bytes(4, byteorder='little') + self.reserve[1].to_bytes(4, byteorder='little') + self.reserve[2].to_bytes(4, byteorder='little')
+        return (self.mode).to_bytes(1, byteorder='little') + floats_to_hex((self.q, self.dq)) + tau_to_hex(self.tau) + kp_to_hex(self.Kp) + kd_to_hex(self.Kd) + self.reserve[0].to_bytes(4, byteorder='little') + self.reserve[1].to_bytes(4, byteorder='little') + self.reserve[2].to_bytes(4, byteorder='little')
 
     def fromBytes(self, data, should_print=False):
         self.mode = data[0]                             # desired working mode
-        self.q = hex_to_float(data[1:5])                # desired angle (unit: radian)
-        self.dq = hex_to_float(data[5:9])               # desired velocity (unit: radian/second)
+        self.q, self.dq = hex_to_floats(data, 1, 2)     # desired angle (unit: radian), velocity (unit: radian/second)
         self.tau = hex_to_tau(data[9:11])             # desired output torque (unit: N.m)
         self.Kp = hex_to_kp(data[11:13])             # desired position stiffness (unit: N.m/rad )
         self.Kd = hex_to_kd(data[13:15])             # desired velocity stiffness (unit: N.m/(rad/s) )
@@ -98,123 +129,146 @@ class motorCmd:
             print(f'res:\t{byte_print(data[15:19])}, {byte_print(data[19:23])}, {byte_print(data[23:27])}')
         return self
 
-class motorCmdArray:
-    def __init__(self):
-        #JOINTS
-        self.FR_0 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.FR_1 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.FR_2 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-
-        self.FL_0 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.FL_1 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.FL_2 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-
-        self.RR_0 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.RR_1 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.RR_2 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-
-        self.RL_0 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.RL_1 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.RL_2 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-
-        self.Unknown1 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown2 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown3 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown4 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown5 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown6 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown7 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-        self.Unknown8 = motorCmd(mode=MotorModeLow.Servo, q=0, dq=0, tau=0, Kp=0, Kd=0, reserve=[0,0,0])
-
-    def setMotorCmd(self, motorIndex, motorCmd):
-        if motorIndex == 'FR_0' or motorIndex == 0:
-            self.FR_0 = motorCmd
-        if motorIndex == 'FR_1' or motorIndex == 1:
-            self.FR_1 = motorCmd
-        if motorIndex == 'FR_2' or motorIndex == 2:
-            self.FR_2 = motorCmd
-
-        if motorIndex == 'FL_0' or motorIndex == 3:
-            self.FL_0 = motorCmd
-        if motorIndex == 'FL_1' or motorIndex == 4:
-            self.FL_1 = motorCmd
-        if motorIndex == 'FL_2' or motorIndex == 5:
-            self.FL_2 = motorCmd
-
-        if motorIndex == 'RR_0' or motorIndex == 6:
-            self.RR_0 = motorCmd
-        if motorIndex == 'RR_1' or motorIndex == 7:
-            self.RR_1 = motorCmd
-        if motorIndex == 'RR_2' or motorIndex == 8:
-            self.RR_2 = motorCmd
-
-        if motorIndex == 'RL_0' or motorIndex == 9:
-            self.RL_0 = motorCmd
-        if motorIndex == 'RL_1' or motorIndex == 10:
-            self.RL_1 = motorCmd
-        if motorIndex == 'RL_2' or motorIndex == 11:
-            self.RL_2 = motorCmd
-
-        if motorIndex == 'Unknown1' or motorIndex == 12:
-            self.Unknown1 = motorCmd
-        if motorIndex == 'Unknown2' or motorIndex == 13:
-            self.Unknown2 = motorCmd
-        if motorIndex == 'Unknown3' or motorIndex == 14:
-            self.Unknown3 = motorCmd
-        if motorIndex == 'Unknown4' or motorIndex == 15:
-            self.Unknown4 = motorCmd
-        if motorIndex == 'Unknown5' or motorIndex == 16:
-            self.Unknown5 = motorCmd
-        if motorIndex == 'Unknown6' or motorIndex == 17:
-            self.Unknown6 = motorCmd
-        if motorIndex == 'Unknown7' or motorIndex == 18:
-            self.Unknown7 = motorCmd
-        if motorIndex == 'Unknown8' or motorIndex == 19:
-            self.Unknown8 = motorCmd
+def _motorField(column):
+    def get(self):
+        return self.array.values[self.index, column].item()
+    def set(self, value):
+        self.array.values[self.index, column] = getattr(value, 'value', value)
+    return property(get, set)
+
+class motorCmdView:
+    ''' One motor of a motorCmdArray, reads and writes go straight to its row '''
+    __slots__ = ('array', 'index')
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+    mode = property(lambda self: int(self.array.values[self.index, 0]), _motorField(0).fset)
+    q = _motorField(1)
+    dq = _motorField(2)
+    tau = _motorField(3)
+    Kp = _motorField(4)
+    Kd = _motorField(5)
+    reserve = property(lambda self: [int(r) for r in self.array.values[self.index, 6:9]],
+                       lambda self, value: self.array.values.__setitem__((self.index, slice(6, 9)), value[:3]))
 
     def getBytes(self):
-        return self.FR_0.getBytes() + self.FR_1.getBytes() + self.FR_2.getBytes() + self.FL_0.getBytes() + self.FL_1.getBytes() + self.FL_2.getBytes() + self.RR_0.getBytes() + self.RR_1.getBytes() + self.RR_2.getBytes() + self.RL_0.getBytes() + self.RL_1.getBytes() + self.RL_2.getBytes() + self.Unknown1.getBytes() + self.Unknown2.getBytes() + self.Unknown3.getBytes() + self.Unknown4.getBytes() + self.Unknown5.getBytes() +self.Unknown6.getBytes() + self.Unknown7.getBytes() + self.Unknown8.getBytes()
-
-    def getChunk(self, data, i):
-        return data[(i-1)*27:(i*27)]
+        return motorCmd.getBytes(self)
 
-    def fromBytes(self, data):
-        self.FR_0 = motorCmd().fromBytes(self.getChunk(data, 1), should_print=True)
-        self.FR_1 = motorCmd().fromBytes(self.getChunk(data, 2))
-        self.FR_2 = motorCmd().fromBytes(self.getChunk(data, 3))
+def _motorSlot(index):
+    return property(lambda self: self.views[index], lambda self, cmd: self.setMotorCmd(index, cmd))
 
-        self.FL_0 = motorCmd().fromBytes(self.getChunk(data, 4))
-        self.FL_1 = motorCmd().fromBytes(self.getChunk(data, 5))
+def _column(column):
+    # Column views of values, assigning to them writes into the array instead of replacing it
+    return property(lambda self: self.values[:, column], lambda self, value: self.values.__setitem__((slice(None), column), value))
 
-        # from ucl.common import byte_print
-        # print('FR0')
-        # print(byte_print(self.getChunk(data, 1)))
-        # print('FR1')
-        # print(byte_print(self.getChunk(data, 2)))
-        # print('FL1')
-        # print(byte_print(self.getChunk(data, 5)))
-        # print('FL2')
-        # print(byte_print(self.getChunk(data, 6)))
-
-        self.FL_2 = motorCmd().fromBytes(self.getChunk(data, 6))
+class motorCmdArray:
+    '''
+    The 20 motor commands of a lowCmd, stored as one 20x9 float array (mode, q, dq, tau, Kp, Kd, reserve[3])
+    in MOTOR_NAMES order. mode, q, dq, tau, Kp, Kd (and reserve, 20x3) are views of its columns, so whole
+    groups can be set at once:
 
+        cmds.q[LEG_JOINTS] = q_des
+        cmds.Kp[FRONT_LEGS] *= 0.5
 
-        self.RR_0 = motorCmd().fromBytes(self.getChunk(data, 7))
-        self.RR_1 = motorCmd().fromBytes(self.getChunk(data, 8))
-        self.RR_2 = motorCmd().fromBytes(self.getChunk(data, 9))
+    FR_0 .. Unknown8 still work and give views of their row.
+    '''
+    # Changing more motors than this at once is encoded with the numpy codecs, fewer one struct at a time
+    VECTOR_ENCODE = 8
 
-        self.RL_0 = motorCmd().fromBytes(self.getChunk(data, 10))
-        self.RL_1 = motorCmd().fromBytes(self.getChunk(data, 11))
-        self.RL_2 = motorCmd().fromBytes(self.getChunk(data, 12))
+    def __init__(self):
+        self.values = np.zeros((20, 9))
+        self.values[:, 0] = MotorModeLow.Servo.value
+        self.views = [motorCmdView(self, i) for i in range(20)]
+
+        # What packInto last wrote where, and the arrays it compares values against them with, see packInto
+        self.packedBuffer = None
+        self.packedOffset = None
+        self.packedSlots = None
+        self.packedValues = np.zeros((20, 9))
+        self.changed = np.zeros((20, 9), dtype=bool)
+        self.dirty = np.zeros(20, dtype=bool)
+
+    mode = _column(0)
+    q = _column(1)
+    dq = _column(2)
+    tau = _column(3)
+    Kp = _column(4)
+    Kd = _column(5)
+    reserve = _column(slice(6, 9))
+
+    FR_0, FR_1, FR_2, FL_0, FL_1, FL_2, RR_0, RR_1, RR_2, RL_0, RL_1, RL_2, \
+        Unknown1, Unknown2, Unknown3, Unknown4, Unknown5, Unknown6, Unknown7, Unknown8 = [_motorSlot(i) for i in range(20)]
+
+    def index(self, motors):
+        ''' Index (or index array) for a motor name / number or a list of them '''
+        if isinstance(motors, (list, tuple)):
+            return np.array([MOTOR_INDEX.get(m, m) for m in motors], dtype=np.intp)
+        return MOTOR_INDEX.get(motors, motors)
 
-        self.Unknown1 = motorCmd().fromBytes(self.getChunk(data, 13))
-        self.Unknown2 = motorCmd().fromBytes(self.getChunk(data, 14))
-        self.Unknown3 = motorCmd().fromBytes(self.getChunk(data, 15))
-        self.Unknown4 = motorCmd().fromBytes(self.getChunk(data, 16))
-        self.Unknown5 = motorCmd().fromBytes(self.getChunk(data, 17))
-        self.Unknown6 = motorCmd().fromBytes(self.getChunk(data, 18))
-        self.Unknown7 = motorCmd().fromBytes(self.getChunk(data, 19))
-        self.Unknown8 = motorCmd().fromBytes(self.getChunk(data, 20))
+    def setMotorCmd(self, motorIndex, motorCmd):
+        reserve = motorCmd.reserve
+        self.values[self.index(motorIndex)] = (getattr(motorCmd.mode, 'value', motorCmd.mode), motorCmd.q, motorCmd.dq,
+                                               motorCmd.tau, motorCmd.Kp, motorCmd.Kd, reserve[0], reserve[1], reserve[2])
+
+    def encode(self, slots, rows):
+        ''' Encode the given rows into the matching entries of slots (MOTOR_CMD_DTYPE) '''
+        values = self.values[rows]
+        slots['mode'][rows] = values[:, 0]
+        slots['q'][rows] = values[:, 1]
+        slots['dq'][rows] = values[:, 2]
+        slots['tau'][rows] = tau_to_hex_array(values[:, 3])
+        slots['Kp'][rows] = kp_to_hex_array(values[:, 4])
+        slots['Kd'][rows] = kd_to_hex_array(values[:, 5])
+        slots['reserve'][rows] = values[:, 6:9]
+
+    def invalidate(self):
+        ''' Forget what packInto wrote, the next call encodes all 20 motors again '''
+        self.packedBuffer = None
+
+    def packInto(self, buffer, offset):
+        '''
+        Encode all 20 commands in place, re-encoding only the motors whose command changed since the last call.
+        The comparison runs into preallocated arrays, so a tick that changes a few motors allocates no numpy
+        temporaries, only the python values it packs.
+        '''
+        values = self.values
+        dirty = self.dirty
+        if buffer is not self.packedBuffer or offset != self.packedOffset:
+            self.packedBuffer = buffer
+            self.packedOffset = offset
+            self.packedSlots = np.frombuffer(buffer, dtype=MOTOR_CMD_DTYPE, count=20, offset=offset)
+            dirty.fill(True)
+        else:
+            np.not_equal(values, self.packedValues, out=self.changed)
+            self.changed.any(axis=1, out=dirty)
+        count = np.count_nonzero(dirty)
+        if count > self.VECTOR_ENCODE:
+            self.encode(self.packedSlots, dirty)
+        elif count:
+            for i in range(20):
+                if dirty[i]:
+                    mode, q, dq, tau, Kp, Kd, r0, r1, r2 = values[i].tolist()
+                    MOTOR_CMD_STRUCT.pack_into(buffer, offset + i * 27, int(mode), q, dq, tau_to_code(tau), kp_to_code(Kp), kd_to_code(Kd),
+                                               int(r0), int(r1), int(r2))
+        else:
+            return
+        # rows that did not change are equal already, copying all of them needs no index array
+        np.copyto(self.packedValues, values)
 
+    def getBytes(self):
+        slots = np.zeros(20, dtype=MOTOR_CMD_DTYPE)
+        self.encode(slots, slice(None))
+        return slots.tobytes()
 
+    def fromBytes(self, data):
+        slots = np.frombuffer(data, dtype=MOTOR_CMD_DTYPE, count=20)
+        self.values[:, 0] = slots['mode']
+        self.values[:, 1] = slots['q']
+        self.values[:, 2] = slots['dq']
+        self.values[:, 3] = hex_to_tau_array(slots['tau'])
+        self.values[:, 4] = hex_to_kp_array(slots['Kp'])
+        self.values[:, 5] = hex_to_kd_array(slots['Kd'])
+        self.values[:, 6:9] = slots['reserve']
         return self
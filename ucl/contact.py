@@ -0,0 +1,93 @@
+import time
+import numpy as np
+
+from ucl.common import callbackGuard
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+
+FEET = ('FR', 'FL', 'RR', 'RL')             # order of footForce / footForceEst
+
+class contactEstimator:
+    '''
+    Per foot contact state from the footForce stream, all four feet at once with numpy:
+
+        contacts = contactEstimator(onTouchdown=lambda foot, stamp: ...)
+        conn.watch(HIGH_STATE, contacts.feed)
+        ...
+        if contacts.contact.all(): ...
+
+    A foot in the air touches down when its force reaches touchdown, a foot on the ground lifts off when its
+    force drops below liftoff (hysteresis). Either change only counts once it held for debounce samples in a
+    row, and is stamped with the time of the first of them. touchdownTime / liftoffTime hold the stamp of the
+    last touchdown / liftoff of every foot (nan before the first one), onTouchdown / onLiftoff are called with
+    the foot index and that stamp (a callback that raises is counted in guard, the other feet still get theirs).
+    field is 'footForce' (sensor) or 'footForceEst'.
+    '''
+    def __init__(self, touchdown=20, liftoff=10, debounce=3, field='footForce', onTouchdown=None, onLiftoff=None):
+        if liftoff > touchdown:
+            raise ValueError('liftoff threshold must not be above the touchdown threshold')
+        if debounce < 1:
+            raise ValueError('debounce must be at least 1 sample')
+        self.touchdown = touchdown
+        self.liftoff = liftoff
+        self.debounce = debounce
+        self.offsets = {HIGH_STATE_LAYOUT.size: HIGH_STATE_LAYOUT.offset(field), LOW_STATE_LAYOUT.size: LOW_STATE_LAYOUT.offset(field)}
+        self.onTouchdown = onTouchdown
+        self.onLiftoff = onLiftoff
+        self.guard = callbackGuard()
+        self.reset()
+
+    def reset(self):
+        self.contact = np.zeros(4, dtype=bool)
+        self.force = np.zeros(4)
+        self.limit = np.full(4, float(self.touchdown))      # touchdown for feet in the air, liftoff for the others
+        self.count = np.zeros(4, dtype=np.int64)            # samples in a row that disagree with contact
+        self.counting = False                               # count is not all zero
+        self.pending = np.zeros(4)                          # stamp of the first of them
+        self.touchdownTime = np.full(4, np.nan)
+        self.liftoffTime = np.full(4, np.nan)
+
+    def feed(self, data, stamp=None):
+        ''' update with the footForce of a highState or lowState packet '''
+        offset = self.offsets.get(len(data))
+        if offset is None:
+            return None
+        return self.update(np.frombuffer(data, dtype='<i2', count=4, offset=offset), stamp)
+
+    def update(self, force, stamp=None):
+        ''' Feed the four forces of one sample, returns the mask of the feet whose contact changed '''
+        if stamp is None:
+            stamp = time.perf_counter()
+        self.force[:] = force
+        contact = self.contact
+        disagree = (self.force >= self.limit) != contact
+        count = self.count
+        if not disagree.any():
+            # the common case: every foot agrees with its contact state
+            if self.counting:
+                count[:] = 0
+                self.counting = False
+            return disagree
+        np.copyto(self.pending, stamp, where=disagree & (count == 0))
+        count += disagree
+        count *= disagree
+        self.counting = True
+        changed = count >= self.debounce
+        if not changed.any():
+            return changed
+        contact ^= changed
+        count[changed] = 0
+        self.limit[:] = np.where(contact, self.liftoff, self.touchdown)
+        np.copyto(self.touchdownTime, self.pending, where=changed & contact)
+        np.copyto(self.liftoffTime, self.pending, where=changed & ~contact)
+        for foot in np.flatnonzero(changed):
+            callback = self.onTouchdown if contact[foot] else self.onLiftoff
+            if callback is not None:
+                try:
+                    callback(int(foot), float(self.pending[foot]))
+                except Exception:
+                    self.guard.failed(callback)
+        return changed
+
+    def inContact(self, foot):
+        ''' contact of one foot, by index or name ('FR', 'FL', 'RR', 'RL') '''
+        return bool(self.contact[FEET.index(foot) if isinstance(foot, str) else foot])
@@ -1,7 +1,15 @@
 from ucl.enums import MotorModeHigh, GaitType, SpeedLevel
-from enum import Enum
-from ucl.common import float_to_hex, encryptCrc, genCrc, byte_print
+from ucl.common import frameCrc, byte_print
 from ucl.complex import led, bmsCmd
+from ucl.layout import HIGH_CMD_LAYOUT
+
+HIGH_CMD_LENGTH = HIGH_CMD_LAYOUT.size
+
+# Whole high level command layout (head .. reserve) in one precompiled struct, the rest is zero padding + crc
+HIGH_CMD_STRUCT = HIGH_CMD_LAYOUT.struct('head', 'levelFlag', 'frameReserve', 'SN', 'version', 'bandWidth', 'mode', 'gaitType',
+                                         'speedLevel', 'footRaiseHeight', 'bodyHeight', 'position', 'euler', 'velocity',
+                                         'yawSpeed', 'bms', 'led', 'wirelessRemote', 'reserve')
+_CRC = HIGH_CMD_LAYOUT.offset('crc')
 
 class highCmd:
     def __init__(self):
@@ -26,50 +34,30 @@ class highCmd:
         self.reserve = bytearray(4)
         self.crc = None
         self.encrypt = False
+        # crc covers cmd[:124]; head..version (0:20) and bms[3]..reserve (68:124) rarely change
+        self.crcCache = frameCrc(124, 20, 68)
+        # Frame buffer reused by every buildCmd call, send it before building the next one
+        self.buffer = bytearray(HIGH_CMD_LENGTH)
 
     def buildCmd(self, debug=False):
-        cmd = bytearray(129)
-        cmd[0:2] = self.head
-        cmd[2] = self.levelFlag
-        cmd[3] = self.frameReserve
-        cmd[4:12] = self.SN
-        cmd[12:20] = self.version
-        cmd[20:22] = self.bandWidth
-
-        if isinstance(self.mode, Enum):
-            cmd[22] = self.mode.value
-        else:
-            cmd[22] = self.mode
-        if isinstance(self.gaitType, Enum):
-            cmd[23] = self.gaitType.value
-        else:
-            cmd[23] = self.gaitType
-        if isinstance(self.speedLevel, Enum):
-            cmd[24] = self.speedLevel.value
-        else:
-            cmd[24] = self.speedLevel
-        cmd[25:29] = float_to_hex(self.footRaiseHeight)
-        cmd[29:33] = float_to_hex(self.bodyHeight)
-
-        cmd[33:37] = float_to_hex(self.position[0])
-        cmd[37:41] = float_to_hex(self.position[1])
-
-        cmd[41:45] = float_to_hex(self.euler[0])
-        cmd[45:49] = float_to_hex(self.euler[1])
-        cmd[49:53] = float_to_hex(self.euler[2])
-
-        cmd[53:57] = float_to_hex(self.velocity[0])
-        cmd[57:61] = float_to_hex(self.velocity[1])
-
-        cmd[61:65] = float_to_hex(self.yawSpeed)
-        cmd[65:69] = self.bms.getBytes()
-        cmd[69:73] = self.led.getBytes()
-        cmd[73:113] = self.wirelessRemote
-        cmd[113:117] = self.reserve
-        if self.encrypt:
-            cmd[-4:] = encryptCrc(genCrc(cmd[:-5]))
-        else:
-            cmd[-4:] = genCrc(cmd[:-5])
+        cmd = self.buffer
+        position = self.position
+        velocity = self.velocity
+        euler = self.euler                          # list, tuple or numpy array
+        HIGH_CMD_STRUCT.pack_into(cmd, 0,
+                                  self.head, self.levelFlag, self.frameReserve, self.SN, self.version, self.bandWidth,
+                                  getattr(self.mode, 'value', self.mode),
+                                  getattr(self.gaitType, 'value', self.gaitType),
+                                  getattr(self.speedLevel, 'value', self.speedLevel),
+                                  self.footRaiseHeight, self.bodyHeight,
+                                  position[0], position[1],
+                                  euler[0], euler[1], euler[2],
+                                  velocity[0], velocity[1],
+                                  self.yawSpeed,
+                                  self.bms.off, self.bms.reserve[0], self.bms.reserve[1], self.bms.reserve[2],
+                                  self.led.r, self.led.g, self.led.b,
+                                  self.wirelessRemote, self.reserve)
+        self.crcCache.packInto(cmd, _CRC, self.encrypt)
         if debug:
             print(f'Send Data ({len(cmd)}): {byte_print(cmd)}')
         return cmd
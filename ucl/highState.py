@@ -1,11 +1,71 @@
 from ucl.enums import MotorModeHigh, GaitType, SpeedLevel
-from enum import Enum
-from ucl.common import float_to_hex, hex_to_float, encryptCrc, genCrc, byte_print
-from ucl.complex import cartesian, led, bmsState, imu, motorState
-import struct
+from ucl.common import checkCrc, recordView, lazyFields, lazyState, packetState, decodeMany, latestPacket
+from ucl.complex import cartesian, bmsState, imu, motorState, IMU_STRUCT
+from ucl.layout import HIGH_STATE_LAYOUT, HIGH_MOTOR_STATE_LAYOUT, HIGH_BMS_STATE_LAYOUT
+import numpy as np
 
-class highState:
-    def __init__(self): #highState len == 1087 / lowState len == 807
+HIGH_STATE_LENGTH = HIGH_STATE_LAYOUT.size
+
+# Everything below is generated from HIGH_STATE_LAYOUT (ucl/layout.py)
+HIGH_MOTOR_STATE_DTYPE = HIGH_MOTOR_STATE_LAYOUT.dtype
+HIGH_BMS_STATE_DTYPE = HIGH_BMS_STATE_LAYOUT.dtype
+HIGH_STATE_DTYPE = HIGH_STATE_LAYOUT.dtype
+
+HIGH_MOTOR_STATE_STRUCT = HIGH_MOTOR_STATE_LAYOUT.struct()
+HIGH_BMS_STRUCT = HIGH_BMS_STATE_LAYOUT.struct()
+_MOTORS, _ = HIGH_STATE_LAYOUT.elements('motorstate')      # offset of every motor slot
+_FEET = HIGH_STATE_LAYOUT.fields('footForce', 'footForceEst')
+_MOTION = HIGH_STATE_LAYOUT.fields('mode', 'progress', 'gaitType', 'footRaiseHeight', 'position', 'bodyHeight', 'velocity',
+                                   'yawSpeed', 'rangeObstacle', 'footPosition2Body', 'footSpeed2Body')
+_IMU = HIGH_STATE_LAYOUT.slice('imu')
+_BMS = HIGH_STATE_LAYOUT.slice('bms')
+_REMOTE = HIGH_STATE_LAYOUT.slice('wirelessRemote')
+_RESERVE = HIGH_STATE_LAYOUT.slice('reserve')
+_CRC = HIGH_STATE_LAYOUT.slice('crc')
+
+def decodeHighState(data, validate=False):
+    '''
+    Zero-copy decode of a highState packet with the attribute names of highState. Fields are typed numpy
+    views into the packet (state.motorstate.q is the 20 joint angles, state.imu.rpy, state.footPosition2Body
+    is 4x3, state.motorstate[i].q still works), so nothing is decoded until it is read; state.array is the
+    underlying 0-d structured array. The views share memory with data, keep (or copy) the packet if it is a
+    buffer that gets reused. Returns None for a packet with a wrong length or crc when validate is set.
+    '''
+    if validate and (len(data) != HIGH_STATE_LENGTH or checkCrc(data) is None):
+        return None
+    return recordView(np.ndarray((), dtype=HIGH_STATE_DTYPE, buffer=data))
+
+def decodeHighStates(packets, validate=False):
+    '''
+    Columnar decode of a receive backlog (e.g. unitreeConnection.getData()): arrays with one row per highState
+    packet, motorstate.q / dq / tauEst are N x 20, imu.quaternion N x 4, footForce N x 4 and so on.
+    Packets of another length (and with a bad crc when validate is set) are skipped.
+    '''
+    return decodeMany(packets, HIGH_STATE_DTYPE, validate)
+
+def latestHighState(packets, validate=False):
+    ''' decodeHighState of the newest highState packet in packets, None if there is none '''
+    paket = latestPacket(packets, HIGH_STATE_LENGTH, validate)
+    if paket is None:
+        return None
+    return recordView(np.ndarray((), dtype=HIGH_STATE_DTYPE, buffer=paket))
+
+def highStateFields(*fields):
+    '''
+    Decoder for just the given fields of a highState packet, generated once per field list and cached:
+
+        decode = highStateFields('imu.rpy', 'bodyHeight', 'mode')
+        rpy, bodyHeight, mode = decode(data)
+
+    Paths follow the attribute names of highState, 'motorstate.q' gives the q of all 20 motors,
+    'motorstate[3].q' the one of motor 3. Array fields come back as tuples. The packet is not validated.
+    '''
+    return HIGH_STATE_LAYOUT.fields(*fields)
+
+class highState(packetState):
+    LAYOUT = HIGH_STATE_LAYOUT
+
+    def __init__(self, validate=False, inPlace=False): #highState len == 1087 / lowState len == 807
         self.head = bytearray(2)
         self.levelFlag = 0
         self.frameReserve = 0
@@ -13,90 +73,119 @@ class highState:
         self.version = bytearray(8)
         self.bandWidth = bytearray(4)
         self.imu = imu([0.0,0.0,0.0,0.0],[0.0,0.0,0.0],[0.0,0.0,0.0],[0.0,0.0,0.0],0)
-        self.motorstate = [motorState(0,0,0,0,0,0,0,0,0,0)]*20
-        self.bms = bmsState(0,0,0,0,0,0,0,0,0)
-        self.footForce = [bytes.fromhex('0000')]*4
-        self.footForceEst = [bytes.fromhex('0000')]*4
+        self.motorstate = [motorState(0,0,0,0,0,0,0,0,0,[0,0]) for _ in range(20)]
+        self.bms = bmsState(0,0,0,0,0,0,[0,0],[0,0],[0]*10)
+        self.footForce = [0]*4
+        self.footForceEst = [0]*4
         self.mode = MotorModeHigh.IDLE
         self.progress = 0.0
         self.gaitType = GaitType.IDLE
         self.footRaiseHeight = 0.0
-        self.position = [0.0, 0.0]
+        self.position = [0.0, 0.0, 0.0]
         self.bodyHeight = 0.0
-        self.velocity = [0.0, 0.0]
+        self.velocity = [0.0, 0.0, 0.0]
         self.yawSpeed = 0.0
-        self.rangeObstacle = bytearray(16)
-        self.footPosition2Body = bytearray(48)
-        self.footSpeed2Body = bytearray(48)
+        self.rangeObstacle = [0.0]*4
+        self.footPosition2Body = [cartesian(0.0, 0.0, 0.0) for _ in range(4)]
+        self.footSpeed2Body = [cartesian(0.0, 0.0, 0.0) for _ in range(4)]
         self.speedLevel = SpeedLevel.LOW_SPEED
         self.wirelessRemote = bytearray(40)
         self.reserve = bytearray(4)
+        self.validate = validate            # check length and crc before decoding a packet
+        self.crcType = None                 # 'plain' or 'encrypted', set by checkData
+        self.rejectedLength = 0             # packets dropped because of a wrong length
+        self.rejectedCrc = 0                # packets dropped because of a crc mismatch
+        self.inPlace = inPlace              # parseData updates the objects and lists above instead of replacing them
 
     def dataToBmsState(self,data):
-        version_h = data[0]
-        version_l = data[1]
-        bms_status = data[2]
-        SOC = data[3]
-        current = int.from_bytes(data[4:8], byteorder='little', signed=True)
-        cycle = int.from_bytes(data[8:10], byteorder='little')
-        BQ_NTC = [data[10], data[11]]
-        MCU_NTC = [data[12], data[13]]
-        cell_vol = [int.from_bytes(data[13:15], byteorder='little'), int.from_bytes(data[15:17], byteorder='little'), int.from_bytes(data[17:19], byteorder='little'), int.from_bytes(data[19:21], byteorder='little'), int.from_bytes(data[21:23], byteorder='little'),
-                    int.from_bytes(data[23:25], byteorder='little'), int.from_bytes(data[25:27], byteorder='little'), int.from_bytes(data[27:29], byteorder='little'), int.from_bytes(data[29:31], byteorder='little'), int.from_bytes(data[31:33], byteorder='little')]
-        return bmsState(version_h, version_l, bms_status, SOC, current, cycle, BQ_NTC, MCU_NTC, cell_vol)
-
+        f = HIGH_BMS_STRUCT.unpack_from(data)
+        return bmsState(f[0], f[1], f[2], f[3], f[4], f[5], list(f[6:8]), list(f[8:10]), list(f[10:20]))
 
     def dataToImu(self, data):
-        quaternion = [hex_to_float(data[0:4]), hex_to_float(data[4:8]), hex_to_float(data[8:12]), hex_to_float(data[12:16])]
-        gyroscope = [hex_to_float(data[16:20]), hex_to_float(data[20:24]), hex_to_float(data[24:28])]
-        accelerometer = [hex_to_float(data[28:32]), hex_to_float(data[32:36]), hex_to_float(data[36:40])]
-        rpy = [hex_to_float(data[40:44]), hex_to_float(data[44:48]), hex_to_float(data[48:52])]
-        temperature = data[52]
-        return imu(quaternion, gyroscope, accelerometer, rpy, temperature)
-
-    def dataToMotorState(self, data):
-        mode = data[0]
-        q = hex_to_float(data[1:5])
-        dq = hex_to_float(data[5:9])
-        ddq = hex_to_float(data[9:13])
-        tauEst = hex_to_float(data[13:17])
-        q_raw = hex_to_float(data[17:21])
-        dq_raw = hex_to_float(data[21:25])
-        ddq_raw = hex_to_float(data[25:29])
-        temperature = data[29]
-        reserve = [data[30], data[31]]
-        return motorState(mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, reserve)
-
-    def parseData(self, data):
-        self.head = hex(int.from_bytes(data[0:2], byteorder='little'))
-        self.levelFlag = data[2]
-        self.frameReserve = data[3]
-        self.SN = data[4:12]
-        self.version = data[12:20]
-        self.bandWidth = int.from_bytes(data[20:22], byteorder='little')
-        self.imu = self.dataToImu(data[22:75])
-        self.motorstate=[]
-        for i in range(20):
-            self.motorstate.append(self.dataToMotorState(data[(i*32)+75:(i*32)+32+75]))
-        # FIX FROM HERE!!!
-        self.bms=self.dataToBmsState(data[835:869])
-        self.footForce = [int.from_bytes(data[869:871], byteorder='little'), int.from_bytes(data[871:873], byteorder='little'), int.from_bytes(data[873:875], byteorder='little'), int.from_bytes(data[875:877], byteorder='little')]
-        self.footForceEst = [int.from_bytes(data[877:879], byteorder='little'), int.from_bytes(data[879:881], byteorder='little'), int.from_bytes(data[881:883], byteorder='little'), int.from_bytes(data[883:885], byteorder='little')]
-        self.mode = data[885]
-        self.progress = hex_to_float(data[886:890])
-        self.gaitType = data[890]
-        self.footRaiseHeight = hex_to_float(data[891:895])
-        self.position = [hex_to_float(data[895:899]), hex_to_float(data[899:903]), hex_to_float(data[903:907])]
-        self.bodyHeight = hex_to_float(data[907:911])
-        self.velocity = [hex_to_float(data[911:915]), hex_to_float(data[915:919]), hex_to_float(data[919:923])]
-        self.yawSpeed = hex_to_float(data[923:927])
-        self.rangeObstacle = [hex_to_float(data[927:931]), hex_to_float(data[931:935]), hex_to_float(data[935:939]), hex_to_float(data[939:943])]
-        self.footPosition2Body = []
-        for i in range(4):
-            self.footPosition2Body.append(cartesian(hex_to_float(data[(i*12)+943:(i*12)+947]), hex_to_float(data[(i*12)+947:(i*12)+951]), hex_to_float(data[(i*12)+951:(i*12)+955])))
-        self.footSpeed2Body = []
-        for i in range(4):
-            self.footSpeed2Body.append(cartesian(hex_to_float(data[(i*12)+991:(i*12)+995]), hex_to_float(data[(i*12)+995:(i*12)+999]), hex_to_float(data[(i*12)+999:(i*12)+1003])))
-        self.wirelessRemote = data[1039:1079]
-        self.reserve = data[1079:1083]
-        self.crc = data[1083:1087]
+        f = IMU_STRUCT.unpack_from(data)
+        return imu(list(f[0:4]), list(f[4:7]), list(f[7:10]), list(f[10:13]), f[13])
+
+    def dataToMotorState(self, data, offset=0):
+        mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, r0, r1 = HIGH_MOTOR_STATE_STRUCT.unpack_from(data, offset)
+        return motorState(mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, [r0, r1])
+
+    def dataToMotorStates(self, data):
+        return [self.dataToMotorState(data, offset) for offset in _MOTORS]
+
+    def dataToFootForce(self, data):
+        footForce, footForceEst = _FEET(data)
+        return list(footForce), list(footForceEst)
+
+    def dataToMotion(self, data):
+        (mode, progress, gaitType, footRaiseHeight, position, bodyHeight, velocity, yawSpeed, rangeObstacle,
+         footPosition2Body, footSpeed2Body) = _MOTION(data)
+        return (mode, progress, gaitType, footRaiseHeight, list(position), bodyHeight, list(velocity), yawSpeed, list(rangeObstacle),
+                [cartesian(*p) for p in footPosition2Body], [cartesian(*p) for p in footSpeed2Body])
+
+    def dataToTail(self, data):
+        return bytes(data[_REMOTE]), bytes(data[_RESERVE]), bytes(data[_CRC])
+
+    def updateMotorStates(self, data):
+        # one motor slot at a time, a tuple of all 20 would be the largest allocation of the parse
+        unpack = HIGH_MOTOR_STATE_STRUCT.unpack_from
+        for offset, m in zip(_MOTORS, self.motorstate):
+            m.mode, m.q, m.dq, m.ddq, m.tauEst, m.q_raw, m.dq_raw, m.ddq_raw, m.temperature, m.reserve[0], m.reserve[1] = unpack(data, offset)
+
+    def updateBmsState(self, data):
+        bms = self.bms
+        f = HIGH_BMS_STRUCT.unpack_from(data, _BMS.start)
+        bms.version_h, bms.version_l, bms.bms_status, bms.SOC, bms.current, bms.cycle = f[0], f[1], f[2], f[3], f[4], f[5]
+        bms.BQ_NTC[:], bms.MCU_NTC[:], bms.cell_vol[:] = f[6:8], f[8:10], f[10:20]
+
+    def updateMotion(self, data):
+        self.footForce[:], self.footForceEst[:] = _FEET(data)
+        (self.mode, self.progress, self.gaitType, self.footRaiseHeight, self.position[:], self.bodyHeight, self.velocity[:],
+         self.yawSpeed, self.rangeObstacle[:], footPosition2Body, footSpeed2Body) = _MOTION(data)
+        for c, p in zip(self.footPosition2Body, footPosition2Body):
+            c.x, c.y, c.z = p
+        for c, p in zip(self.footSpeed2Body, footSpeed2Body):
+            c.x, c.y, c.z = p
+
+    def parseData(self, data, validate=None):
+        if validate is None:
+            validate = self.validate
+        if validate and not self.checkData(data):
+            return False
+        if self.inPlace:
+            self.head, self.levelFlag, self.frameReserve, self.SN, self.version, self.bandWidth = self.dataToHeader(data)
+            self.updateImu(data)
+            self.updateMotorStates(data)
+            self.updateBmsState(data)
+            self.updateMotion(data)
+            self.wirelessRemote, self.reserve, self.crc = self.dataToTail(data)
+            return True
+        self.head, self.levelFlag, self.frameReserve, self.SN, self.version, self.bandWidth = self.dataToHeader(data)
+        self.imu = self.dataToImu(data[_IMU])
+        self.motorstate = self.dataToMotorStates(data)
+        self.bms = self.dataToBmsState(data[_BMS])
+        self.footForce, self.footForceEst = self.dataToFootForce(data)
+        (self.mode, self.progress, self.gaitType, self.footRaiseHeight, self.position, self.bodyHeight, self.velocity,
+         self.yawSpeed, self.rangeObstacle, self.footPosition2Body, self.footSpeed2Body) = self.dataToMotion(data)
+        self.wirelessRemote, self.reserve, self.crc = self.dataToTail(data)
+        return True
+
+class lazyHighState(lazyState, highState):
+    '''
+    highState that decodes on access: parseData only keeps a memoryview of the packet, and each group of
+    fields (header, imu, motorstate, bms, feet, motion, remote/reserve/crc) is decoded the first time one of
+    them is read, then cached until the next packet. A loop that reads only motorstate pays for nothing else.
+    The packet must not change while the state refers to it (bytes from the socket never do).
+    '''
+    def __init__(self, data=None, validate=False):
+        self.speedLevel = SpeedLevel.LOW_SPEED          # not in the packet, like in highState
+        lazyState.__init__(self, data, validate)
+
+    head, levelFlag, frameReserve, SN, version, bandWidth = lazyFields(highState.dataToHeader, 'head', 'levelFlag', 'frameReserve', 'SN', 'version', 'bandWidth')
+    imu, = lazyFields(lambda self, data: self.dataToImu(data[_IMU]), 'imu')
+    motorstate, = lazyFields(highState.dataToMotorStates, 'motorstate')
+    bms, = lazyFields(lambda self, data: self.dataToBmsState(data[_BMS]), 'bms')
+    footForce, footForceEst = lazyFields(highState.dataToFootForce, 'footForce', 'footForceEst')
+    mode, progress, gaitType, footRaiseHeight, position, bodyHeight, velocity, yawSpeed, rangeObstacle, footPosition2Body, footSpeed2Body = \
+        lazyFields(highState.dataToMotion, 'mode', 'progress', 'gaitType', 'footRaiseHeight', 'position', 'bodyHeight', 'velocity',
+                   'yawSpeed', 'rangeObstacle', 'footPosition2Body', 'footSpeed2Body')
+    wirelessRemote, reserve, crc = lazyFields(highState.dataToTail, 'wirelessRemote', 'reserve', 'crc')
@@ -0,0 +1,84 @@
+import struct
+import time
+import numpy as np
+
+from ucl.common import scaled
+
+class stateHistory:
+    '''
+    Fixed-capacity history of some fields of a state packet, stored column-wise in preallocated numpy arrays:
+
+        history = stateHistory(HIGH_STATE_LAYOUT, ('imu.rpy', 'footForce', 'motorstate.q'), capacity=1000)
+        conn.watch(HIGH_STATE, lambda data: history.append(data, conn.stamp))
+        ...
+        rpy = history.window('imu.rpy', 250)        # 250 x 3, oldest first
+        rpy.mean(axis=0)
+
+    As a listener the history leaves the packets to getData / the mailbox (an onPacket handler would take them
+    over) and stores their arrival time from the receive path. append is O(1): the bytes of each field are
+    gathered from the packet and written into its column, nothing is decoded. Every sample is written twice
+    (at i and i + capacity), so any window of up to capacity samples is one contiguous slice and window returns
+    a view without copying. The view is live, samples older than capacity - n are overwritten by later appends,
+    copy it to keep it longer.
+    Fields named in the scale of the layout are fixed-point and come back multiplied (a copy), as in recordView.
+    '''
+    def __init__(self, layout, fields, capacity=1000):
+        self.layout = layout
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.columns = {}
+        self.writers = []
+        for path in self.fields:
+            offsets, code, shape = layout.fieldOffsets(path)
+            size = struct.calcsize('<' + code)
+            positions = np.array([o + k for o in offsets for k in range(size)], dtype=np.intp)
+            column = np.zeros((2 * capacity,) + shape, dtype=np.dtype('<' + code))
+            self.columns[path] = column
+            self.writers.append((positions, column.reshape(2 * capacity, -1).view(np.uint8)))
+        self.stamps = np.zeros(2 * capacity)       # time.perf_counter() of each sample
+        self.clear()
+
+    def clear(self):
+        self.index = -1                             # slot of the newest sample
+        self.count = 0                              # samples appended since the last clear
+
+    def append(self, data, stamp=None):
+        ''' Store the fields of one packet, False (and nothing stored) if it has the wrong length '''
+        if len(data) != self.layout.size:
+            return False
+        packet = np.frombuffer(data, dtype=np.uint8)
+        i = (self.index + 1) % self.capacity
+        j = i + self.capacity
+        for positions, column in self.writers:
+            row = packet[positions]
+            column[i] = row
+            column[j] = row
+        self.stamps[i] = self.stamps[j] = time.perf_counter() if stamp is None else stamp
+        self.index = i
+        self.count += 1
+        return True
+
+    def extend(self, packets):
+        for data in packets:
+            self.append(data)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def window(self, field, n=None):
+        ''' The last n samples of field (all stored ones if n is None), oldest first '''
+        column = self.columns[field] if field != 'stamp' else self.stamps
+        size = len(self)
+        n = size if n is None else min(n, size)
+        end = self.index + self.capacity + 1
+        values = column[end - n:end]
+        scale = self.layout.scale.get(field.rpartition('.')[2])
+        if scale is not None and field != 'stamp':
+            return scaled(values, scale)
+        return values
+
+    def latest(self, field):
+        ''' The newest sample of field '''
+        if not self.count:
+            raise IndexError('history is empty')
+        return self.window(field, 1)[0]
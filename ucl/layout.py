@@ -0,0 +1,290 @@
+# Wire layouts of the packets, one table per packet / sub structure. Each row is
+#   (field, offset, type, count[, scale])
+# type is a struct code ('B', 'b', 'H', 'h', 'I', 'i', 'f'), 's' for raw bytes (count is the length) or another
+# layout for a nested structure. count is the number of elements (or the shape of an array), scale the factor
+# of a fixed-point field. The numpy dtypes, struct formats and field offsets of the highCmd / lowCmd encoders
+# and the highState / lowState decoders are all generated from these tables once at import.
+from functools import lru_cache
+import struct
+import numpy as np
+
+from ucl.common import fieldDecoder, fieldOffsets
+
+_NUMPY_TYPES = {'B': 'u1', 'b': 'i1', 'H': '<u2', 'h': '<i2', 'I': '<u4', 'i': '<i4', 'f': '<f4', 's': 'u1'}
+
+class packetLayout:
+    def __init__(self, name, size, rows):
+        self.name = name
+        self.size = size
+        self.rows = [row + (None,) * (5 - len(row)) for row in rows]
+        self.index = {row[0]: row for row in self.rows}
+        self.dtype = np.dtype({'names': [row[0] for row in self.rows],
+                               'formats': [self.fieldDtype(row) for row in self.rows],
+                               'offsets': [row[1] for row in self.rows],
+                               'itemsize': size})
+        # Fixed-point fields of this layout and the nested ones, for recordView / fieldDecoder
+        self.scale = {}
+        for name, offset, kind, count, scale in self.rows:
+            if isinstance(kind, packetLayout):
+                self.scale.update(kind.scale)
+            elif scale is not None:
+                self.scale[name] = np.asarray(scale)[()]
+
+    @staticmethod
+    def fieldDtype(row):
+        name, offset, kind, count, scale = row
+        base = kind.dtype if isinstance(kind, packetLayout) else np.dtype(_NUMPY_TYPES[kind])
+        if count == 1:
+            return base
+        return (base, count if isinstance(count, tuple) else (count,))
+
+    def offset(self, name):
+        return self.index[name][1]
+
+    def length(self, name):
+        return self.dtype.fields[name][0].itemsize
+
+    def slice(self, name):
+        ''' Byte range of a field, e.g. data[HIGH_STATE_LAYOUT.slice('wirelessRemote')] '''
+        offset = self.offset(name)
+        return slice(offset, offset + self.length(name))
+
+    def format(self, *names):
+        ''' struct format (without byte order) of consecutive fields, gaps between them are pad bytes '''
+        rows = [self.index[name] for name in names] if names else self.rows
+        fmt, end = '', rows[0][1]
+        for name, offset, kind, count, scale in rows:
+            if offset < end:
+                raise ValueError(f'{self.name}.{name} overlaps the field before it')
+            if offset > end:
+                fmt += f'{offset - end}x'
+            elements = int(np.prod(count))
+            if isinstance(kind, packetLayout):
+                fmt += kind.format() * elements
+            elif kind == 's':
+                fmt += f'{count}s'
+            else:
+                fmt += f'{elements}{kind}' if elements > 1 else kind
+            end = offset + self.length(name)
+        if not names and end < self.size:
+            fmt += f'{self.size - end}x'
+        return fmt
+
+    @lru_cache(maxsize=None)
+    def struct(self, *names):
+        '''
+        Precompiled struct for the given consecutive fields (all of them if none are given), starting at the
+        offset of the first one. Nested layouts are flattened, arrays give one value per element, 's' fields bytes.
+        '''
+        return struct.Struct('<' + self.format(*names))
+
+    @lru_cache(maxsize=None)
+    def elements(self, name):
+        '''
+        (offsets, struct) of the rows of an array field, to decode it one row at a time without a tuple of the
+        whole array: an offset per motor slot of 'motorstate' with the struct of one slot, an offset per foot
+        of 'footPosition2Body' with '<3f'
+        '''
+        _, offset, kind, count, _ = self.index[name]
+        rows = count[0] if isinstance(count, tuple) else count
+        stride = self.length(name) // rows
+        if isinstance(kind, packetLayout):
+            row = kind.struct()
+        else:
+            row = struct.Struct(f'<{int(np.prod(count)) // rows}{kind}')
+        return tuple(range(offset, offset + rows * stride, stride)), row
+
+    @lru_cache(maxsize=None)
+    def fieldOffsets(self, path):
+        '''
+        (byte offsets, struct code, shape) of the elements a field path selects, e.g. 'imu.rpy' gives 3 offsets,
+        'motorstate.q' one per motor, 'footPosition2Body' 12 with shape (4, 3)
+        '''
+        offsets, code, shape = fieldOffsets(self.dtype, path)
+        return tuple(offsets), code, shape
+
+    @lru_cache(maxsize=None)
+    def fields(self, *paths):
+        ''' Cached fieldDecoder for just these fields ('imu.rpy', 'motorstate.q', 'motorstate[3].q', ...) '''
+        return fieldDecoder(self.dtype, paths, self.scale)
+
+    def __repr__(self):
+        return f'packetLayout({self.name!r}, {self.size})'
+
+IMU_LAYOUT = packetLayout('imu', 53, (
+    ('quaternion', 0, 'f', 4),              # normalized, (w,x,y,z)
+    ('gyroscope', 16, 'f', 3),              # rad/s
+    ('accelerometer', 28, 'f', 3),          # m/(s2)
+    ('rpy', 40, 'f', 3),                    # rad
+    ('temperature', 52, 'B', 1),
+))
+
+# The high level packet carries ddq .. ddq_raw as floats and only 2 reserve bytes
+HIGH_MOTOR_STATE_LAYOUT = packetLayout('motorState', 32, (
+    ('mode', 0, 'B', 1),
+    ('q', 1, 'f', 1),
+    ('dq', 5, 'f', 1),
+    ('ddq', 9, 'f', 1),
+    ('tauEst', 13, 'f', 1),
+    ('q_raw', 17, 'f', 1),
+    ('dq_raw', 21, 'f', 1),
+    ('ddq_raw', 25, 'f', 1),
+    ('temperature', 29, 'B', 1),
+    ('reserve', 30, 'B', 2),
+))
+
+LOW_MOTOR_STATE_LAYOUT = packetLayout('motorState', 32, (
+    ('mode', 0, 'B', 1),
+    ('q', 1, 'f', 1),
+    ('dq', 5, 'f', 1),
+    ('ddq', 9, 'h', 1),
+    ('tauEst', 11, 'h', 1, 0.00390625),
+    ('q_raw', 13, 'f', 1),
+    ('dq_raw', 17, 'f', 1),
+    ('ddq_raw', 21, 'h', 1),
+    ('temperature', 23, 'B', 1),
+    ('reserve', 24, 'I', 2),
+))
+
+# BmsState of the sdk (the original parser read cell_vol from offset 13, inside MCU_NTC)
+HIGH_BMS_STATE_LAYOUT = packetLayout('bmsState', 34, (
+    ('version_h', 0, 'B', 1),
+    ('version_l', 1, 'B', 1),
+    ('bms_status', 2, 'B', 1),
+    ('SOC', 3, 'B', 1),                     # 0-100%
+    ('current', 4, 'i', 1),                 # mA
+    ('cycle', 8, 'H', 1),
+    ('BQ_NTC', 10, 'b', 2),                 # degrees centigrade
+    ('MCU_NTC', 12, 'b', 2),                # degrees centigrade
+    ('cell_vol', 14, 'H', 10),              # mV
+))
+
+LOW_BMS_STATE_LAYOUT = packetLayout('bmsState', 24, (
+    ('version_h', 0, 'B', 1),
+    ('version_l', 1, 'B', 1),
+    ('bms_status', 2, 'B', 1),
+    ('SOC', 3, 'B', 1),
+    ('current', 4, 'i', 1),
+    ('cycle', 8, 'H', 1),
+    ('BQ_NTC', 10, 'b', 2),
+    ('MCU_NTC', 12, 'b', 2),
+    ('cell_vol', 14, 'B', 10, 32),
+))
+
+HIGH_STATE_LAYOUT = packetLayout('highState', 1087, (
+    ('head', 0, 'H', 1),
+    ('levelFlag', 2, 'B', 1),
+    ('frameReserve', 3, 'B', 1),
+    ('SN', 4, 's', 8),
+    ('version', 12, 's', 8),
+    ('bandWidth', 20, 'H', 1),
+    ('imu', 22, IMU_LAYOUT, 1),
+    ('motorstate', 75, HIGH_MOTOR_STATE_LAYOUT, 20),
+    ('bms', 835, HIGH_BMS_STATE_LAYOUT, 1),
+    ('footForce', 869, 'h', 4),
+    ('footForceEst', 877, 'h', 4),
+    ('mode', 885, 'B', 1),
+    ('progress', 886, 'f', 1),
+    ('gaitType', 890, 'B', 1),
+    ('footRaiseHeight', 891, 'f', 1),
+    ('position', 895, 'f', 3),
+    ('bodyHeight', 907, 'f', 1),
+    ('velocity', 911, 'f', 3),
+    ('yawSpeed', 923, 'f', 1),
+    ('rangeObstacle', 927, 'f', 4),
+    ('footPosition2Body', 943, 'f', (4, 3)),
+    ('footSpeed2Body', 991, 'f', (4, 3)),
+    ('wirelessRemote', 1039, 's', 40),
+    ('reserve', 1079, 's', 4),
+    ('crc', 1083, 'I', 1),
+))
+
+LOW_STATE_LAYOUT = packetLayout('lowState', 807, (
+    ('head', 0, 'H', 1),
+    ('levelFlag', 2, 'B', 1),
+    ('frameReserve', 3, 'B', 1),
+    ('SN', 4, 's', 8),
+    ('version', 12, 's', 8),
+    ('bandWidth', 20, 'H', 1),
+    ('imu', 22, IMU_LAYOUT, 1),
+    ('motorState', 75, LOW_MOTOR_STATE_LAYOUT, 20),
+    ('bms', 715, LOW_BMS_STATE_LAYOUT, 1),
+    ('footForce', 739, 'h', 4),
+    ('footForceEst', 747, 'h', 4),
+    ('tick', 755, 'I', 1),
+    ('wirelessRemote', 759, 's', 40),
+    ('reserve', 799, 's', 4),
+    ('crc', 803, 'I', 1),
+))
+
+# tau, Kp and Kd are fixed-point codes (see tau_to_code, kp_to_code, kd_to_code), not plain scaled integers
+MOTOR_CMD_LAYOUT = packetLayout('motorCmd', 27, (
+    ('mode', 0, 'B', 1),
+    ('q', 1, 'f', 1),
+    ('dq', 5, 'f', 1),
+    ('tau', 9, 'H', 1),
+    ('Kp', 11, 'H', 1),
+    ('Kd', 13, 'H', 1),
+    ('reserve', 15, 'I', 3),
+))
+
+BMS_CMD_LAYOUT = packetLayout('bmsCmd', 4, (
+    ('off', 0, 'B', 1),
+    ('reserve', 1, 'B', 3),
+))
+
+LED_LAYOUT = packetLayout('led', 4, (
+    ('r', 0, 'B', 1),
+    ('g', 1, 'B', 1),
+    ('b', 2, 'B', 1),
+))
+
+# Bytes 117:125 are zero padding, the crc covers cmd[:124]
+HIGH_CMD_LAYOUT = packetLayout('highCmd', 129, (
+    ('head', 0, 's', 2),
+    ('levelFlag', 2, 'B', 1),
+    ('frameReserve', 3, 'B', 1),
+    ('SN', 4, 's', 8),
+    ('version', 12, 's', 8),
+    ('bandWidth', 20, 's', 2),
+    ('mode', 22, 'B', 1),
+    ('gaitType', 23, 'B', 1),
+    ('speedLevel', 24, 'B', 1),
+    ('footRaiseHeight', 25, 'f', 1),
+    ('bodyHeight', 29, 'f', 1),
+    ('position', 33, 'f', 2),
+    ('euler', 41, 'f', 3),
+    ('velocity', 53, 'f', 2),
+    ('yawSpeed', 61, 'f', 1),
+    ('bms', 65, BMS_CMD_LAYOUT, 1),
+    ('led', 69, LED_LAYOUT, 1),
+    ('wirelessRemote', 73, 's', 40),
+    ('reserve', 113, 's', 4),
+    ('crc', 125, 'I', 1),
+))
+
+LOW_CMD_LAYOUT = packetLayout('lowCmd', 614, (
+    ('head', 0, 's', 2),
+    ('levelFlag', 2, 'B', 1),
+    ('frameReserve', 3, 'B', 1),
+    ('SN', 4, 's', 8),
+    ('version', 12, 's', 8),
+    ('bandWidth', 20, 's', 2),
+    ('motorCmd', 22, MOTOR_CMD_LAYOUT, 20),
+    ('bms', 562, BMS_CMD_LAYOUT, 1),
+    ('wirelessRemote', 566, 's', 40),
+    ('reserve', 606, 's', 4),
+    ('crc', 610, 'I', 1),
+))
+
+# The 40 byte wirelessRemote block of highState / lowState (xRockerBtnDataStruct in the sdk)
+REMOTE_LAYOUT = packetLayout('wirelessRemote', 40, (
+    ('head', 0, 'B', 2),
+    ('buttons', 2, 'H', 1),                 # one bit per button, see REMOTE_BUTTONS
+    ('lx', 4, 'f', 1),                      # sticks: -1.0 ~ 1.0
+    ('rx', 8, 'f', 1),
+    ('ry', 12, 'f', 1),
+    ('L2', 16, 'f', 1),
+    ('ly', 20, 'f', 1),
+    ('idle', 24, 'B', 16),
+))
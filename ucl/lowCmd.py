@@ -1,10 +1,13 @@
-import crcmod
-import struct
-import binascii
-from ucl.enums import MotorModeLow, GaitType, SpeedLevel
-from enum import Enum
-from ucl.common import float_to_hex, encryptCrc, genCrc
-from ucl.complex import bmsCmd, motorCmd, motorCmdArray
+from ucl.common import frameCrc, checkCrc
+from ucl.complex import bmsCmd, motorCmdArray
+from ucl.layout import LOW_CMD_LAYOUT
+
+LOW_CMD_LENGTH = LOW_CMD_LAYOUT.size
+LOW_CMD_HEAD_STRUCT = LOW_CMD_LAYOUT.struct('head', 'levelFlag', 'frameReserve', 'SN', 'version', 'bandWidth')
+LOW_CMD_TAIL_STRUCT = LOW_CMD_LAYOUT.struct('bms', 'wirelessRemote', 'reserve')
+_MOTOR_CMD = LOW_CMD_LAYOUT.slice('motorCmd')
+_BMS = LOW_CMD_LAYOUT.offset('bms')
+_CRC = LOW_CMD_LAYOUT.offset('crc')
 
 class lowCmd:
     def __init__(self):
@@ -20,25 +23,46 @@ class lowCmd:
         self.reserve = bytearray(4)
         self.crc = None
         self.encrypt = True
+        # crc covers cmd[:608]; head..version (0:20) and bms[2]..reserve (564:608) rarely change
+        self.crcCache = frameCrc(608, 20, 564)
+        # Frame buffer reused by every buildCmd call, send it before building the next one. The header and
+        # the bms/wirelessRemote/reserve tail are only rewritten when they differ from what is in the buffer,
+        # the motor slots only when their command changed (see motorCmdArray.packInto)
+        self.buffer = bytearray(LOW_CMD_LENGTH)
+        view = memoryview(self.buffer)
+        self.headView = view[LOW_CMD_LAYOUT.slice('head')]
+        self.snView = view[LOW_CMD_LAYOUT.slice('SN')]
+        self.versionView = view[LOW_CMD_LAYOUT.slice('version')]
+        self.bandWidthView = view[LOW_CMD_LAYOUT.slice('bandWidth')]
+        self.remoteView = view[LOW_CMD_LAYOUT.slice('wirelessRemote')]
+        self.reserveView = view[LOW_CMD_LAYOUT.slice('reserve')]
+        self.packedMotorCmd = None
+        self.packStatic()
 
-    def buildCmd(self, debug=False):
-        cmd = bytearray(614)
-        cmd[0:2] = self.head
-        cmd[2] = self.levelFlag
-        cmd[3] = self.frameReserve
+    def packStatic(self):
+        LOW_CMD_HEAD_STRUCT.pack_into(self.buffer, 0, self.head, self.levelFlag, self.frameReserve, self.SN, self.version, self.bandWidth)
+        LOW_CMD_TAIL_STRUCT.pack_into(self.buffer, _BMS, self.bms.off, self.bms.reserve[0], self.bms.reserve[1], self.bms.reserve[2],
+                                      self.wirelessRemote, self.reserve)
 
-        cmd[4:12] = self.SN
-        cmd[12:20] = self.version
-        cmd[20:22] = self.bandWidth
+    def staticChanged(self):
+        cmd = self.buffer
+        bms = self.bms
+        return (self.headView != self.head or cmd[2] != self.levelFlag or cmd[3] != self.frameReserve
+                or self.snView != self.SN or self.versionView != self.version or self.bandWidthView != self.bandWidth
+                or cmd[_BMS] != bms.off or cmd[_BMS + 1] != bms.reserve[0] or cmd[_BMS + 2] != bms.reserve[1] or cmd[_BMS + 3] != bms.reserve[2]
+                or self.remoteView != self.wirelessRemote or self.reserveView != self.reserve)
 
-        cmd[22:562] = self.motorCmd.getBytes()
-        cmd[562:566] = self.bms.getBytes()
-        cmd[566:606] = self.wirelessRemote
+    def buildCmd(self, debug=False):
+        cmd = self.buffer
+        if self.staticChanged():
+            self.packStatic()
+        if self.motorCmd is not self.packedMotorCmd:
+            # A different motorCmdArray was assigned, its idea of what is in the buffer can't be trusted
+            self.motorCmd.invalidate()
+            self.packedMotorCmd = self.motorCmd
+        self.motorCmd.packInto(cmd, _MOTOR_CMD.start)
 
-        if self.encrypt:
-            cmd[-4:] = encryptCrc(genCrc(cmd[:-6]))
-        else:
-            cmd[-4:] = genCrc(cmd[:-6])
+        self.crcCache.packInto(cmd, _CRC, self.encrypt)
 
         if debug:
             print(f'Length: {len(cmd)}')
@@ -46,27 +70,14 @@ class lowCmd:
 
         return cmd
 
+    @staticmethod
     def low_cmd_from_bytes(data):
+        ''' lowCmd holding the fields of a packed command, encrypt is None if its crc matches neither variant '''
         lcmd = lowCmd()
-        lcmd.head = cmd[0:2]
-        lcmd.levelFlag = cmd[2]
-        lcmd.frameReserve = cmd[3]
-
-        lcmd.SN = cmd[4:12]
-        lcmd.version = cmd[12:20]
-        lcmd.bandWidth = cmd[20:22]
-
-        lcmd.motorCmd = motorCmdArray().fromBytes(cmd[22:562])
-        lcmd.bms = bmsCmd().fromBytes(cmd[562:566])
-        lcmd.wirelessRemote = cmd[566:606]
-        # lcmd.reserve = int.from_bytes(cmd[606:610], byteorder='little')
-
-        # lcmd.crc = int.from_bytes(cmd[610:614], byteorder='little')
-
-        lcmd.encrypt = None
-        if cmd[-4:] == encryptCrc(genCrc(cmd[:-6])):
-            lcmd.encrypt = True
-
-        if cmd[-4:] == genCrc(cmd[:-6]):
-            lcmd.encrypt = False
-        return cmd
+        lcmd.head, lcmd.levelFlag, lcmd.frameReserve, lcmd.SN, lcmd.version, lcmd.bandWidth = LOW_CMD_HEAD_STRUCT.unpack_from(data)
+        lcmd.motorCmd = motorCmdArray().fromBytes(data[_MOTOR_CMD])
+        off, r0, r1, r2, lcmd.wirelessRemote, lcmd.reserve = LOW_CMD_TAIL_STRUCT.unpack_from(data, _BMS)
+        lcmd.bms = bmsCmd(off, [r0, r1, r2])
+        crcType = checkCrc(data)
+        lcmd.encrypt = None if crcType is None else crcType == 'encrypted'
+        return lcmd
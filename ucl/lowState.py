@@ -1,12 +1,66 @@
-from ucl.enums import MotorModeLow, GaitType, SpeedLevel
-from enum import Enum
-from ucl.common import float_to_hex, hex_to_float, tau_to_hex, hex_to_tau, encryptCrc, genCrc, byte_print
-from ucl.complex import cartesian, led, bmsState, imu, motorState
-import struct
+from ucl.common import checkCrc, lazyFields, lazyState, packetState, recordView, decodeMany, latestPacket
+from ucl.complex import bmsState, imu, motorState, IMU_STRUCT
+from ucl.layout import LOW_STATE_LAYOUT, LOW_MOTOR_STATE_LAYOUT, LOW_BMS_STATE_LAYOUT
+import numpy as np
 
 
-class lowState:
-    def __init__(self): #highState len == 1087 / lowState len == 807
+LOW_STATE_LENGTH = LOW_STATE_LAYOUT.size
+
+# Everything below is generated from LOW_STATE_LAYOUT (ucl/layout.py), the offsets of the unitree sdk
+LOW_MOTOR_STATE_DTYPE = LOW_MOTOR_STATE_LAYOUT.dtype
+LOW_BMS_STATE_DTYPE = LOW_BMS_STATE_LAYOUT.dtype
+LOW_STATE_DTYPE = LOW_STATE_LAYOUT.dtype
+# Fixed-point fields, decoded values are the raw ones times this
+LOW_STATE_SCALE = LOW_STATE_LAYOUT.scale
+
+def decodeLowState(data, validate=False):
+    '''
+    Zero-copy decode of a lowState packet with the attribute names of lowState: state.motorState.q / dq / ddq /
+    tauEst / temperature are 20-element arrays (tauEst already scaled to N.m), state.motorState[i].q still works,
+    state.array is the underlying 0-d structured array. No per-motor objects are created.
+    The views share memory with data, keep (or copy) the packet if it is a buffer that gets reused.
+    Returns None for a packet with a wrong length or crc when validate is set.
+    '''
+    if validate and (len(data) != LOW_STATE_LENGTH or checkCrc(data) is None):
+        return None
+    return recordView(np.ndarray((), dtype=LOW_STATE_DTYPE, buffer=data), LOW_STATE_SCALE)
+
+def decodeLowStates(packets, validate=False):
+    ''' Columnar decode of a receive backlog, one row per lowState packet (motorState.q is N x 20), see decodeHighStates '''
+    return decodeMany(packets, LOW_STATE_DTYPE, validate, LOW_STATE_SCALE)
+
+def latestLowState(packets, validate=False):
+    ''' decodeLowState of the newest lowState packet in packets, None if there is none '''
+    paket = latestPacket(packets, LOW_STATE_LENGTH, validate)
+    if paket is None:
+        return None
+    return recordView(np.ndarray((), dtype=LOW_STATE_DTYPE, buffer=paket), LOW_STATE_SCALE)
+
+def lowStateFields(*fields):
+    '''
+    Decoder for just the given fields of a lowState packet, generated once per field list and cached,
+    e.g. lowStateFields('footForce', 'motorState.q'). tauEst and cell_vol come back scaled, see highStateFields.
+    '''
+    return LOW_STATE_LAYOUT.fields(*fields)
+
+LOW_MOTOR_STATE_STRUCT = LOW_MOTOR_STATE_LAYOUT.struct()
+LOW_BMS_STRUCT = LOW_BMS_STATE_LAYOUT.struct()
+_TAU_SCALE = float(LOW_MOTOR_STATE_LAYOUT.scale['tauEst'])
+_CELL_VOL_SCALE = int(LOW_BMS_STATE_LAYOUT.scale['cell_vol'])
+_MOTORS, _ = LOW_STATE_LAYOUT.elements('motorState')        # offset of every motor slot
+_FEET = LOW_STATE_LAYOUT.fields('footForce', 'footForceEst')
+_TICK_STRUCT = LOW_STATE_LAYOUT.struct('tick')
+_TICK = LOW_STATE_LAYOUT.offset('tick')
+_IMU = LOW_STATE_LAYOUT.slice('imu')
+_BMS = LOW_STATE_LAYOUT.slice('bms')
+_REMOTE = LOW_STATE_LAYOUT.slice('wirelessRemote')
+_RESERVE = LOW_STATE_LAYOUT.slice('reserve')
+_CRC = LOW_STATE_LAYOUT.slice('crc')
+
+class lowState(packetState):
+    LAYOUT = LOW_STATE_LAYOUT
+
+    def __init__(self, validate=False, inPlace=False): #highState len == 1087 / lowState len == 807
         self.head = bytearray(2)
         self.levelFlag = 0
         self.frameReserve = 0
@@ -14,64 +68,89 @@ class lowState:
         self.version = bytearray(8)
         self.bandWidth = bytearray(4)
         self.imu = imu([0.0,0.0,0.0,0.0],[0.0,0.0,0.0],[0.0,0.0,0.0],[0.0,0.0,0.0],0)
-        self.motorState = [motorState(0,0,0,0,0,0,0,0,0,0)]*20
-        self.bms = bmsState(0,0,0,0,0,0,0,0,0)
-        self.footForce = [bytes.fromhex('0000')]*4
-        self.footForceEst = [bytes.fromhex('0000')]*4
-        self.tick = bytearray(4)
+        self.motorState = [motorState(0,0,0,0,0,0,0,0,0,[0,0]) for _ in range(20)]
+        self.bms = bmsState(0,0,0,0,0,0,[0,0],[0,0],[0]*10)
+        self.footForce = [0]*4
+        self.footForceEst = [0]*4
+        self.tick = 0
         self.wirelessRemote = bytearray(40)
         self.reserve = bytearray(4)
+        self.validate = validate            # check length and crc before decoding a packet
+        self.crcType = None                 # 'plain' or 'encrypted', set by checkData
+        self.rejectedLength = 0             # packets dropped because of a wrong length
+        self.rejectedCrc = 0                # packets dropped because of a crc mismatch
+        self.inPlace = inPlace              # parseData updates the objects and lists above instead of replacing them
 
     def dataToBmsState(self,data):
-        version_h = data[0]
-        version_l = data[1]
-        bms_status = data[2]
-        SOC = data[3]
-        current = int.from_bytes(data[4:8], byteorder='little', signed=True)
-        cycle = int.from_bytes(data[8:10], byteorder='little')
-        BQ_NTC = [data[10], data[11]]
-        MCU_NTC = [data[12], data[13]]
-        cell_vol = [data[14] * 32, data[15] * 32, data[16] * 32, data[17] * 32, data[18] * 32, data[19] * 32, data[20] * 32, data[21] * 32, data[22] * 32, data[23] * 32]
-        return bmsState(version_h, version_l, bms_status, SOC, current, cycle, BQ_NTC, MCU_NTC, cell_vol)
-
+        f = LOW_BMS_STRUCT.unpack_from(data)
+        return bmsState(f[0], f[1], f[2], f[3], f[4], f[5], list(f[6:8]), list(f[8:10]), [c * _CELL_VOL_SCALE for c in f[10:20]])
 
     def dataToImu(self, data):
-        quaternion = [hex_to_float(data[0:4]), hex_to_float(data[4:8]), hex_to_float(data[8:12]), hex_to_float(data[12:16])]
-        gyroscope = [hex_to_float(data[16:20]), hex_to_float(data[20:24]), hex_to_float(data[24:28])]
-        accelerometer = [hex_to_float(data[28:32]), hex_to_float(data[32:36]), hex_to_float(data[36:40])]
-        rpy = [hex_to_float(data[40:44]), hex_to_float(data[44:48]), hex_to_float(data[48:52])]
-        temperature = data[52]
-        return imu(quaternion, gyroscope, accelerometer, rpy, temperature)
-
-    def dataToMotorState(self, data):
-        mode = data[0]
-        q = hex_to_float(data[1:5])
-        dq = hex_to_float(data[5:9])
-        ddq = float(int.from_bytes(data[9:11], byteorder='little', signed=True))
-        tauEst = float(int.from_bytes(data[11:13], byteorder='little', signed=True)) * 0.00390625
-        q_raw = hex_to_float(data[13:17])
-        dq_raw = hex_to_float(data[17:21])
-        ddq_raw = float(int.from_bytes(data[21:23], byteorder='little', signed=True))
-        temperature = data[24]
-        reserve = [int.from_bytes(data[24:28], byteorder='little'), int.from_bytes(data[28:32], byteorder='little')]
-        return motorState(mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, reserve)
-
-    def parseData(self, data):
-        self.head = hex(int.from_bytes(data[0:2], byteorder='little'))
-        self.levelFlag = data[2]
-        self.frameReserve = data[3]
-        self.SN = data[4:12]
-        self.version = data[12:20]
-        self.bandWidth = int.from_bytes(data[20:22], byteorder='little')
-        self.imu = self.dataToImu(data[22:75])
-        self.motorState=[]
-        for i in range(20):
-            self.motorState.append(self.dataToMotorState(data[(i*32)+75:(i*32)+32+75]))
-        self.bms=self.dataToBmsState(data[715:739])
-        self.footForce = [int.from_bytes(data[739:741], byteorder='little'), int.from_bytes(data[751:753], byteorder='little'), int.from_bytes(data[753:755], byteorder='little'), int.from_bytes(data[755:757], byteorder='little')]
-        self.footForceEst = [int.from_bytes(data[747:749], byteorder='little'), int.from_bytes(data[759:761], byteorder='little'), int.from_bytes(data[761:763], byteorder='little'), int.from_bytes(data[763:765], byteorder='little')]
-        self.mode = data[755:759]
-        self.wirelessRemote = data[759:799]
-        self.reserve = data[799:803]
-        self.crc = data[803:807]
+        f = IMU_STRUCT.unpack_from(data)
+        return imu(list(f[0:4]), list(f[4:7]), list(f[7:10]), list(f[10:13]), f[13])
+
+    def dataToMotorState(self, data, offset=0):
+        mode, q, dq, ddq, tauEst, q_raw, dq_raw, ddq_raw, temperature, r0, r1 = LOW_MOTOR_STATE_STRUCT.unpack_from(data, offset)
+        return motorState(mode, q, dq, float(ddq), tauEst * _TAU_SCALE, q_raw, dq_raw, float(ddq_raw), temperature, [r0, r1])
+
+    def dataToMotorStates(self, data):
+        return [self.dataToMotorState(data, offset) for offset in _MOTORS]
+
+    def dataToFootForce(self, data):
+        footForce, footForceEst = _FEET(data)
+        return list(footForce), list(footForceEst)
+
+    def dataToTail(self, data):
+        tick, = _TICK_STRUCT.unpack_from(data, _TICK)
+        return tick, bytes(data[_REMOTE]), bytes(data[_RESERVE]), bytes(data[_CRC])
+
+    def updateMotorStates(self, data):
+        # one motor slot at a time, a tuple of all 20 would be the largest allocation of the parse
+        unpack = LOW_MOTOR_STATE_STRUCT.unpack_from
+        for offset, m in zip(_MOTORS, self.motorState):
+            m.mode, m.q, m.dq, ddq, tauEst, m.q_raw, m.dq_raw, ddq_raw, m.temperature, m.reserve[0], m.reserve[1] = unpack(data, offset)
+            m.ddq = float(ddq)
+            m.tauEst = tauEst * _TAU_SCALE
+            m.ddq_raw = float(ddq_raw)
+
+    def updateBmsState(self, data):
+        bms = self.bms
+        f = LOW_BMS_STRUCT.unpack_from(data, _BMS.start)
+        bms.version_h, bms.version_l, bms.bms_status, bms.SOC, bms.current, bms.cycle = f[0], f[1], f[2], f[3], f[4], f[5]
+        bms.BQ_NTC[:], bms.MCU_NTC[:] = f[6:8], f[8:10]
+        bms.cell_vol[:] = [c * _CELL_VOL_SCALE for c in f[10:20]]
+
+    def parseData(self, data, validate=None):
+        if validate is None:
+            validate = self.validate
+        if validate and not self.checkData(data):
+            return False
+        if self.inPlace:
+            self.head, self.levelFlag, self.frameReserve, self.SN, self.version, self.bandWidth = self.dataToHeader(data)
+            self.updateImu(data)
+            self.updateMotorStates(data)
+            self.updateBmsState(data)
+            self.footForce[:], self.footForceEst[:] = _FEET(data)
+            self.tick, self.wirelessRemote, self.reserve, self.crc = self.dataToTail(data)
+            return True
+        self.head, self.levelFlag, self.frameReserve, self.SN, self.version, self.bandWidth = self.dataToHeader(data)
+        self.imu = self.dataToImu(data[_IMU])
+        self.motorState = self.dataToMotorStates(data)
+        self.bms = self.dataToBmsState(data[_BMS])
+        self.footForce, self.footForceEst = self.dataToFootForce(data)
+        self.tick, self.wirelessRemote, self.reserve, self.crc = self.dataToTail(data)
         return True
+
+class lazyLowState(lazyState, lowState):
+    '''
+    lowState that decodes on access: parseData only keeps a memoryview of the packet, and each group of
+    fields (header, imu, motorState, bms, feet, tick/remote/reserve/crc) is decoded the first time one of
+    them is read, then cached until the next packet.
+    The packet must not change while the state refers to it (bytes from the socket never do).
+    '''
+    head, levelFlag, frameReserve, SN, version, bandWidth = lazyFields(lowState.dataToHeader, 'head', 'levelFlag', 'frameReserve', 'SN', 'version', 'bandWidth')
+    imu, = lazyFields(lambda self, data: self.dataToImu(data[_IMU]), 'imu')
+    motorState, = lazyFields(lowState.dataToMotorStates, 'motorState')
+    bms, = lazyFields(lambda self, data: self.dataToBmsState(data[_BMS]), 'bms')
+    footForce, footForceEst = lazyFields(lowState.dataToFootForce, 'footForce', 'footForceEst')
+    tick, wirelessRemote, reserve, crc = lazyFields(lowState.dataToTail, 'tick', 'wirelessRemote', 'reserve', 'crc')
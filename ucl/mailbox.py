@@ -0,0 +1,53 @@
+from threading import Condition
+
+class stateMailbox:
+    '''
+    Holds only the newest state packet (and optionally its decoded state) behind a sequence counter:
+
+        mailbox = stateMailbox(decode=decodeHighState)
+        seq, kind, data, state = mailbox.get_latest()          # O(1), however long nobody read
+        latest = mailbox.wait_newer(seq, timeout=0.1)          # None on timeout
+
+    put runs in the receive thread. decode(data) is called there too, if it returns None the packet is
+    dropped (e.g. lambda data: decodeHighState(data, validate=True) only keeps packets with a valid crc).
+    The newest entry is one tuple swapped in at once, so get_latest needs no lock, only waiters use the
+    condition, and put only takes it when someone waits.
+    '''
+    EMPTY = (0, None, None, None)
+
+    def __init__(self, decode=None):
+        self.decode = decode
+        self.latest = self.EMPTY            # (seq, kind, data, state)
+        self.condition = Condition()
+        self.waiting = 0
+        self.dropped = 0                    # packets decode rejected
+
+    def put(self, data, kind):
+        state = None
+        if self.decode is not None:
+            state = self.decode(data)
+            if state is None:
+                self.dropped += 1
+                return
+        self.latest = (self.latest[0] + 1, kind, data, state)
+        if self.waiting:
+            with self.condition:
+                self.condition.notify_all()
+
+    def get_latest(self):
+        ''' (seq, kind, data, state) of the newest packet, seq is 0 and the rest None before the first one '''
+        return self.latest
+
+    def wait_newer(self, seq, timeout=None):
+        ''' The newest entry once its seq is above seq, None if none arrives within timeout seconds '''
+        latest = self.latest
+        if latest[0] > seq:
+            return latest
+        with self.condition:
+            self.waiting += 1
+            try:
+                if not self.condition.wait_for(lambda: self.latest[0] > seq, timeout):
+                    return None
+            finally:
+                self.waiting -= 1
+        return self.latest
@@ -0,0 +1,84 @@
+class packetRing:
+    '''
+    Fixed ring of preallocated datagram slots between the receive thread (producer) and getData (consumer).
+
+    The producer receives straight into slot(), the slot of packet number head, with recv_into and publishes
+    it, which advances head. It never waits: when the consumer falls capacity - 1 packets behind, the oldest
+    unread packets are overwritten, so memory stays bounded and the newest packets are always there.
+    The consumer copies packets tail .. head out of their slots, then checks that head did not reach the slot
+    of a packet while it was copied (the producer only writes into the slot of packet head, which held packet
+    head - capacity). Packets that were overwritten before they were read are counted in overflow.
+    head is only written by the producer and tail only by the consumer, so no lock is needed, and a packet
+    that arrives during drain is simply read by the next one.
+    '''
+    def __init__(self, capacity=256, slotSize=2048):
+        self.capacity = capacity
+        self.slotSize = slotSize
+        self.buffer = bytearray(capacity * slotSize)
+        view = memoryview(self.buffer)
+        self.slots = [view[i * slotSize:(i + 1) * slotSize] for i in range(capacity)]
+        self.lengths = [0] * capacity
+        self.kinds = [None] * capacity
+        self.head = 0                       # packets published, the next one goes into slot head % capacity
+        self.tail = 0                       # packets consumed
+        self.overflow = 0                   # packets overwritten before they were read
+        self.held = {}                      # kind -> packets drained while another kind was asked for
+
+    def slot(self):
+        ''' The slot the next packet is received into '''
+        return self.slots[self.head % self.capacity]
+
+    def publish(self, size, kind):
+        ''' Publish the packet received into slot() '''
+        i = self.head % self.capacity
+        self.lengths[i] = size
+        self.kinds[i] = kind
+        self.head += 1
+
+    def put(self, data, kind):
+        ''' Copy a packet into the ring and publish it (producer side, like a received one) '''
+        size = len(data)
+        self.slot()[:size] = data
+        self.publish(size, kind)
+
+    def __len__(self):
+        return min(self.head - self.tail, self.capacity - 1)
+
+    def drain(self, kind=None):
+        '''
+        Copy out and consume the unread packets (as bytes), oldest first. With kind only the packets of that kind
+        are returned, the others are kept for a later drain of theirs.
+        '''
+        capacity = self.capacity
+        head = self.head
+        start = max(self.tail, head - capacity + 1)
+        if start > self.tail:
+            self.overflow += start - self.tail
+        packets = []
+        slots, lengths, kinds = self.slots, self.lengths, self.kinds
+        for n in range(start, head):
+            i = n % capacity
+            packet = (kinds[i], bytes(slots[i][:lengths[i]]))
+            if self.head - capacity >= n:
+                # the producer got to this slot while it was copied
+                self.overflow += 1
+                continue
+            packets.append(packet)
+        self.tail = head
+        held = self.held
+        if kind is None:
+            out = [data for queued in held.values() for data in queued] if held else []
+            held.clear()
+            out += [data for _, data in packets]
+            return out
+        out = held.pop(kind, [])
+        for packetKind, data in packets:
+            if packetKind == kind:
+                out.append(data)
+            else:
+                held.setdefault(packetKind, []).append(data)
+        for queued in held.values():
+            if len(queued) > capacity:
+                self.overflow += len(queued) - capacity
+                del queued[:-capacity]
+        return out
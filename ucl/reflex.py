@@ -0,0 +1,100 @@
+from ucl.common import callbackGuard
+from ucl.enums import MotorModeHigh
+from ucl.highCmd import highCmd
+from ucl.layout import HIGH_STATE_LAYOUT
+
+_RANGE_STRUCT = HIGH_STATE_LAYOUT.struct('rangeObstacle')
+_RANGE = HIGH_STATE_LAYOUT.offset('rangeObstacle')
+
+def standCmd():
+    ''' FORCE_STAND with zero velocity and yaw speed '''
+    cmd = highCmd()
+    cmd.mode = MotorModeHigh.FORCE_STAND
+    return bytes(cmd.buildCmd())
+
+class obstacleReflex:
+    '''
+    Stops the robot from the receive thread when an obstacle comes too close:
+
+        reflex = obstacleReflex(conn, threshold=0.3)
+        conn.watch(HIGH_STATE, reflex.feed, first=True)
+
+    feed reads the 4 rangeObstacle floats of each highState packet. When one of them drops below its threshold
+    (a number for all four sensors, or one per sensor with None to ignore it) the safe command (FORCE_STAND
+    with zero velocity by default) is sent right away and set as conn.override, so it replaces every command
+    the running routine sends. Readings that are not positive or finite (no echo) never trip it.
+    With latch set the override stays until reset(), otherwise it is lifted once all ranges are back above
+    threshold + hysteresis. onTrip / onRelease are called from the receive thread (after the safe command went
+    out, exceptions they raise are counted in guard).
+    Watch with first=True, so the reflex runs before the other listeners of the packet. A send of the safe
+    command that fails (e.g. a full send buffer) is counted in sendErrors and tried again with the next packet.
+    '''
+    def __init__(self, conn, threshold=0.3, safeCmd=None, latch=True, hysteresis=0.1, onTrip=None, onRelease=None):
+        self.conn = conn
+        thresholds = threshold if isinstance(threshold, (list, tuple)) else (threshold,) * 4
+        self.thresholds = [(i, limit) for i, limit in enumerate(thresholds) if limit is not None]
+        self.safeCmd = standCmd() if safeCmd is None else bytes(safeCmd)
+        self.latch = latch
+        self.hysteresis = hysteresis
+        self.onTrip = onTrip
+        self.onRelease = onRelease
+        self.enabled = True
+        self.tripped = False
+        self.trips = 0
+        self.ranges = None                  # rangeObstacle of the packet that tripped it
+        self.unsent = False                 # the safe command still has to go out
+        self.sendErrors = 0
+        self.guard = callbackGuard()
+
+    def feed(self, data):
+        if not self.enabled or len(data) != HIGH_STATE_LAYOUT.size:
+            return
+        if self.unsent:
+            self.sendSafe()
+        ranges = _RANGE_STRUCT.unpack_from(data, _RANGE)
+        if not self.tripped:
+            for i, limit in self.thresholds:
+                if 0.0 < ranges[i] < limit:
+                    self.trip(ranges)
+                    return
+        elif not self.latch:
+            margin = self.hysteresis
+            for i, limit in self.thresholds:
+                value = ranges[i]
+                if 0.0 < value < limit + margin:
+                    return
+            self.reset()
+
+    def trip(self, ranges):
+        self.tripped = True
+        self.trips += 1
+        self.ranges = ranges
+        self.conn.override = self.safeCmd
+        self.sendSafe()
+        if self.onTrip is not None:
+            try:
+                self.onTrip()
+            except Exception:
+                self.guard.failed(self.onTrip)
+
+    def sendSafe(self):
+        try:
+            self.conn.send(self.safeCmd)
+            self.unsent = False
+        except OSError:
+            # the routine's next send goes out as the safe command too (override)
+            self.sendErrors += 1
+            self.unsent = True
+
+    def reset(self):
+        ''' Lift the override, the routine's commands go out again '''
+        if self.conn.override is self.safeCmd:
+            self.conn.override = None
+        self.unsent = False
+        if self.tripped:
+            self.tripped = False
+            if self.onRelease is not None:
+                try:
+                    self.onRelease()
+                except Exception:
+                    self.guard.failed(self.onRelease)
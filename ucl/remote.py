@@ -0,0 +1,86 @@
+from ucl.common import callbackGuard
+from ucl.layout import REMOTE_LAYOUT, HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+
+# Buttons in bit order of REMOTE_LAYOUT.buttons
+REMOTE_BUTTONS = ('R1', 'L1', 'start', 'select', 'R2', 'L2', 'F1', 'F2', 'A', 'B', 'X', 'Y', 'up', 'right', 'down', 'left')
+REMOTE_BITS = {name: 1 << i for i, name in enumerate(REMOTE_BUTTONS)}
+
+REMOTE_STRUCT = REMOTE_LAYOUT.struct('buttons', 'lx', 'rx', 'ry', 'L2', 'ly')
+_BUTTONS = REMOTE_LAYOUT.offset('buttons')
+# Offset of the remote block by packet length
+REMOTE_OFFSETS = {HIGH_STATE_LAYOUT.size: HIGH_STATE_LAYOUT.offset('wirelessRemote'),
+                  LOW_STATE_LAYOUT.size: LOW_STATE_LAYOUT.offset('wirelessRemote')}
+
+class remoteState:
+    __slots__ = ('buttons', 'lx', 'rx', 'ry', 'L2', 'ly')
+
+    def __init__(self, buttons=0, lx=0.0, rx=0.0, ry=0.0, L2=0.0, ly=0.0):
+        self.buttons = buttons              # button bits, see REMOTE_BITS
+        self.lx = lx
+        self.rx = rx
+        self.ry = ry
+        self.L2 = L2
+        self.ly = ly
+
+    def pressed(self, button):
+        return bool(self.buttons & REMOTE_BITS[button])
+
+    def pressedButtons(self):
+        return [name for name in REMOTE_BUTTONS if self.buttons & REMOTE_BITS[name]]
+
+def decodeRemote(data, offset=0):
+    ''' remoteState of a wirelessRemote block, or of the one in a highState / lowState packet at offset '''
+    return remoteState(*REMOTE_STRUCT.unpack_from(data, offset + _BUTTONS))
+
+def remoteOf(data):
+    ''' remoteState of the wirelessRemote block in a highState or lowState packet '''
+    return decodeRemote(data, REMOTE_OFFSETS[len(data)])
+
+class remoteEvents:
+    '''
+    Press / release callbacks for the buttons of the remote, fed with highState or lowState packets:
+
+        events = remoteEvents()
+        events.onPress('B', abort.set)
+        conn.watch(HIGH_STATE, events.feed)
+
+    feed only compares the two button bytes with the previous packet, callbacks (called without arguments)
+    run in the thread that feeds the packets, so within one packet period of the press. Keep them short.
+    A callback that raises is counted in guard and does not keep the others from running.
+    '''
+    def __init__(self):
+        self.buttons = 0
+        self.pressHandlers = {}             # bit -> callbacks
+        self.releaseHandlers = {}
+        self.guard = callbackGuard()
+
+    def onPress(self, button, callback):
+        self.pressHandlers.setdefault(REMOTE_BITS[button], []).append(callback)
+
+    def onRelease(self, button, callback):
+        self.releaseHandlers.setdefault(REMOTE_BITS[button], []).append(callback)
+
+    def feed(self, data):
+        offset = REMOTE_OFFSETS.get(len(data))
+        if offset is None:
+            return
+        offset += _BUTTONS
+        self.update(data[offset] | data[offset + 1] << 8)
+
+    def update(self, buttons):
+        changed = buttons ^ self.buttons
+        if not changed:
+            return
+        self.buttons = buttons
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            handlers = self.pressHandlers if buttons & bit else self.releaseHandlers
+            for callback in handlers.get(bit, ()):
+                try:
+                    callback()
+                except Exception:
+                    self.guard.failed(callback)
+
+    def pressed(self, button):
+        return bool(self.buttons & REMOTE_BITS[button])
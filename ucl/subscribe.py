@@ -0,0 +1,127 @@
+import struct
+
+from ucl.common import callbackGuard
+
+class subscription:
+    __slots__ = ('path', 'callback', 'when', 'active')
+
+    def __init__(self, path, callback, when=None):
+        self.path = path
+        self.callback = callback            # callback(value, old)
+        self.when = when                    # predicate, the callback runs when it turns true
+        self.active = False
+
+class watchedField:
+    __slots__ = ('path', 'start', 'end', 'decode', 'value', 'subscriptions')
+
+    def __init__(self, layout, path):
+        offsets, code, shape = layout.fieldOffsets(path)
+        self.path = path
+        # Bytes spanned by the field, interleaved fields in between are filtered out by comparing the values
+        self.start = min(offsets)
+        self.end = max(offsets) + struct.calcsize('<' + code)
+        self.decode = layout.fields(path)
+        self.value = None
+        self.subscriptions = ()
+
+class stateSubscriptions:
+    '''
+    Callbacks on changes of single fields of a state packet, fed with the packets (see unitreeConnection.subscribe):
+
+        subs = stateSubscriptions(HIGH_STATE_LAYOUT)
+        subs.subscribe('mode', lambda mode, old: print(f'mode {old} -> {mode}'))
+        subs.subscribe('footForce', onContact, when=lambda force: max(force) > 50)
+
+    feed compares the raw bytes of each watched field with the previous packet and only decodes the fields
+    whose bytes changed, unchanged packets are not parsed at all: one precompiled struct cuts the bytes of
+    all watched fields out of the packet, and if that key equals the previous one feed is done.
+    callback(value, old) runs on every change of the value (the first packet after a field is first subscribed
+    counts as one, with old None), or with when only on the packet that turns when(value) true. Values are
+    decoded like highStateFields: numbers, tuples for array fields.
+    Subscribing and unsubscribing is safe while another thread feeds packets. A callback (or when) that raises
+    is counted in guard and does not keep the other subscriptions from running.
+    '''
+    def __init__(self, layout):
+        self.layout = layout
+        self.fields = {}                    # path -> watchedField
+        # ((field, segment, span) of every field, struct of the bytes of all of them) as feed uses them, replaced
+        # (not changed) on every (un)subscribe: segment is where the field's bytes are in the key of a packet,
+        # span the slice of that segment, None if the field is all of it
+        self.compiled = ((), None)
+        self.previous = (None, None)        # struct and key of the previous packet
+        self.guard = callbackGuard()
+
+    def subscribe(self, path, callback, when=None):
+        field = self.fields.get(path)
+        if field is None:
+            field = watchedField(self.layout, path)
+        sub = subscription(path, callback, when)
+        field.subscriptions += (sub,)
+        self.fields[path] = field
+        self.index()
+        return sub
+
+    def unsubscribe(self, sub):
+        field = self.fields.get(sub.path)
+        if field is None or sub not in field.subscriptions:
+            return
+        field.subscriptions = tuple(s for s in field.subscriptions if s is not sub)
+        if not field.subscriptions:
+            del self.fields[sub.path]
+        self.index()
+
+    def index(self):
+        ''' Merge the byte ranges of the watched fields into segments and compile the struct that reads them '''
+        fields = tuple(self.fields.values())
+        segments = []                       # [start, end]
+        for field in sorted(fields, key=lambda field: field.start):
+            if segments and field.start < segments[-1][1]:
+                segments[-1][1] = max(segments[-1][1], field.end)
+            else:
+                segments.append([field.start, field.end])
+        fmt, end = '<', 0
+        for start, stop in segments:
+            fmt += (f'{start - end}x' if start > end else '') + f'{stop - start}s'
+            end = stop
+        watched = []
+        for field in fields:
+            i = next(i for i, (start, stop) in enumerate(segments) if start <= field.start < stop)
+            start, stop = segments[i]
+            span = None if (field.start, field.end) == (start, stop) else slice(field.start - start, field.end - start)
+            watched.append((field, i, span))
+        key = struct.Struct(fmt) if fields else None
+        # feed may run in another thread: the fields are left alone, it picks up the new positions and key at once
+        self.compiled = (tuple(watched), key)
+
+    def feed(self, data):
+        watched, key = self.compiled
+        if key is None or len(data) != self.layout.size:
+            return
+        values = key.unpack_from(data)
+        previousKey, previous = self.previous
+        if previousKey is not key:
+            previous = None
+        elif values == previous:
+            return
+        self.previous = (key, values)
+        for field, segment, span in watched:
+            if previous is not None and field.value is not None:
+                new, old = values[segment], previous[segment]
+                if new == old or (span is not None and new[span] == old[span]):
+                    continue
+            value = field.decode(data)[0]
+            old = field.value
+            if value == old:
+                continue
+            field.value = value
+            for sub in field.subscriptions:
+                try:
+                    if sub.when is None:
+                        sub.callback(value, old)
+                        continue
+                    active = bool(sub.when(value))
+                    if active and not sub.active:
+                        sub.callback(value, old)
+                    sub.active = active
+                except Exception:
+                    self.guard.failed(sub.callback)
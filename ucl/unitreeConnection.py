@@ -1,8 +1,17 @@
+import select
 import socket
+import time
+from bisect import bisect_left
+from collections import deque
 from threading import Thread, Event
-from ucl.common import pretty_print_obj
+from ucl.common import pretty_print_obj, callbackGuard
 
-from ucl.highState import highState
+from ucl.highState import highState, HIGH_STATE_LENGTH
+from ucl.lowState import LOW_STATE_LENGTH
+from ucl.layout import HIGH_STATE_LAYOUT, LOW_STATE_LAYOUT
+from ucl.subscribe import stateSubscriptions
+from ucl.packetRing import packetRing
+from ucl.mailbox import stateMailbox
 
 listenPort = 8090
 sendPort_low = 8007
@@ -20,8 +29,153 @@ LOW_WIFI_DEFAULTS = (listenPort, addr_low, sendPort_low, local_ip_wifi)
 HIGH_WIRED_DEFAULTS = (listenPort, addr_high, sendPort_high, local_ip_eth)
 HIGH_WIFI_DEFAULTS = (listenPort, addr_wifi, sendPort_high, local_ip_wifi)
 
+# Datagram classes of the receive path
+HIGH_STATE = 'highState'
+LOW_STATE = 'lowState'
+TRUNCATED = 'truncated'                 # state header, but shorter than that state
+UNKNOWN = 'unknown'                     # anything else
+
+PACKET_HEAD = (0xFE, 0xEF)
+LOWLEVEL = 0xff                         # levelFlag of lowCmd / lowState, everything else is high level
+PACKET_LENGTHS = {HIGH_STATE: HIGH_STATE_LENGTH, LOW_STATE: LOW_STATE_LENGTH}
+STATE_KINDS = (HIGH_STATE, LOW_STATE)
+
+def classifyPacket(data):
+    '''
+    Class of a received datagram from its length, head and levelFlag alone (nothing is decoded):
+    HIGH_STATE, LOW_STATE, TRUNCATED or UNKNOWN
+    '''
+    size = len(data)
+    if size < 4 or data[0] != PACKET_HEAD[0] or data[1] != PACKET_HEAD[1]:
+        return UNKNOWN
+    kind = LOW_STATE if data[2] == LOWLEVEL else HIGH_STATE
+    length = PACKET_LENGTHS[kind]
+    if size == length:
+        return kind
+    return TRUNCATED if size < length else UNKNOWN
+
+_TICK = LOW_STATE_LAYOUT.offset('tick')
+
+class linkMonitor:
+    '''
+    Arrival statistics of the state packets: loss, duplicates, reordering and inter-arrival jitter.
+    lowState packets are sequenced by their tick (the step between consecutive packets is learned as the
+    smallest one seen, or given as tickStep), highState packets have none, so a gap of more than 1.5 periods
+    counts as lost packets and a repeated crc as a duplicate. The robot only answers commands: once sent is
+    called for every command (unitreeConnection.send does), a gap counts at most the commands sent in it but
+    one as lost, so a pause in sending or a slower command rate is not loss. lossRate covers the last window
+    arrivals.
+    The jitter histogram bins |interval - period| by JITTER_EDGES (seconds), the last bin is everything above.
+    period is the interval the commands go out at (the robot answers each one with a state), unitreeConnection
+    passes its own.
+    '''
+    JITTER_EDGES = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05)
+
+    def __init__(self, period=0.002, window=500, tickStep=None):
+        self.period = period                # expected interval between state packets
+        self.window = window
+        self.fixedTickStep = tickStep
+        self.reset()
+
+    def reset(self):
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.jitter = 0.0                   # smoothed |interval - period| (rfc 3550 style)
+        self.histogram = [0] * (len(self.JITTER_EDGES) + 1)
+        self.lastStamp = None
+        self.lastTick = None
+        self.lastCrc = None
+        self.tickStep = self.fixedTickStep
+        self.recent = deque()               # packets lost before each of the last window arrivals
+        self.recentLost = 0
+        self.commands = None                # commands sent since the last state, None until sent is called
+
+    def sent(self):
+        ''' A command went out, the robot answers it with one state '''
+        self.commands = 1 if self.commands is None else self.commands + 1
+
+    def update(self, kind, data, stamp):
+        self.received += 1
+        lost = 0
+        if kind == LOW_STATE:
+            tick = int.from_bytes(data[_TICK:_TICK + 4], byteorder='little')
+            if self.lastTick is not None:
+                step = (tick - self.lastTick) & 0xFFFFFFFF
+                if step == 0:
+                    self.duplicates += 1
+                    self.lastStamp = stamp
+                    return
+                if not step & 0x80000000:
+                    if self.fixedTickStep is None and (self.tickStep is None or step < self.tickStep):
+                        self.tickStep = step
+                    lost = (step + self.tickStep // 2) // self.tickStep - 1
+                elif -step & 0xFFFFFFFF <= self.window * (self.tickStep or 1):
+                    # older than the last one, it was counted as lost when the gap was seen
+                    self.reordered += 1
+                    self.found()
+                    return
+                # else far behind the last one: the tick restarted (robot rebooted), go on from this one
+            self.lastTick = tick
+        else:
+            crc = data[-4:]
+            if crc == self.lastCrc:
+                # the next gap is measured from here, or it would count packets lost that were not
+                self.duplicates += 1
+                self.lastStamp = stamp
+                return
+            self.lastCrc = bytes(crc)           # data may be a receive slot that gets reused
+
+        if self.lastStamp is not None:
+            interval = stamp - self.lastStamp
+            if kind != LOW_STATE and interval > 1.5 * self.period:
+                lost = int(interval / self.period + 0.5) - 1
+            deviation = abs(interval - self.period)
+            self.jitter += (deviation - self.jitter) / 16
+            self.histogram[bisect_left(self.JITTER_EDGES, deviation)] += 1
+        self.lastStamp = stamp
+
+        if self.commands is not None:
+            # a reply to every command sent in the gap but the one this packet answers went missing
+            lost = min(lost, max(self.commands - 1, 0))
+            self.commands = 0
+        self.lost += lost
+        self.record(lost)
+
+    def record(self, lost):
+        ''' An arrival with the packets lost before it, in the window of lossRate '''
+        recent = self.recent
+        recent.append(lost)
+        self.recentLost += lost
+        if len(recent) > self.window:
+            self.recentLost -= recent.popleft()
+
+    def found(self):
+        ''' A late packet arrived that was counted as lost: take it back from the newest gap that has it '''
+        if self.lost:
+            self.lost -= 1
+        recent = self.recent
+        if self.recentLost:
+            for i in range(len(recent) - 1, -1, -1):
+                if recent[i]:
+                    recent[i] -= 1
+                    self.recentLost -= 1
+                    break
+        self.record(0)
+
+    @property
+    def lossRate(self):
+        ''' Share of the packets lost over the last window arrivals '''
+        expected = len(self.recent) + self.recentLost
+        return self.recentLost / expected if expected else 0.0
+
+    def summary(self):
+        return {'received': self.received, 'lost': self.lost, 'lossRate': self.lossRate, 'duplicates': self.duplicates,
+                'reordered': self.reordered, 'jitter': self.jitter, 'histogram': list(self.histogram)}
+
 class unitreeConnection:
-    def __init__(self, settings=HIGH_WIFI_DEFAULTS):
+    def __init__(self, settings=HIGH_WIFI_DEFAULTS, capacity=256, mailbox=False, decode=None, period=0.002):
         self.listenPort = settings[0]
         self.addr = settings[1]
         self.sendPort = settings[2]
@@ -29,7 +183,25 @@ class unitreeConnection:
         self.sock = self.connect()
         self.runRecv = Event()
         self.recvThreadID = None
-        self.data = []
+        self.recvTimeout = 1.0              # seconds recvThread waits for a datagram before it checks runRecv again
+        self.wakeups = 0                    # times recvThread woke up to datagrams, see recvStats
+        self.burstPackets = 0               # datagrams read in those wakeups
+        self.largestBurst = 0
+        self.recvErrors = 0                 # icmp errors reported by recv (e.g. port unreachable)
+        # Received states, truncated and unknown datagrams are only counted. capacity slots of 2048 bytes
+        # (0.5 s at 500 Hz), older unread packets are overwritten (see packetRing, ring.overflow counts them)
+        self.ring = packetRing(capacity)
+        # Mailbox mode: only the newest state (decoded with decode, if given) is kept instead, see get_latest
+        self.mailbox = stateMailbox(decode) if mailbox else None
+        self.handedSeq = 0                  # seq of the last mailbox packet getData handed out
+        self.counters = {HIGH_STATE: 0, LOW_STATE: 0, TRUNCATED: 0, UNKNOWN: 0}
+        self.handlers = {}
+        self.listeners = {HIGH_STATE: [], LOW_STATE: []}
+        self.subscriptions = {}             # kind -> stateSubscriptions, see subscribe
+        self.monitor = linkMonitor(period)  # period: interval the commands are sent at, 500 Hz by default
+        self.override = None                # command sent instead of every other one while set (see obstacleReflex)
+        self.stamp = None                   # arrival time of the state packet being dispatched, for listeners
+        self.guard = callbackGuard()        # exceptions of listeners, handlers and the mailbox decode (guard.errors)
 
     def startRecv(self):
         self.recvThreadID = Thread(target=self.recvThread, args=(self.runRecv,))
@@ -45,24 +217,189 @@ class unitreeConnection:
                      socket.SOCK_DGRAM) # UDP
 
         # sock.bind((self.localIP, self.listenPort))
-        sock.settimeout(1)
+        sock.settimeout(1)                  # send blocks at most 1 s, recvThread only reads what poll reported
         return sock
 
     def send(self, cmd):
+        override = self.override
+        if override is not None:
+            cmd = override
         self.sock.sendto(cmd, (self.addr, self.sendPort))
+        self.monitor.sent()
 
     def recvThread(self, event):
+        '''
+        Wait until the socket is readable, then read every datagram queued in the kernel before waiting again,
+        so a backlog costs one wakeup instead of one per packet. Whether another datagram is queued is asked with
+        a zero timeout poll, and recv_into only runs after poll reported one, so it returns at once although the
+        socket keeps its timeout for send (running into EAGAIN on a non-blocking socket instead would make send
+        raise BlockingIOError to its callers, and raising it costs more than the poll).
+        Ends when event is set or the socket is closed.
+        '''
         # print('[*] Start receive Thread ...\n')
-        while not event.isSet():
+        ring = self.ring
+        sock = self.sock
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            wait = lambda timeout: poller.poll(timeout * 1000)
+        else:
+            wait = lambda timeout: select.select((sock,), (), (), timeout)[0]
+        while not event.is_set():
             try:
-                self.data.append(self.sock.recv(2048))
-            except Exception as e:
-                # print(e)
-                pass
+                if not wait(self.recvTimeout):
+                    continue
+            except (OSError, ValueError):
+                break                       # socket closed
+            burst = 0
+            while True:
+                slot = ring.slot()
+                try:
+                    size = sock.recv_into(slot)
+                except TimeoutError:
+                    break                   # readable, but the datagram was gone (bad checksum)
+                except ConnectionError:
+                    # an icmp error of an earlier send, back to the poll loop (which checks event)
+                    self.recvErrors += 1
+                    break
+                except OSError:
+                    return                  # socket closed
+                burst += 1
+                self.dispatch(slot[:size], time.perf_counter(), received=True)
+                if not wait(0):
+                    break                   # queue drained
+            self.wakeups += 1
+            self.burstPackets += burst
+            if burst > self.largestBurst:
+                self.largestBurst = burst
         # print('[*] Exited receive Thread ...')
 
-    def getData(self):
-        ret = self.data.copy()
-        # Clear data buffer after handing it out
-        self.data.clear()
-        return ret
+    def recvStats(self):
+        ''' Wakeups of the receive thread and datagrams read per wakeup '''
+        perWakeup = self.burstPackets / self.wakeups if self.wakeups else 0.0
+        return {'wakeups': self.wakeups, 'packets': self.burstPackets, 'perWakeup': perWakeup,
+                'largestBurst': self.largestBurst, 'errors': self.recvErrors}
+
+    def dispatch(self, data, stamp=None, received=False):
+        '''
+        Count a datagram and hand it to the handler of its class, or queue it for getData. States are
+        recorded in self.monitor with their arrival time stamp (time.perf_counter()), listeners find it in
+        self.stamp. received means data is a view of self.ring.slot() (the receive thread), otherwise it is
+        copied into the ring. In mailbox mode a copy replaces the previous packet in self.mailbox instead.
+        Listeners get data as it is, a view of the slot that is only valid during the call. Exceptions of
+        listeners, handlers and the mailbox decode are counted (and reported once) in self.guard.
+        '''
+        kind = classifyPacket(data)
+        self.counters[kind] += 1
+        if kind not in STATE_KINDS:
+            return kind
+        if stamp is None:
+            stamp = time.perf_counter()
+        self.stamp = stamp
+        self.monitor.update(kind, data, stamp)
+        # a callback that raises is counted in self.guard, it must not stop the receive thread
+        for listener in self.listeners[kind]:
+            try:
+                listener(data)
+            except Exception:
+                self.guard.failed(listener)
+        handler = self.handlers.get(kind)
+        if handler is not None:
+            try:
+                handler(bytes(data))
+            except Exception:
+                self.guard.failed(handler)
+        elif self.mailbox is not None:
+            try:
+                self.mailbox.put(bytes(data), kind)
+            except Exception:
+                self.guard.failed(self.mailbox.decode)
+        elif received:
+            self.ring.publish(len(data), kind)
+        else:
+            self.ring.put(data, kind)
+        return kind
+
+    def onPacket(self, kind, handler):
+        '''
+        Call handler(data) from the receive thread for every HIGH_STATE or LOW_STATE packet instead of queueing
+        it, e.g. conn.onPacket(HIGH_STATE, hstate.parseData). None goes back to queueing.
+        '''
+        if kind not in STATE_KINDS:
+            raise ValueError(f'Can not route {kind} packets')
+        if handler is None:
+            self.handlers.pop(kind, None)
+        else:
+            self.handlers[kind] = handler
+
+    def watch(self, kind, listener, first=False):
+        '''
+        Call listener(data) from the receive thread for every HIGH_STATE or LOW_STATE packet, before it is
+        queued or handed to its onPacket handler, e.g. conn.watch(HIGH_STATE, remoteEvents().feed).
+        Listeners run in the order they were added, first puts this one ahead of all of them (the safety
+        reflexes, see obstacleReflex).
+        '''
+        if kind not in self.listeners:
+            raise ValueError(f'Can not watch {kind} packets')
+        if first:
+            self.listeners[kind].insert(0, listener)
+        else:
+            self.listeners[kind].append(listener)
+
+    def subscribe(self, field, callback, when=None, kind=HIGH_STATE):
+        '''
+        Call callback(value, old) from the receive thread when a field of the kind's packets changes, e.g.
+        conn.subscribe('mode', onMode) or conn.subscribe('bms.SOC', lowBattery, when=lambda soc: soc < 20).
+        Only the raw bytes of the watched fields are compared, see stateSubscriptions. Returns the subscription
+        for unsubscribe.
+        '''
+        subs = self.subscriptions.get(kind)
+        if subs is None:
+            layouts = {HIGH_STATE: HIGH_STATE_LAYOUT, LOW_STATE: LOW_STATE_LAYOUT}
+            if kind not in layouts:
+                raise ValueError(f'Can not subscribe to {kind} packets')
+            subs = self.subscriptions[kind] = stateSubscriptions(layouts[kind])
+            self.watch(kind, subs.feed)
+        return subs.subscribe(field, callback, when)
+
+    def unsubscribe(self, sub, kind=HIGH_STATE):
+        if kind in self.subscriptions:
+            self.subscriptions[kind].unsubscribe(sub)
+
+    def getData(self, kind=None):
+        '''
+        Hand out (and consume) the received packets of one class, or of both if kind is None. A robot sends either
+        high or low level states, so the packets are in arrival order either way. In mailbox mode this is only
+        the newest packet, if it is new since the last call.
+        '''
+        if self.mailbox is None:
+            return self.ring.drain(kind)
+        seq, packetKind, data, _ = self.mailbox.get_latest()
+        if seq == self.handedSeq or (kind is not None and packetKind != kind):
+            return []
+        self.handedSeq = seq
+        return [data]
+
+    def get_latest(self):
+        '''
+        (seq, kind, data, state) of the newest state packet in mailbox mode, in O(1) however long ago it was
+        last called. seq counts the packets kept, state is decode(data) or None, seq 0 means nothing yet.
+        '''
+        return self.latestMailbox('get_latest').get_latest()
+
+    def wait_newer(self, seq, timeout=None):
+        '''
+        Block until a packet newer than seq arrived (mailbox mode) and return get_latest(), None on timeout:
+
+            seq = 0
+            while running:
+                latest = conn.wait_newer(seq, timeout=0.1)
+                if latest is not None:
+                    seq, kind, data, state = latest
+        '''
+        return self.latestMailbox('wait_newer').wait_newer(seq, timeout)
+
+    def latestMailbox(self, name):
+        if self.mailbox is None:
+            raise RuntimeError(f'{name} needs mailbox mode, create the connection with unitreeConnection(..., mailbox=True)')
+        return self.mailbox